@@ -21,6 +21,8 @@
 #define Temp_Hum_SensorPin 2
 #define Servo_Pin 9
 #define SD_CS_Pin 4         
+#define LOG_CHUNK_MAX 4096  // Bytes máximos por respuesta de /log
+#define DATA_RING_SIZE 64   // Lecturas que se guardan en RAM para /data?since=
 
 /*-------------------------------------------------------------------------
 --------------------------Object instantiation-----------------------------
@@ -81,8 +83,24 @@ char pass[64];
 float temperature = 0.0, humidity = 0.0, pressure = 0.0; 
 int AQI = 0, rainfall = 0; 
 unsigned long lastSensorUpdate = 0; 
+unsigned long sampleSeq = 0; // Número de lectura, para que el cliente descarte repetidas
 unsigned long lastWiFiCheck = 0; 
 
+// Lectura tal como viaja en /data?since=: 23 bytes, little-endian y sin
+// relleno. En el anillo `ms` es el millis() de la lectura; al enviarla se
+// reemplaza por su edad, como "age_ms" en el JSON.
+struct __attribute__((packed)) Reading {
+  uint32_t seq;
+  uint32_t ms;
+  float temperature;
+  float humidity;
+  float pressure;
+  int16_t aqi;
+  uint8_t rainfall;
+};
+Reading dataRing[DATA_RING_SIZE]; // La lectura N va en dataRing[N % DATA_RING_SIZE]
+Reading dataBatch[DATA_RING_SIZE]; // Respuesta armada para enviarla en una sola escritura
+
 bool isRaining = false; 
 int servoPos = 0; 
 int targetServoPos = 0; 
@@ -168,7 +186,8 @@ void wifi_reconnect() {
   }
 }
 
-// --- (logDataToSD sin cambios) ---
+// Cada línea termina con su sampleSeq: si un SD.open falla, sampleSeq avanza
+// sin línea y el cliente no puede deducir la lectura por la posición.
 void logDataToSD() {
   if (!sdCardInitialized) { return; }  
   File dataFile = SD.open("datalog.csv", FILE_WRITE); 
@@ -183,6 +202,8 @@ void logDataToSD() {
     dataString += String(AQI); 
     dataString += ",";
     dataString += String(rainfall); 
+    dataString += ",";
+    dataString += String(sampleSeq);
     dataFile.println(dataString);
     dataFile.close(); 
   } else {
@@ -231,6 +252,15 @@ void read_sensor_data() {
     targetServoPos = 0; 
   }
   
+  sampleSeq++;
+  Reading & reading = dataRing[sampleSeq % DATA_RING_SIZE];
+  reading.seq = sampleSeq;
+  reading.ms = lastSensorUpdate;
+  reading.temperature = temperature;
+  reading.humidity = humidity;
+  reading.pressure = pressure;
+  reading.aqi = AQI;
+  reading.rainfall = rainfall;
   logDataToSD(); 
 }
 
@@ -244,10 +274,84 @@ void send_json_data(WiFiClient & client) {
            ",\"humidity\":" + String(humidity) +
            ",\"pressure\":" + String(pressure) +
            ",\"aqi\":" + String(AQI) +
-           ",\"rainfall\":" + String(rainfall) + "}";
+           ",\"rainfall\":" + String(rainfall) +
+           ",\"seq\":" + String(sampleSeq) +
+           ",\"age_ms\":" + String(millis() - lastSensorUpdate) + "}";
   client.println(json); 
 }
 
+// Valor entero de "nombre=" en la línea de petición, o `defecto` si no viene.
+long query_param(const String & request, const char * nombre, long defecto) {
+  String clave = String(nombre) + "=";
+  int inicio = request.indexOf(clave);
+  if (inicio == -1) { return defecto; }
+  return request.substring(inicio + clave.length()).toInt();
+}
+
+// GET /data?since=N: las lecturas con seq > N que siguen en el anillo, en
+// binario (ver struct Reading), de la más vieja a la más nueva. Una sola
+// conexión trae varias lecturas y el cliente puede sondear menos seguido.
+// Si N es mayor que sampleSeq el Modulo se reinició: van todas.
+void send_data_batch(WiFiClient & client, const String & request) {
+  unsigned long since = (unsigned long) max(0L, query_param(request, "since", 0));
+  if (since > sampleSeq) { since = 0; }
+  if (sampleSeq - since > DATA_RING_SIZE) { since = sampleSeq - DATA_RING_SIZE; }
+
+  unsigned long now = millis();
+  unsigned long count = 0;
+  for (unsigned long seq = since + 1; seq <= sampleSeq; seq++) {
+    dataBatch[count] = dataRing[seq % DATA_RING_SIZE];
+    dataBatch[count].ms = now - dataBatch[count].ms;
+    count++;
+  }
+
+  client.println("HTTP/1.1 200 OK");
+  client.println("Content-Type: application/octet-stream");
+  client.println("Content-Length: " + String(count * sizeof(Reading)));
+  client.println("X-Data-Seq: " + String(sampleSeq));
+  client.println("Connection: close");
+  client.println();
+  if (count > 0) { client.write((const uint8_t *) dataBatch, count * sizeof(Reading)); }
+}
+
+// GET /log?offset=N&len=M: hasta LOG_CHUNK_MAX bytes de datalog.csv desde N.
+// X-Log-Size y X-Log-Seq permiten al cliente saber qué lectura es cada línea.
+void send_log_chunk(WiFiClient & client, const String & request) {
+  File dataFile;
+  if (sdCardInitialized) { dataFile = SD.open("datalog.csv", FILE_READ); }
+  if (!dataFile) {
+    client.println("HTTP/1.1 503 Service Unavailable");
+    client.println("Connection: close");
+    client.println();
+    return;
+  }
+
+  unsigned long size = dataFile.size();
+  unsigned long offset = (unsigned long) max(0L, query_param(request, "offset", 0));
+  unsigned long len = (unsigned long) max(0L, query_param(request, "len", LOG_CHUNK_MAX));
+  if (offset > size) { offset = size; }
+  if (len > LOG_CHUNK_MAX) { len = LOG_CHUNK_MAX; }
+  if (len > size - offset) { len = size - offset; }
+
+  client.println("HTTP/1.1 200 OK");
+  client.println("Content-Type: text/csv");
+  client.println("Content-Length: " + String(len));
+  client.println("X-Log-Size: " + String(size));
+  client.println("X-Log-Seq: " + String(sampleSeq));
+  client.println("Connection: close");
+  client.println();
+
+  uint8_t buffer[256];
+  dataFile.seek(offset);
+  while (len > 0) {
+    int leidos = dataFile.read(buffer, min(len, sizeof(buffer)));
+    if (leidos <= 0) { break; }
+    client.write(buffer, leidos);
+    len -= leidos;
+  }
+  dataFile.close();
+}
+
 void send_web_page(WiFiClient & client) {
   client.println("HTTP/1.1 200 OK"); 
   client.println("Content-Type: text/html"); 
@@ -437,8 +541,12 @@ void run_local_webserver() {
     client.flush();
     if (request.indexOf("GET / ") != -1) {
       send_web_page(client);
+    } else if (request.indexOf("GET /data?since=") != -1) {
+      send_data_batch(client, request);
     } else if (request.indexOf("GET /data") != -1) {
       send_json_data(client);
+    } else if (request.indexOf("GET /log") != -1) {
+      send_log_chunk(client, request);
     }
     client.stop();
   }
@@ -464,7 +572,7 @@ void setup() {
     sdCardInitialized = true; 
     File dataFile = SD.open("datalog.csv", FILE_WRITE); 
     if (dataFile && dataFile.size() == 0) { 
-      dataFile.println("Temperatura,Humedad,Presion,QAI,Lluvia");
+      dataFile.println("Temperatura,Humedad,Presion,QAI,Lluvia,Seq");
     }
     dataFile.close(); 
   }
@@ -0,0 +1,215 @@
+import time
+
+import numpy as np
+import pyqtgraph as pg
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+from metrics import METRICAS
+from ring_buffer import COLUMNAS
+
+# Tamaño de cada celda del tablero, en píxeles.
+ANCHO_CELDA = 220
+ALTO_CELDA = 110
+
+# Sin muestras en este tiempo, la celda se pinta como inactiva.
+SEGUNDOS_INACTIVA = 30
+
+_MARGEN = 6
+_T, _TEMP, _HUM, _LLUVIA, _CALIDAD = (COLUMNAS.index(c) for c in
+                                     ("timestamp", "temperature", "humidity", "rainfall", "quality"))
+
+
+class _Mosaico(QtWidgets.QWidget):
+    """
+    Todas las celdas del tablero en un solo widget pintado a mano: no hay un
+    árbol de widgets por estación, y paintEvent solo recorre las celdas que
+    caen en el área expuesta, leyendo sus datos del buffer en ese momento.
+    """
+    seleccionada = QtCore.pyqtSignal(str)
+
+    def __init__(self, buffers, parent=None):
+        super().__init__(parent)
+        self.buffers = buffers
+        self.estaciones = []
+        self.indices = {}
+        self.columnas = 1
+        self.actual = None
+        self.setAttribute(QtCore.Qt.WA_OpaquePaintEvent)
+        self.setMouseTracking(True)
+
+        self._fondo = QtGui.QColor("#1a639a")
+        self._celda = QtGui.QColor("white")
+        self._inactiva = QtGui.QColor("#cfd8dc")
+        self._pluma_temp = pg.mkPen('#ff5733', width=1.5)
+        self._pluma_hum = pg.mkPen('#2196f3', width=1.5)
+        self._pluma_actual = QtGui.QPen(QtGui.QColor("#ffb300"), 3)
+        self._fuente_nombre = QtGui.QFont('Arial', 9, QtGui.QFont.Bold)
+        self._fuente_valor = QtGui.QFont('Arial', 13, QtGui.QFont.Bold)
+
+    def agregar(self, estacion):
+        self.indices[estacion] = len(self.estaciones)
+        self.estaciones.append(estacion)
+        self.reacomodar(self.width())
+
+    def reacomodar(self, ancho):
+        self.columnas = max(1, ancho // ANCHO_CELDA)
+        filas = -(-len(self.estaciones) // self.columnas)
+        self.setMinimumHeight(filas * ALTO_CELDA)
+        self.update()
+
+    def celda(self, i):
+        fila, columna = divmod(i, self.columnas)
+        return QtCore.QRect(columna * ANCHO_CELDA, fila * ALTO_CELDA, ANCHO_CELDA, ALTO_CELDA)
+
+    def en_rango(self, rect):
+        """Índices de las celdas que tocan `rect` (coordenadas del mosaico)."""
+        fila0 = max(rect.top(), 0) // ALTO_CELDA
+        fila1 = max(rect.bottom(), 0) // ALTO_CELDA
+        return range(fila0 * self.columnas, min((fila1 + 1) * self.columnas, len(self.estaciones)))
+
+    # --- Eventos de Qt ---
+    def resizeEvent(self, event):
+        if event.size().width() // ANCHO_CELDA != self.columnas:
+            self.reacomodar(event.size().width())
+        super().resizeEvent(event)
+
+    def mousePressEvent(self, event):
+        columna = event.pos().x() // ANCHO_CELDA
+        i = event.pos().y() // ALTO_CELDA * self.columnas + columna
+        if columna < self.columnas and 0 <= i < len(self.estaciones):
+            self.seleccionada.emit(self.estaciones[i])
+
+    def paintEvent(self, event):
+        inicio = time.perf_counter()
+        painter = QtGui.QPainter(self)
+        painter.fillRect(event.rect(), self._fondo)
+        painter.setRenderHint(QtGui.QPainter.Antialiasing)
+        ahora = time.time()
+        for i in self.en_rango(event.rect()):
+            rect = self.celda(i)
+            if rect.intersects(event.rect()):
+                self._pintar_celda(painter, rect.adjusted(_MARGEN // 2, _MARGEN // 2, -_MARGEN // 2, -_MARGEN // 2),
+                                   self.estaciones[i], ahora)
+        painter.end()
+        METRICAS.registrar("tablero", time.perf_counter() - inicio)
+
+    def _pintar_celda(self, painter, rect, estacion, ahora):
+        buf = self.buffers.buffers.get(estacion)
+        vista = buf.ultimos(rect.width() - 2 * _MARGEN) if buf is not None else np.empty((len(COLUMNAS), 0))
+        activa = vista.shape[1] and ahora - vista[_T, -1] < SEGUNDOS_INACTIVA
+
+        painter.setPen(self._pluma_actual if estacion == self.actual else QtCore.Qt.NoPen)
+        painter.setBrush(self._celda if activa else self._inactiva)
+        painter.drawRoundedRect(rect, 4, 4)
+
+        painter.setPen(QtGui.QColor("black"))
+        painter.setFont(self._fuente_nombre)
+        texto = QtCore.QRect(rect.left() + _MARGEN, rect.top() + 2, rect.width() - 2 * _MARGEN, 18)
+        painter.drawText(texto, QtCore.Qt.AlignLeft | QtCore.Qt.AlignVCenter, estacion)
+        if not vista.shape[1]:
+            return
+        ultima = vista[:, -1]
+        marcas = []
+        if ultima[_LLUVIA] > 0:
+            marcas.append("LLUVIA")
+        if ultima[_CALIDAD]:
+            marcas.append("⚠")
+        painter.drawText(texto, QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter, " ".join(marcas))
+
+        painter.setFont(self._fuente_valor)
+        valores = QtCore.QRect(rect.left() + _MARGEN, rect.top() + 20, rect.width() - 2 * _MARGEN, 22)
+        for fila, formato, color, alineacion in ((_TEMP, "{:.1f}°C", "#d84315", QtCore.Qt.AlignLeft),
+                                                  (_HUM, "{:.0f}%", "#1565c0", QtCore.Qt.AlignRight)):
+            painter.setPen(QtGui.QColor(color))
+            valor = ultima[fila]
+            painter.drawText(valores, alineacion | QtCore.Qt.AlignVCenter, formato.format(valor) if valor == valor else "--")
+
+        # Sparklines: una muestra por píxel, cada serie escalada a su rango.
+        area = QtCore.QRectF(rect.left() + _MARGEN, rect.top() + 46, rect.width() - 2 * _MARGEN,
+                             rect.height() - 46 - _MARGEN)
+        x = area.left() + np.arange(vista.shape[1], dtype=float) + (area.width() - vista.shape[1])
+        for fila, pluma in ((_TEMP, self._pluma_temp), (_HUM, self._pluma_hum)):
+            y = vista[fila]
+            validos = ~np.isnan(y)
+            if validos.sum() < 2:
+                continue
+            bajo, alto = y[validos].min(), y[validos].max()
+            escala = (y - bajo) / (alto - bajo) if alto > bajo else np.full(len(y), 0.5)
+            painter.setPen(pluma)
+            painter.drawPath(pg.arrayToQPath(x, area.bottom() - escala * area.height(), connect='finite'))
+
+
+class Dashboard(QtWidgets.QScrollArea):
+    """
+    Tablero con todas las estaciones: nombre, últimos valores y sparklines
+    de temperatura y humedad en celdas livianas.
+
+    La ingesta solo llama a marcar(estacion), que anota la estación como
+    pendiente. A lo sumo `fps` veces por segundo se repintan las celdas
+    pendientes que están a la vista; las que quedan fuera del área visible,
+    o todas si la ventana está minimizada u oculta, no cuestan nada y se
+    pintan con datos frescos cuando vuelven a verse. Así el costo de dibujo
+    depende de cuántas celdas se ven, no de cuántas estaciones hay.
+
+    Un clic en una celda emite `seleccionada(estacion)`: la gráfica
+    detallada es una sola, la de la ventana principal.
+    """
+    seleccionada = QtCore.pyqtSignal(str)
+
+    def __init__(self, buffers, fps=10, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Tablero de estaciones")
+        self.setWidgetResizable(True)
+        self.setHorizontalScrollBarPolicy(QtCore.Qt.ScrollBarAlwaysOff)
+        self.resize(4 * ANCHO_CELDA + 30, 4 * ALTO_CELDA + 10)
+        self.mosaico = _Mosaico(buffers)
+        self.mosaico.seleccionada.connect(self.seleccionada)
+        self.setWidget(self.mosaico)
+        self._pendientes = set()
+        self._timer = QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(max(1, int(1000 / fps)))
+        self._timer.timeout.connect(self.renderizar)
+        # Una estación que deja de enviar no marca nada: este timer lento
+        # repinta lo visible para que pase a inactiva a tiempo.
+        self._timer_inactivas = QtCore.QTimer(self)
+        self._timer_inactivas.setInterval(SEGUNDOS_INACTIVA * 1000 // 2)
+        self._timer_inactivas.timeout.connect(self.repintar_visibles)
+        self._timer_inactivas.start()
+        for estacion in buffers.estaciones():
+            self.mosaico.agregar(estacion)
+
+    def marcar(self, estacion):
+        """La estación tiene datos nuevos; cuesta lo mismo con 1 o 1000 estaciones."""
+        if estacion not in self.mosaico.indices:
+            self.mosaico.agregar(estacion)
+        self._pendientes.add(estacion)
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def resaltar(self, estacion):
+        """Marca la estación que se está viendo en detalle."""
+        anterior, self.mosaico.actual = self.mosaico.actual, estacion
+        for e in (anterior, estacion):
+            if e in self.mosaico.indices:
+                self.mosaico.update(self.mosaico.celda(self.mosaico.indices[e]))
+
+    def celdas_visibles(self):
+        if not self.isVisible() or self.isMinimized():
+            return range(0)
+        y = self.verticalScrollBar().value()
+        return self.mosaico.en_rango(QtCore.QRect(0, y, self.viewport().width(), self.viewport().height()))
+
+    def renderizar(self):
+        # Las pendientes fuera de la vista se descartan: al verse se pintan igual.
+        pendientes, self._pendientes = self._pendientes, set()
+        estaciones = self.mosaico.estaciones
+        for i in self.celdas_visibles():
+            if estaciones[i] in pendientes:
+                self.mosaico.update(self.mosaico.celda(i))
+
+    def repintar_visibles(self):
+        visibles = self.celdas_visibles()
+        if len(visibles):
+            arriba, abajo = self.mosaico.celda(visibles[0]).top(), self.mosaico.celda(visibles[-1]).bottom()
+            self.mosaico.update(0, arriba, self.mosaico.width(), abajo - arriba + 1)
@@ -13,32 +13,31 @@ pg.setConfigOption('foreground', 'k')
 
 
 class LedRadioButton(QRadioButton):
+    """Indicador redondo verde/rojo; se pinta directo en lugar de usar hojas de estilo."""
+    DIAMETRO = 20
+    COLORES = {True: QColor("lime"), False: QColor("red")}
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setText("")
         self.setCheckable(False)
         self.setAttribute(Qt.WA_TransparentForMouseEvents)
+        self.setFixedSize(self.DIAMETRO, self.DIAMETRO)
 
         self._is_on = False
-        self._update_style()
-
-    def _update_style(self):
-        color = "lime" if self._is_on else "red"
-        style = f"""
-            QRadioButton::indicator {{
-                width: 20px;
-                height: 20px;
-                border-radius: 10px;
-                background-color: {color};
-            }}
-        """
-        self.setStyleSheet(style)
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(QBrush(self.COLORES[self._is_on]))
+        painter.drawEllipse(0, 0, self.DIAMETRO, self.DIAMETRO)
 
     def setState(self, is_on):
         state = bool(is_on)
         if self._is_on != state:
             self._is_on = state
-            self._update_style()
+            self.update()
 
 
 # --- CLASE PRINCIPAL DE LA VENTANA ---
@@ -195,11 +194,11 @@ class Ui_MainWindow(QMainWindow):
         graph_layout = QVBoxLayout()
 
         # Creamos el widget de gráfica
-        self.plot_widget = pg.PlotWidget()
+        self.plot_widget = pg.PlotWidget(axisItems={'bottom': pg.DateAxisItem()})
 
         # --- Configuramos el gráfico ---
         self.plot_widget.setLabel('left', 'Valor')
-        self.plot_widget.setLabel('bottom', 'Tiempo (S)')
+        self.plot_widget.setLabel('bottom', 'Tiempo')
         self.plot_widget.addLegend()
         self.plot_widget.showGrid(x=True, y=True)
 
@@ -0,0 +1,306 @@
+import json
+import time
+
+import numpy as np
+
+from metrics import METRICAS
+from ring_buffer import SENSORES
+
+SENSORES_ALERTA = SENSORES
+
+# Muestras por estación que se recuerdan para las reglas de "cambio": a
+# 2 s por lectura cubren ~8 minutos; una ventana más larga usa lo que haya.
+MUESTRAS_CAMBIO = 256
+
+# Reglas que se usan si no se da un archivo. Cuando el DHT o el BMP fallan,
+# read_sensor_data() deja la lectura en 0.0 y el filtro de calidad la
+# descarta (NaN): "valor": None cuenta lecturas seguidas sin dato válido.
+REGLAS_POR_DEFECTO = [
+    {"nombre": "dht_sin_lectura", "tipo": "atascado", "sensor": "humidity", "valor": None, "muestras": 3,
+     "mensaje": "{estacion}: el DHT no da lecturas válidas"},
+    {"nombre": "bmp_sin_lectura", "tipo": "atascado", "sensor": "pressure", "valor": None, "muestras": 3,
+     "mensaje": "{estacion}: el BMP no da lecturas válidas"},
+    {"nombre": "lluvia", "tipo": "lluvia", "mensaje": "{estacion}: empezó a llover"},
+]
+
+_CLAVES = {
+    "umbral": {"sensor", "mayor", "menor"},
+    "cambio": {"sensor", "ventana", "delta", "direccion"},
+    "atascado": {"sensor", "valor", "muestras"},
+    "lluvia": {"seco"},
+}
+_COMUNES = {"nombre", "tipo", "estaciones", "histeresis", "durante", "espera", "mensaje"}
+
+
+def cargar_reglas(ruta):
+    """Lee y valida una lista de reglas (ver AlertEngine) de un archivo JSON."""
+    with open(ruta, encoding="utf-8") as f:
+        reglas = json.load(f)
+    if not isinstance(reglas, list):
+        raise ValueError(f"{ruta}: se esperaba una lista de reglas")
+    for regla in reglas:
+        _validar(regla)
+    return reglas
+
+
+def _validar(regla):
+    tipo = regla.get("tipo")
+    if tipo not in _CLAVES:
+        raise ValueError(f"Regla {regla.get('nombre')!r}: tipo desconocido {tipo!r} "
+                         f"(use {', '.join(_CLAVES)})")
+    if "nombre" not in regla:
+        raise ValueError(f"Regla de tipo {tipo!r} sin nombre")
+    sobrantes = set(regla) - _CLAVES[tipo] - _COMUNES
+    if sobrantes:
+        raise ValueError(f"Regla {regla['nombre']!r}: claves desconocidas {sorted(sobrantes)}")
+    if "sensor" in _CLAVES[tipo] and regla.get("sensor") not in SENSORES_ALERTA:
+        raise ValueError(f"Regla {regla['nombre']!r}: sensor desconocido {regla.get('sensor')!r}")
+    if tipo == "umbral" and ("mayor" in regla) == ("menor" in regla):
+        raise ValueError(f"Regla {regla['nombre']!r}: indique 'mayor' o 'menor' (uno solo)")
+    if tipo == "cambio" and not ("ventana" in regla and "delta" in regla):
+        raise ValueError(f"Regla {regla['nombre']!r}: faltan 'ventana' y 'delta'")
+    if regla.get("direccion", "ambas") not in ("sube", "baja", "ambas"):
+        raise ValueError(f"Regla {regla['nombre']!r}: 'direccion' es 'sube', 'baja' o 'ambas'")
+
+
+class AlertEngine:
+    """
+    Evalúa reglas de alerta sobre los lotes de muestras que van llegando.
+
+    Cada regla es un dict (p. ej. leído de JSON con cargar_reglas):
+
+      {"nombre": "calor", "tipo": "umbral", "sensor": "temperature", "mayor": 35, "histeresis": 1}
+      {"nombre": "helada", "tipo": "umbral", "sensor": "temperature", "menor": 2}
+      {"nombre": "frente", "tipo": "cambio", "sensor": "pressure", "ventana": 600,
+       "delta": 3, "direccion": "baja"}
+      {"nombre": "dht", "tipo": "atascado", "sensor": "humidity", "valor": None, "muestras": 3}
+      {"nombre": "lluvia", "tipo": "lluvia", "seco": 600}
+
+    y acepta además "estaciones" (lista; por defecto todas), "histeresis"
+    (banda para apagarse), "durante" (segundos que la condición debe
+    sostenerse para encenderse), "espera" (segundos sin la condición para
+    apagarse) y "mensaje" (con {estacion}, {valor} y {regla}).
+
+    Las reglas se compilan una vez a arreglos: todas se reducen a una
+    medida por muestra comparada contra un límite, así cada lote se evalúa
+    con unas pocas operaciones de NumPy sobre la matriz muestras x reglas,
+    y el estado (encendida, desde cuándo...) vive en matrices estaciones x
+    reglas. Solo las transiciones llegan a `on_alertas(eventos)`: una alerta
+    encendida no se repite hasta que se apague.
+    """
+
+    def __init__(self, reglas=None, on_alertas=None, muestras_cambio=MUESTRAS_CAMBIO):
+        self.reglas = [dict(r) for r in (REGLAS_POR_DEFECTO if reglas is None else reglas)]
+        for regla in self.reglas:
+            _validar(regla)
+        nombres = [r["nombre"] for r in self.reglas]
+        if len(set(nombres)) != len(nombres):
+            raise ValueError("Hay reglas con el mismo nombre")
+        self.on_alertas = on_alertas
+        self.muestras_cambio = muestras_cambio
+        self._compilar()
+
+        self._filas = {}
+        self._nombres = []
+        self._capacidad = 0
+        self._crecer(16)
+
+    # --- Compilación ---
+    def _compilar(self):
+        R = len(self.reglas)
+        self._sensor = np.zeros(R, dtype=np.intp)
+        self._signo = np.ones(R)
+        self._limite = np.zeros(R)
+        self._histeresis = np.zeros(R)
+        self._durante = np.zeros(R)
+        self._espera = np.zeros(R)
+        self._es_cambio = np.zeros(R, dtype=bool)
+        self._es_atascado = np.zeros(R, dtype=bool)
+        self._valor_atascado = np.zeros(R)
+        self._ventanas = {}
+        self._mensajes = []
+
+        for i, regla in enumerate(self.reglas):
+            tipo = regla["tipo"]
+            sensor = "rainfall" if tipo == "lluvia" else regla["sensor"]
+            self._sensor[i] = SENSORES_ALERTA.index(sensor)
+            self._histeresis[i] = regla.get("histeresis", 0.0)
+            self._durante[i] = regla.get("durante", 0.0)
+            self._espera[i] = regla.get("espera", 0.0)
+            if tipo == "umbral":
+                if "menor" in regla:
+                    self._signo[i], self._limite[i] = -1.0, -regla["menor"]
+                else:
+                    self._limite[i] = regla["mayor"]
+                descripcion = f"{sensor} {'<' if 'menor' in regla else '>'} {regla.get('menor', regla.get('mayor'))}"
+            elif tipo == "cambio":
+                self._es_cambio[i] = True
+                self._limite[i] = regla["delta"]
+                direccion = regla.get("direccion", "ambas")
+                self._signo[i] = {"sube": 1.0, "baja": -1.0, "ambas": 0.0}[direccion]
+                self._ventanas.setdefault(float(regla["ventana"]), []).append(i)
+                descripcion = f"{sensor} cambió {regla['delta']} en {regla['ventana']} s"
+            elif tipo == "atascado":
+                # La medida es cuántas lecturas seguidas van en `valor`.
+                self._es_atascado[i] = True
+                valor = regla.get("valor", 0.0)
+                # None: sin lectura válida (NaN, lo que descartó el filtro de calidad).
+                self._valor_atascado[i] = np.nan if valor is None else valor
+                self._limite[i] = regla.get("muestras", 3) - 0.5
+                self._histeresis[i] = self._limite[i] - 0.5
+                descripcion = f"{sensor} sin lectura válida" if valor is None else f"{sensor} fijo en {valor}"
+            else:
+                # Lluvia: se enciende con la primera lectura mojada y se apaga
+                # tras `seco` segundos sin lluvia, así un goteo no la repite.
+                self._limite[i] = 0.5
+                self._espera[i] = regla.get("seco", regla.get("espera", 600.0))
+                descripcion = "empezó a llover"
+            self._mensajes.append(regla.get("mensaje", "{estacion}: {regla} ({descripcion}, valor {valor:g})")
+                                  .replace("{descripcion}", descripcion))
+
+        # El límite ya lleva el signo: la condición es siempre signo * medida > límite.
+        # "ambas" compara el cambio absoluto.
+        self._absoluto = self._es_cambio & (self._signo == 0.0)
+        self._signo[self._absoluto] = 1.0
+        self._umbral_apagado = self._limite - self._histeresis
+
+    # --- Estado por estación ---
+    def _crecer(self, capacidad):
+        R = len(self.reglas)
+
+        def agrandar(viejo, forma, relleno, dtype=float):
+            nuevo = np.full(forma, relleno, dtype=dtype)
+            if viejo is not None:
+                nuevo[:len(viejo)] = viejo
+            return nuevo
+
+        S = capacidad
+        self._activa = agrandar(getattr(self, "_activa", None), (S, R), False, bool)
+        self._aplica = agrandar(getattr(self, "_aplica", None), (S, R), True, bool)
+        self._contador = agrandar(getattr(self, "_contador", None), (S, R), 0.0)
+        self._desde = agrandar(getattr(self, "_desde", None), (S, R), np.nan)
+        self._ultima = agrandar(getattr(self, "_ultima", None), (S, R), -np.inf)
+        self._ultimo_t = agrandar(getattr(self, "_ultimo_t", None), S, -np.inf)
+        if self._ventanas:
+            K = self.muestras_cambio
+            self._hist_t = agrandar(getattr(self, "_hist_t", None), (S, K), np.nan)
+            self._hist_x = agrandar(getattr(self, "_hist_x", None), (S, K, len(SENSORES_ALERTA)), np.nan)
+            self._cabeza = agrandar(getattr(self, "_cabeza", None), S, 0, np.intp)
+        self._capacidad = capacidad
+
+    def _fila(self, estacion):
+        fila = self._filas.get(estacion)
+        if fila is None:
+            fila = len(self._nombres)
+            if fila >= self._capacidad:
+                self._crecer(2 * self._capacidad)
+            self._filas[estacion] = fila
+            self._nombres.append(estacion)
+            for i, regla in enumerate(self.reglas):
+                self._aplica[fila, i] = "estaciones" not in regla or estacion in regla["estaciones"]
+        return fila
+
+    # --- Evaluación ---
+    def evaluar(self, muestras):
+        """
+        Procesa un lote de pares (estacion, data). Devuelve (y entrega a
+        `on_alertas`) los eventos {regla, estacion, estado, timestamp,
+        valor, mensaje}, con estado "activa" o "resuelta".
+        """
+        inicio = time.perf_counter()
+        filas, tiempos, valores = [], [], []
+        for estacion, data in muestras:
+            filas.append(self._fila(estacion))
+            t = data.get('timestamp')
+            tiempos.append(time.time() if t is None else t)
+            valores.append([data.get(c, np.nan) for c in SENSORES_ALERTA])
+        if not filas:
+            return []
+        filas = np.array(filas, dtype=np.intp)
+        tiempos = np.array(tiempos, dtype=float)
+        valores = np.array(valores, dtype=float)
+
+        # Una estación con varias muestras en el lote se procesa por rondas,
+        # en orden; cada ronda tiene a lo sumo una muestra por estación.
+        orden = np.lexsort((tiempos, filas))
+        filas, tiempos, valores = filas[orden], tiempos[orden], valores[orden]
+        nueva_fila = np.r_[True, filas[1:] != filas[:-1]]
+        ronda = np.arange(len(filas)) - np.maximum.accumulate(np.where(nueva_fila, np.arange(len(filas)), 0))
+
+        eventos = []
+        for r in range(int(ronda.max()) + 1):
+            sel = ronda == r
+            eventos.extend(self._evaluar_ronda(filas[sel], tiempos[sel], valores[sel]))
+        eventos.sort(key=lambda e: e["timestamp"])
+        METRICAS.registrar("alertas", time.perf_counter() - inicio)
+        if eventos and self.on_alertas:
+            self.on_alertas(eventos)
+        return eventos
+
+    def _evaluar_ronda(self, f, t, x):
+        # Las atrasadas (backfill) no disparan alertas.
+        vigentes = t > self._ultimo_t[f]
+        f, t, x = f[vigentes], t[vigentes], x[vigentes]
+        if len(f) == 0:
+            return []
+        self._ultimo_t[f] = t
+        tt = t[:, None]
+
+        # 1. Medida de cada regla para cada muestra (B x R).
+        medida = x[:, self._sensor]
+        if self._ventanas:
+            medida = self._medir_cambios(f, t, x, medida)
+        if self._es_atascado.any():
+            iguales = (medida == self._valor_atascado) | (np.isnan(medida) & np.isnan(self._valor_atascado))
+            contador = np.where(iguales, self._contador[f] + 1, 0.0)
+            self._contador[f] = np.where(self._es_atascado, contador, 0.0)
+            medida = np.where(self._es_atascado, contador, medida)
+        medida = np.where(self._absoluto, np.abs(medida), medida)
+
+        # 2. Condición de encendido y de apagado (con histéresis).
+        con_signo = self._signo * medida
+        encendido = con_signo > self._limite
+        apagado = con_signo < self._umbral_apagado
+        desde = np.where(encendido, np.fmin(self._desde[f], tt), np.nan)
+        self._desde[f] = desde
+        ultima = np.where(encendido, tt, self._ultima[f])
+        self._ultima[f] = ultima
+
+        # 3. Transiciones: solo se avisa al encender y al apagar.
+        activa = self._activa[f]
+        enciende = ~activa & encendido & (tt - desde >= self._durante) & self._aplica[f]
+        apaga = activa & apagado & (tt - ultima >= self._espera)
+        self._activa[f] = (activa | enciende) & ~apaga
+
+        eventos = []
+        for estado, matriz in (("activa", enciende), ("resuelta", apaga)):
+            for b, i in zip(*np.nonzero(matriz)):
+                estacion = self._nombres[f[b]]
+                valor = float(x[b, self._sensor[i]])
+                eventos.append({"regla": self.reglas[i]["nombre"], "estacion": estacion, "estado": estado,
+                                "timestamp": float(t[b]), "valor": valor,
+                                "mensaje": self._mensajes[i].format(estacion=estacion, valor=valor,
+                                                                   regla=self.reglas[i]["nombre"])})
+        return eventos
+
+    def _medir_cambios(self, f, t, x, medida):
+        """Cambio de cada sensor respecto de la lectura más vieja dentro de cada ventana."""
+        K = self.muestras_cambio
+        for ventana, reglas in self._ventanas.items():
+            dentro = self._hist_t[f] >= (t - ventana)[:, None]
+            # La más vieja dentro de la ventana (si no hay, la propia muestra).
+            mas_vieja = np.argmin(np.where(dentro, self._hist_t[f], np.inf), axis=1)
+            hay = dentro.any(axis=1)
+            referencia = np.where(hay[:, None], self._hist_x[f, mas_vieja], x)
+            cambio = x - referencia
+            medida[:, reglas] = cambio[:, self._sensor[reglas]]
+        cabeza = self._cabeza[f]
+        self._hist_t[f, cabeza] = t
+        self._hist_x[f, cabeza] = x
+        self._cabeza[f] = (cabeza + 1) % K
+        return medida
+
+    def activas(self):
+        """[(estacion, regla)] de las alertas encendidas ahora."""
+        S = len(self._nombres)
+        return [(self._nombres[s], self.reglas[i]["nombre"]) for s, i in zip(*np.nonzero(self._activa[:S]))]
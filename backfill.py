@@ -0,0 +1,238 @@
+import queue
+import threading
+
+import numpy as np
+
+from quality import filtrar_columnas
+from ring_buffer import SENSORES
+
+# Bytes por petición a /log; el firmware no entrega más de 4096 de una vez.
+TAM_FRAGMENTO = 2048
+
+# Pausa entre fragmentos para que el Modulo atienda primero los /data en vivo.
+PAUSA_FRAGMENTO = 0.2
+
+# Huecos más largos se dejan para sd_import (un día de lecturas a 2 s).
+MAX_FILAS = 43200
+
+_FIN = object()
+
+
+class _Hueco:
+    """Lecturas [primero, ultimo] (por "seq") que faltan de una estación."""
+
+    def __init__(self, estacion, primero, ultimo, tiempo_de):
+        self.estacion = estacion
+        self.primero = primero
+        self.ultimo = ultimo
+        self.tiempo_de = tiempo_de
+        self.intentos = 0
+
+        # Avance de la descarga, para retomarla tras un fallo.
+        self.tamano = None
+        self.seq_final = None
+        self.desde = None
+        self.fragmentos = []
+        self.lineas = 0
+
+
+class Backfiller:
+    """
+    Recupera del log de la SD las lecturas que no llegaron en vivo.
+
+    observar() recibe cada muestra en vivo; si "seq" salta (corte de red) o
+    vuelve a empezar (reinicio del Modulo), se encola el hueco. Un hilo de
+    baja prioridad descarga de /log solo la cola del archivo que cubre el
+    hueco, en fragmentos por rango de bytes y de atrás hacia adelante, y
+    entrega las lecturas ordenadas por tiempo: las guarda en `store` (si se
+    da) y luego llama a `on_recuperadas(estacion, columnas)`. Si un
+    fragmento falla, el hueco vuelve a la cola y la descarga sigue donde se
+    quedó.
+    """
+
+    def __init__(self, on_recuperadas=None, store=None, periodo=2.0, tam_fragmento=TAM_FRAGMENTO,
+                 pausa=PAUSA_FRAGMENTO, timeout=5.0, max_intentos=5, max_filas=MAX_FILAS):
+        self.on_recuperadas = on_recuperadas
+        self.store = store
+        self.periodo = periodo
+        self.tam_fragmento = tam_fragmento
+        self.pausa = pausa
+        self.timeout = timeout
+        self.max_intentos = max_intentos
+        self.max_filas = max_filas
+
+        self.recuperadas = 0
+        self._ultimas = {}
+        self._periodos = {}
+        self._ips = {}
+        self._sin_log = set()
+        self._cola = queue.Queue()
+        self._hilo = None
+        self._sesion = None
+        self._parar = threading.Event()
+
+    def iniciar(self):
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._run, name="backfill", daemon=True)
+            self._hilo.start()
+
+    def detener(self):
+        self._parar.set()
+        self._cola.put(_FIN)
+        if self._hilo is not None:
+            self._hilo.join(timeout=5)
+            self._hilo = None
+
+    # --- Detección de huecos ---
+    def observar(self, estacion, data, ip=None):
+        """Registra una muestra en vivo de `estacion` y encola el hueco si lo hay."""
+        seq = data.get('seq')
+        if seq is None or estacion in self._sin_log:
+            return
+        if ip:
+            self._ips[estacion] = ip
+        else:
+            self._ips.setdefault(estacion, estacion)
+        t = data['timestamp']
+        anterior = self._ultimas.get(estacion)
+        self._ultimas[estacion] = (seq, t)
+        if anterior is None:
+            return
+
+        seq_a, t_a = anterior
+        if seq > seq_a:
+            # Periodo real de la estación, para fechar lo anterior a un reinicio.
+            medido = (t - t_a) / (seq - seq_a)
+            previo = self._periodos.get(estacion, medido)
+            self._periodos[estacion] = previo + 0.2 * (medido - previo)
+        if seq > seq_a + 1:
+            # Corte de red: conocemos la hora de ambos extremos del hueco.
+            def tiempo_de(s, seq_a=seq_a, t_a=t_a, seq_b=seq, t_b=t):
+                return t_a + (s - seq_a) * (t_b - t_a) / (seq_b - seq_a)
+            self._encolar(_Hueco(estacion, seq_a + 1, seq - 1, tiempo_de))
+        elif seq < seq_a and seq > 1:
+            # Reinicio del Modulo: solo se fechan las lecturas desde el arranque.
+            def tiempo_de(s, seq_b=seq, t_b=t, periodo=self._periodos.get(estacion, self.periodo)):
+                return t_b - (seq_b - s) * periodo
+            self._encolar(_Hueco(estacion, 1, seq - 1, tiempo_de))
+
+    def reasignar_ip(self, ip_anterior, ip_nueva):
+        """La estación se volvió a anunciar con otra IP: el log se pide ahí."""
+        for estacion, ip in list(self._ips.items()):
+            if ip == ip_anterior:
+                self._ips[estacion] = ip_nueva
+
+    def _encolar(self, hueco):
+        if hueco.ultimo - hueco.primero + 1 > self.max_filas:
+            print(f"[Backfill] {hueco.estacion}: faltan {hueco.ultimo - hueco.primero + 1} lecturas; "
+                  f"se recuperan las últimas {self.max_filas} (el resto, con sd_import).")
+            hueco.primero = hueco.ultimo - self.max_filas + 1
+        self._cola.put(hueco)
+        self.iniciar()
+
+    # --- Descarga ---
+    def _run(self):
+        import requests
+        self._sesion = requests.Session()
+        while not self._parar.is_set():
+            hueco = self._cola.get()
+            if hueco is _FIN:
+                break
+            try:
+                self._descargar(hueco)
+            except LookupError as e:
+                print(f"[Backfill] {hueco.estacion}: no se puede recuperar el hueco, {e}.")
+            except Exception as e:
+                hueco.intentos += 1
+                if hueco.intentos >= self.max_intentos:
+                    print(f"[Backfill] {hueco.estacion}: se abandona el hueco ({e})")
+                    continue
+                # Reintento con backoff; lo ya descargado se conserva.
+                print(f"[Backfill] {hueco.estacion}: fragmento fallido, reintento {hueco.intentos}")
+                self._parar.wait(min(60, 2 ** hueco.intentos))
+                self._cola.put(hueco)
+        self._sesion.close()
+
+    def _pedir(self, estacion, offset, largo):
+        response = self._sesion.get(f"http://{self._ips[estacion]}/log",
+                                    params={"offset": offset, "len": largo}, timeout=self.timeout)
+        if response.status_code == 404:
+            self._sin_log.add(estacion)
+            raise LookupError("el firmware no tiene /log")
+        if response.status_code == 503:
+            raise LookupError("el Modulo no tiene SD")
+        response.raise_for_status()
+        return (response.content, int(response.headers["X-Log-Size"]),
+                int(response.headers["X-Log-Seq"]))
+
+    def _descargar(self, hueco):
+        if hueco.tamano is None:
+            # Fijamos el final del archivo: lo que se agregue después ya llegó en vivo.
+            _, hueco.tamano, hueco.seq_final = self._pedir(hueco.estacion, 0, 0)
+            hueco.desde = hueco.tamano
+
+        # Líneas desde el final hasta la primera que falta (+1 para saber
+        # que esa primera línea está completa).
+        necesarias = hueco.seq_final - hueco.primero + 2
+        while hueco.desde > 0 and hueco.lineas < necesarias:
+            if self._parar.is_set():
+                return
+            inicio = max(0, hueco.desde - self.tam_fragmento)
+            fragmento, _, _ = self._pedir(hueco.estacion, inicio, hueco.desde - inicio)
+            if len(fragmento) != hueco.desde - inicio:
+                raise IOError("fragmento incompleto")
+            hueco.fragmentos.append(fragmento)
+            hueco.lineas += fragmento.count(b"\n")
+            hueco.desde = inicio
+            self._parar.wait(self.pausa)
+
+        lineas = b"".join(reversed(hueco.fragmentos)).split(b"\n")[:-1]
+        if hueco.desde > 0:
+            lineas = lineas[1:]  # la primera puede estar cortada
+        # De la última línea hacia atrás. Cada línea trae su "seq" (si falló
+        # una escritura en la SD, falta esa línea y no otra); las de firmware
+        # anterior no lo traen y se deducen por la posición.
+        filas, tiempos = [], []
+        siguiente = hueco.seq_final + 1
+        for k, linea in enumerate(reversed(lineas)):
+            s, fila = _parsear_linea(linea)
+            if s is None:
+                s = hueco.seq_final - k
+            if s >= siguiente or s < hueco.primero:
+                # Antes del hueco, o del arranque anterior si el Modulo se reinició.
+                break
+            siguiente = s
+            if fila is not None and s <= hueco.ultimo:
+                filas.append(fila)
+                tiempos.append(hueco.tiempo_de(s))
+        filas.reverse()
+        tiempos.reverse()
+
+        if filas:
+            valores = np.array(filas)
+            columnas = {'timestamp': np.array(tiempos)}
+            columnas.update({c: valores[:, i] for i, c in enumerate(SENSORES)})
+            columnas = filtrar_columnas(columnas)
+            self.recuperadas += len(filas)
+            print(f"[Backfill] {hueco.estacion}: {len(filas)} lecturas recuperadas del log.")
+            if self.store:
+                self.store.importar_arreglos(hueco.estacion, columnas)
+            if self.on_recuperadas:
+                self.on_recuperadas(hueco.estacion, columnas)
+
+
+def _parsear_linea(linea):
+    """(seq o None, valores o None) de una línea de datalog.csv."""
+    partes = linea.strip().split(b",")
+    seq = None
+    if len(partes) == len(SENSORES) + 1:
+        try:
+            seq = int(partes.pop())
+        except ValueError:
+            return None, None
+    if len(partes) != len(SENSORES):
+        return None, None
+    try:
+        return seq, [float(p) for p in partes]
+    except ValueError:
+        return seq, None
@@ -0,0 +1,270 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+
+import numpy as np
+
+# Métricas en las que más alto es mejor (por sufijo); en las demás, más bajo.
+MAYOR_ES_MEJOR = ("muestras_por_s", "filas_por_s", "respondieron")
+
+# Parámetros de la corrida, no resultados: no se comparan.
+PARAMETROS = ("estaciones", "filas", "cuadros", "puntos")
+
+
+def rss_kb():
+    """Memoria residente del proceso en KB."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _percentiles(valores, prefijo):
+    valores = np.asarray(valores, dtype=float)
+    if len(valores) == 0:
+        return {}
+    return {f"{prefijo}_p50": float(np.percentile(valores, 50)),
+            f"{prefijo}_p99": float(np.percentile(valores, 99)),
+            f"{prefijo}_max": float(valores.max())}
+
+
+# --- FLOTA EN OTRO PROCESO ---
+class FlotaExterna:
+    """
+    Lanza `simulator.py` en un proceso aparte, así el CPU y la memoria que
+    se miden aquí son solo los del cliente.
+    """
+
+    def __init__(self, n, periodo=2.0, latencia=0.0, jitter=0.0, perdida=0.0,
+                 bloqueante=False, semilla=1):
+        comando = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "simulator.py"),
+                   "--estaciones", str(n), "--puerto", "0", "--periodo", str(periodo),
+                   "--latencia", str(latencia), "--jitter", str(jitter),
+                   "--perdida", str(perdida), "--semilla", str(semilla)]
+        if bloqueante:
+            comando.append("--bloqueante")
+        self.proceso = subprocess.Popen(comando, stdout=subprocess.PIPE, text=True)
+        self.ips = []
+        for linea in self.proceso.stdout:
+            if "http://" in linea:
+                self.ips.append(linea.rsplit("http://", 1)[1].strip())
+            elif "listas" in linea:
+                break
+        if len(self.ips) != n:
+            self.detener()
+            raise RuntimeError(f"El simulador arrancó {len(self.ips)} de {n} estaciones")
+
+    def detener(self):
+        self.proceso.terminate()
+        self.proceso.wait(timeout=10)
+
+
+# --- SUITES ---
+def medir_sondeo(ips, duracion, max_concurrencia=16):
+    """
+    Ciclo completo del recolector (sondeo, historial, estadísticas) contra
+    `ips`: tiempo hasta la primera muestra, muestras/s sostenidas y el CPU
+    y la memoria que agrega cada estación.
+    """
+    from collector import Collector
+
+    rss_inicial = rss_kb()
+    with tempfile.TemporaryDirectory() as carpeta:
+        collector = Collector(ips, ruta_historial=os.path.join(carpeta, "bench.db"),
+                              max_concurrencia=max_concurrencia, buscar=False)
+        primeras = {}
+        cuentas = []
+        lock = threading.Lock()
+        entregar = collector.engine.on_lote
+
+        def on_lote(muestras, errores):
+            ahora = time.perf_counter()
+            with lock:
+                for data in muestras:
+                    primeras.setdefault(data['station'], ahora)
+                cuentas.append((ahora, len(muestras)))
+            entregar(muestras, errores)
+
+        collector.engine.on_lote = on_lote
+        cpu_inicial = time.process_time()
+        inicio = time.perf_counter()
+        collector.iniciar()
+        time.sleep(duracion)
+        fin = time.perf_counter()
+        cpu = time.process_time() - cpu_inicial
+        rss = rss_kb() - rss_inicial
+        collector.detener()
+
+    n = len(ips)
+    resultado = {"estaciones": n, "respondieron": len(primeras)}
+    resultado.update(_percentiles([t - inicio for t in primeras.values()], "primera_muestra_s"))
+    # Régimen sostenido: desde que todas respondieron (o desde la mitad).
+    desde = max(primeras.values()) if len(primeras) == n else inicio + duracion / 2
+    sostenidas = sum(k for t, k in cuentas if t > desde)
+    resultado["muestras_por_s"] = sostenidas / max(fin - desde, 1e-9)
+    resultado["cpu_por_estacion_pct"] = 100.0 * cpu / (fin - inicio) / n
+    resultado["rss_por_estacion_kb"] = rss / n
+    return resultado
+
+
+def _historial_sintetico(store, estacion, filas, periodo=2.0):
+    t = 1.76e9 + np.arange(filas) * periodo
+    rng = np.random.default_rng(0)
+    columnas = {'timestamp': t,
+                'temperature': 20 + np.cumsum(rng.normal(0, 0.05, filas)),
+                'humidity': np.clip(50 + np.cumsum(rng.normal(0, 0.1, filas)), 0, 100),
+                'pressure': 1013 + np.cumsum(rng.normal(0, 0.01, filas)),
+                'aqi': rng.integers(0, 300, filas).astype(float),
+                'rainfall': (rng.random(filas) < 0.05).astype(float)}
+    store.importar_arreglos(estacion, columnas)
+
+
+def medir_exportacion(filas, formatos=(".csv", ".csv.gz", ".npz", ".xlsx")):
+    """Tiempo de exportar `filas` muestras del historial a cada formato."""
+    from storage import HistoryStore
+    from export_utils import escritor_para
+
+    resultado = {"filas": filas}
+    with tempfile.TemporaryDirectory() as carpeta:
+        store = HistoryStore(os.path.join(carpeta, "bench.db"))
+        _historial_sintetico(store, "bench", filas)
+        for formato in formatos:
+            ruta = os.path.join(carpeta, "export" + formato)
+            inicio = time.perf_counter()
+            escritor_para(ruta)(ruta, (("bench", b) for b in store.iterar("bench")), lambda n: None)
+            segundos = time.perf_counter() - inicio
+            nombre = formato.strip(".").replace(".", "_")
+            resultado[f"{nombre}_s"] = segundos
+            resultado[f"{nombre}_filas_por_s"] = filas / segundos
+        store.cerrar()
+    return resultado
+
+
+def medir_grafica(cuadros, puntos):
+    """
+    Tiempo por cuadro de la ventana real: una muestra nueva, textos de los
+    sensores y la gráfica (con `puntos` de historial), pintado sincrónico.
+    """
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtWidgets import QApplication
+    from GUI.gui import Ui_MainWindow
+    from decimation import LodPlot
+
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    ventana = Ui_MainWindow()
+    ventana.resize(1280, 800)
+    ventana.show()
+    lod = LodPlot(ventana.plot_widget, [ventana.temp_curve, ventana.hum_curve], ventana=50)
+    t = 1.76e9 + np.arange(puntos) * 2.0
+    rng = np.random.default_rng(0)
+    temp = 20 + np.cumsum(rng.normal(0, 0.05, puntos))
+    hum = 50 + np.cumsum(rng.normal(0, 0.1, puntos))
+    lod.extender(t, (temp, hum))
+    app.processEvents()
+
+    tiempos = []
+    ultimo = t[-1]
+    for i in range(cuadros):
+        inicio = time.perf_counter()
+        ultimo += 2.0
+        lod.extender(np.array([ultimo]), (temp[i % puntos:i % puntos + 1], hum[i % puntos:i % puntos + 1]))
+        ventana.sensor_labels['temp'][0].setText(f"{temp[i % puntos]:.1f}°C")
+        ventana.sensor_labels['hum'][0].setText(f"{hum[i % puntos]:.1f}%")
+        ventana.repaint()
+        app.processEvents()
+        tiempos.append(time.perf_counter() - inicio)
+    ventana.close()
+
+    resultado = {"cuadros": cuadros, "puntos": puntos}
+    resultado.update(_percentiles(np.array(tiempos) * 1000, "cuadro_ms"))
+    return resultado
+
+
+# --- COMPARACIÓN ---
+def comparar(actual, base, tolerancia):
+    """
+    Imprime cada métrica contra la línea base y devuelve las que empeoraron
+    más de `tolerancia` %.
+    """
+    regresiones = []
+    for suite, metricas in actual.items():
+        distintos = [p for p in PARAMETROS if p in metricas and base.get(suite, {}).get(p, metricas[p]) != metricas[p]]
+        if distintos:
+            print(f"  {suite}: ojo, la línea base usó otros parámetros ({', '.join(distintos)})")
+        for nombre, valor in metricas.items():
+            previo = base.get(suite, {}).get(nombre)
+            if not isinstance(previo, (int, float)) or not previo or nombre in PARAMETROS:
+                continue
+            cambio = 100.0 * (valor - previo) / abs(previo)
+            empeoro = -cambio if nombre.endswith(MAYOR_ES_MEJOR) else cambio
+            marca = "  << REGRESIÓN" if empeoro > tolerancia else ""
+            print(f"  {suite + '.' + nombre:<40} {previo:>12.4g} -> {valor:>12.4g} ({cambio:+.1f} %){marca}")
+            if marca:
+                regresiones.append(f"{suite}.{nombre}")
+    return regresiones
+
+
+def _imprimir(suite, resultado):
+    print(f"[Benchmark] {suite}")
+    for nombre, valor in resultado.items():
+        print(f"  {nombre:<30} {valor:.4g}" if isinstance(valor, float) else f"  {nombre:<30} {valor}")
+
+
+# --- PUNTO DE ENTRADA ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks de punta a punta con estaciones simuladas.")
+    parser.add_argument("--suites", default="sondeo,exportacion,grafica",
+                        help="Suites a correr, separadas por comas.")
+    parser.add_argument("--estaciones", type=int, default=100)
+    parser.add_argument("--duracion", type=float, default=20, help="Segundos de sondeo sostenido.")
+    parser.add_argument("--periodo", type=float, default=2.0, help="Segundos entre lecturas simuladas.")
+    parser.add_argument("--latencia", type=float, default=0.02)
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--perdida", type=float, default=0.0)
+    parser.add_argument("--bloqueante", action="store_true",
+                        help="Estaciones que atienden de a un cliente, como el Arduino UNO R4 WiFi.")
+    parser.add_argument("--max-concurrencia", type=int, default=16)
+    parser.add_argument("--filas", type=int, default=100000, help="Filas a exportar.")
+    parser.add_argument("--cuadros", type=int, default=300)
+    parser.add_argument("--puntos", type=int, default=100000, help="Historial cargado en la gráfica.")
+    parser.add_argument("--json", metavar="RUTA", help="Guardar los resultados (p. ej. como línea base).")
+    parser.add_argument("--comparar", metavar="RUTA", help="Resultados previos contra los cuales comparar.")
+    parser.add_argument("--tolerancia", type=float, default=10.0,
+                        help="Empeoramiento (%%) a partir del cual se marca una regresión.")
+    args = parser.parse_args()
+
+    suites = [s.strip() for s in args.suites.split(",") if s.strip()]
+    resultados = {}
+    if "sondeo" in suites:
+        flota = FlotaExterna(args.estaciones, args.periodo, args.latencia, args.jitter,
+                             args.perdida, args.bloqueante)
+        try:
+            resultados["sondeo"] = medir_sondeo(flota.ips, args.duracion, args.max_concurrencia)
+        finally:
+            flota.detener()
+        _imprimir("sondeo", resultados["sondeo"])
+    if "exportacion" in suites:
+        resultados["exportacion"] = medir_exportacion(args.filas)
+        _imprimir("exportacion", resultados["exportacion"])
+    if "grafica" in suites:
+        resultados["grafica"] = medir_grafica(args.cuadros, args.puntos)
+        _imprimir("grafica", resultados["grafica"])
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(resultados, f, indent=1)
+    if args.comparar:
+        with open(args.comparar) as f:
+            base = json.load(f)
+        print(f"[Benchmark] Contra {args.comparar} (tolerancia {args.tolerancia:g} %)")
+        regresiones = comparar(resultados, base, args.tolerancia)
+        if regresiones:
+            print(f"[Benchmark] {len(regresiones)} regresiones: {', '.join(regresiones)}")
+            sys.exit(1)
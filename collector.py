@@ -0,0 +1,161 @@
+import time
+
+# Referencia para medir el arranque en frío (ver startup.PRESUPUESTOS).
+_INICIO = time.perf_counter()
+
+import signal
+import argparse
+import threading
+
+from alerts import AlertEngine, cargar_reglas
+from backfill import Backfiller
+from quality import QualityFilter
+from metrics import METRICAS
+from polling import PollingEngine, Station
+from startup import modulos_cargados, reportar_arranque
+from stats import StatsEngine
+from storage import DB_PATH, HistoryStore
+
+# Cada cuánto se imprime el resumen en la consola.
+INTERVALO_RESUMEN = 60
+
+
+class Collector:
+    """
+    Recolector sin interfaz para equipos desatendidos.
+
+    Sondea las estaciones y guarda cada muestra en el historial SQLite, igual
+    que la ventana, pero sin cargar Qt ni la pila de gráficas. Si no se le dan
+    IPs, busca los Modulos por mDNS y empieza por las que recuerda la caché.
+    Los huecos por cortes de red se rellenan desde el log de la SD.
+    """
+
+    def __init__(self, estaciones=None, ruta_historial=DB_PATH, max_concurrencia=16, buscar=None,
+                 reglas_alertas=None):
+        self.store = HistoryStore(ruta_historial)
+        self.engine = PollingEngine([Station(ip) for ip in estaciones or []],
+                                    on_lote=self._on_lote, max_concurrencia=max_concurrencia)
+        self.backfill = Backfiller(store=self.store)
+        self.stats = StatsEngine(on_rollups=self.store.guardar_rollups)
+        self.calidad = QualityFilter()
+        self.alertas = AlertEngine(reglas_alertas, on_alertas=self._on_alertas)
+        METRICAS.medidor("cola_historial", self.store.pendientes)
+        self.buscar = not estaciones if buscar is None else buscar
+        self.directorio = None
+        self.muestras = 0
+        self._caidas = set()
+        self._por_nombre = {}
+        self._lock = threading.Lock()
+        self._hilo = None
+
+    def _on_lote(self, muestras, errores):
+        self.calidad.filtrar((data['station'], data) for data in muestras)
+        for data in muestras:
+            self.store.guardar(data['station'], data)
+            self.stats.agregar(data['station'], data)
+            self.backfill.observar(data['station'], data)
+            self._caidas.discard(data['station'])
+        self.muestras += len(muestras)
+        self.alertas.evaluar((data['station'], data) for data in muestras)
+
+        # Solo avisamos cuando una estación pasa de responder a no responder.
+        for estacion, mensaje in errores:
+            if estacion not in self._caidas:
+                self._caidas.add(estacion)
+                print(f"[Collector] {estacion}: {mensaje}")
+
+    def _on_alertas(self, eventos):
+        for evento in eventos:
+            estado = "ALERTA" if evento['estado'] == "activa" else "Resuelta"
+            print(f"[Alertas] {estado}: {evento['mensaje']}")
+
+    def _on_resuelta(self, nombre, ip):
+        with self._lock:
+            anterior = self._por_nombre.get(nombre)
+            self._por_nombre[nombre] = ip
+        if anterior == ip:
+            return
+        if anterior:
+            self.engine.reasignar_ip(anterior, ip)
+            self.backfill.reasignar_ip(anterior, ip)
+        elif all(estacion.ip != ip for estacion in self.engine.estaciones):
+            print(f"[Collector] Nueva estación por mDNS: {ip}")
+            self.engine.agregar_estacion(Station(ip))
+
+    def iniciar(self):
+        self.store.iniciar()
+        if self.buscar:
+            # discovery (y con él zeroconf) solo se importa si hay que buscar.
+            from discovery import StationDirectory
+            self.directorio = StationDirectory()
+            for ip in self.directorio.ips_en_cache():
+                if all(estacion.ip != ip for estacion in self.engine.estaciones):
+                    self.engine.agregar_estacion(Station(ip))
+            self.directorio.observar(self._on_resuelta)
+            self.directorio.iniciar()
+
+        self._hilo = threading.Thread(target=self.engine.run, name="collector-poller", daemon=True)
+        self._hilo.start()
+        print(f"[Collector] Sondeando {len(self.engine.estaciones)} estaciones"
+              + (" y buscando más por mDNS" if self.buscar else "")
+              + f"; historial en {self.store.ruta}")
+
+    def resumen(self):
+        activas = len(self.engine.estaciones) - len(self._caidas)
+        return f"[Collector] {self.muestras} muestras guardadas, {activas}/{len(self.engine.estaciones)} estaciones respondiendo"
+
+    def detener(self):
+        self.engine.stop()
+        if self._hilo is not None:
+            self._hilo.join(timeout=5)
+        self.backfill.detener()
+        self.stats.vaciar()
+        if self.directorio:
+            self.directorio.cerrar()
+        self.store.cerrar()
+
+
+# --- PUNTO DE ENTRADA ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recolector sin interfaz del Sistema Climático.")
+    parser.add_argument("estaciones", nargs="*", metavar="IP",
+                        help="Estaciones a sondear (sin IPs se buscan por mDNS).")
+    parser.add_argument("--historial", default=DB_PATH, metavar="RUTA",
+                        help="Base SQLite donde se guarda el historial.")
+    parser.add_argument("--max-concurrencia", type=int, default=16)
+    parser.add_argument("--mdns", action="store_true",
+                        help="Buscar por mDNS aunque se den IPs.")
+    parser.add_argument("--metricas", type=int, metavar="PUERTO",
+                        help="Servir métricas del sondeo en http://127.0.0.1:PUERTO/metrics.")
+    parser.add_argument("--alertas", metavar="RUTA",
+                        help="Archivo JSON con las reglas de alerta (por defecto: sensores sin lectura y lluvia).")
+    args = parser.parse_args()
+
+    reglas_alertas = None
+    if args.alertas:
+        try:
+            reglas_alertas = cargar_reglas(args.alertas)
+        except (OSError, ValueError) as e:
+            print(f"[Alertas] {e}")
+            raise SystemExit(1)
+
+    collector = Collector(args.estaciones, ruta_historial=args.historial,
+                          max_concurrencia=args.max_concurrencia,
+                          buscar=True if args.mdns else None, reglas_alertas=reglas_alertas)
+    collector.iniciar()
+    if args.metricas is not None:
+        METRICAS.servir(args.metricas)
+    reportar_arranque("collector", _INICIO)
+    if modulos_cargados():
+        print(f"[Arranque] Aviso: el modo sin interfaz cargó {', '.join(modulos_cargados())}")
+
+    parar = threading.Event()
+    # systemd y compañía detienen el servicio con SIGTERM.
+    signal.signal(signal.SIGTERM, lambda *args: parar.set())
+    try:
+        while not parar.wait(INTERVALO_RESUMEN):
+            print(collector.resumen())
+    except KeyboardInterrupt:
+        pass
+    collector.detener()
+    print(collector.resumen())
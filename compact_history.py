@@ -0,0 +1,239 @@
+import bisect
+import zlib
+
+import numpy as np
+
+from ring_buffer import COLUMNAS
+
+# Muestras por bloque. Un bloque caliente ocupa ~100 KB; comprimido, unos pocos KB.
+TAM_BLOQUE = 4096
+
+# Bloques fríos descomprimidos que se conservan para consultas repetidas.
+BLOQUES_EN_CACHE = 8
+
+# La máscara de calidad también va en float32: sus 15 bits caben exactos.
+_VALORES = COLUMNAS[1:]
+
+
+# --- CODIFICACIÓN ---
+def _barajar(arreglo):
+    """Agrupa los bytes por posición (todos los bytes 0, luego los 1...); deflate lo agradece."""
+    return np.ascontiguousarray(arreglo.view(np.uint8).reshape(len(arreglo), -1).T).tobytes()
+
+
+def _desbarajar(datos, dtype, n):
+    ancho = np.dtype(dtype).itemsize
+    return np.ascontiguousarray(np.frombuffer(datos, np.uint8).reshape(ancho, n).T).view(dtype).ravel()
+
+
+def codificar_tiempos(t):
+    """Timestamps (s) a milisegundos enteros con delta-de-delta: un muestreo regular da casi puros ceros."""
+    ms = np.round(np.asarray(t) * 1000).astype(np.int64)
+    # dd[0] es el origen, dd[1] el primer delta y el resto la variación del delta.
+    deltas = np.diff(ms)
+    dd = np.concatenate([ms[:1], deltas[:1], np.diff(deltas)])
+    return zlib.compress(_barajar(dd))
+
+
+def decodificar_tiempos(datos, n):
+    dd = _desbarajar(zlib.decompress(datos), np.int64, n)
+    deltas = np.cumsum(dd[1:])
+    return np.concatenate([dd[:1], dd[0] + np.cumsum(deltas)]) / 1000.0
+
+
+def codificar_valores(x):
+    """float32 con XOR contra el valor anterior (como Gorilla): los bits que no cambian quedan en cero."""
+    bits = np.asarray(x, dtype=np.float32).view(np.uint32)
+    xor = bits.copy()
+    xor[1:] ^= bits[:-1]
+    return zlib.compress(_barajar(xor))
+
+
+def decodificar_valores(datos, n):
+    xor = _desbarajar(zlib.decompress(datos), np.uint32, n)
+    return np.bitwise_xor.accumulate(xor).view(np.float32)
+
+
+class _BloqueFrio:
+    __slots__ = ("t_min", "t_max", "n", "tiempos", "valores")
+
+    def __init__(self, t, valores):
+        # Los límites, redondeados igual que lo que devuelve descomprimir().
+        self.t_min = round(float(t[0]) * 1000) / 1000
+        self.t_max = round(float(t[-1]) * 1000) / 1000
+        self.n = len(t)
+        self.tiempos = codificar_tiempos(t)
+        self.valores = [codificar_valores(v) for v in valores]
+
+    @property
+    def nbytes(self):
+        return len(self.tiempos) + sum(len(v) for v in self.valores)
+
+    def descomprimir(self):
+        return decodificar_tiempos(self.tiempos, self.n), np.vstack(
+            [decodificar_valores(v, self.n) for v in self.valores])
+
+
+class CompactHistory:
+    """
+    Historial largo de una estación en poca memoria.
+
+    Las muestras nuevas van a un bloque "caliente" preasignado (timestamps
+    en float64, sensores en float32). Cuando se llena se comprime a un
+    bloque "frío": tiempos en milisegundos con delta-de-delta y valores con
+    XOR contra el anterior al estilo Gorilla, bytes agrupados y deflate.
+    Las consultas solo descomprimen los bloques que tocan el rango pedido,
+    y los últimos usados quedan en caché.
+
+    Es para graficar y exportar sin disco: los timestamps se redondean al
+    milisegundo y los valores a float32 (~7 cifras), de sobra para los
+    sensores del Modulo.
+    """
+
+    def __init__(self, retencion=None, tam_bloque=TAM_BLOQUE):
+        self.retencion = retencion
+        self.tam_bloque = tam_bloque
+        self._frios = []
+        self._inicios = []
+        self._t = np.empty(tam_bloque)
+        self._v = np.empty((len(_VALORES), tam_bloque), dtype=np.float32)
+        self._n = 0
+        self._cache = {}
+
+    def __len__(self):
+        return self._n + sum(b.n for b in self._frios)
+
+    @property
+    def nbytes(self):
+        """Memoria que ocupan los datos (bloque caliente más bloques comprimidos)."""
+        return self._t.nbytes + self._v.nbytes + sum(b.nbytes for b in self._frios)
+
+    def _ultimo(self):
+        if self._n:
+            return self._t[self._n - 1]
+        return self._frios[-1].t_max if self._frios else -np.inf
+
+    # --- Escritura ---
+    def agregar(self, t, valores):
+        """Una muestra; `valores` en el orden de COLUMNAS[1:]."""
+        if t < self._ultimo():
+            self.mezclar({'timestamp': [t], **{c: [v] for c, v in zip(_VALORES, valores)}})
+            return
+        self._t[self._n] = t
+        self._v[:, self._n] = valores
+        self._n += 1
+        if self._n == self.tam_bloque:
+            self._congelar()
+
+    def extender(self, columnas):
+        """Muchas muestras ya ordenadas y más nuevas que las guardadas."""
+        t = np.asarray(columnas['timestamp'], dtype=float)
+        valores = np.vstack([np.asarray(columnas[c], dtype=np.float32) for c in _VALORES])
+        i = 0
+        while i < len(t):
+            k = min(self.tam_bloque - self._n, len(t) - i)
+            self._t[self._n:self._n + k] = t[i:i + k]
+            self._v[:, self._n:self._n + k] = valores[:, i:i + k]
+            self._n += k
+            i += k
+            if self._n == self.tam_bloque:
+                self._congelar()
+
+    def mezclar(self, columnas):
+        """
+        Inserta muestras atrasadas (backfill). Si caen en un bloque frío,
+        se descomprime, se mezcla y se vuelve a comprimir: es el caso raro.
+        """
+        t = np.asarray(columnas['timestamp'], dtype=float)
+        if len(t) == 0:
+            return
+        valores = np.vstack([np.asarray(columnas[c], dtype=np.float32) for c in _VALORES])
+        orden = np.argsort(t, kind='stable')
+        t, valores = t[orden], valores[:, orden]
+
+        # Lo que va en el bloque caliente (o después del último frío).
+        limite = self._frios[-1].t_max if self._frios else -np.inf
+        calientes = t > limite
+        if calientes.any():
+            todos_t = np.concatenate([self._t[:self._n], t[calientes]])
+            todos_v = np.concatenate([self._v[:, :self._n], valores[:, calientes]], axis=1)
+            orden = np.argsort(todos_t, kind='stable')
+            self._n = 0
+            self.extender({'timestamp': todos_t[orden],
+                           **{c: todos_v[i, orden] for i, c in enumerate(_VALORES)}})
+
+        # Lo que cae en el rango de bloques fríos.
+        frias = np.flatnonzero(~calientes)
+        if len(frias):
+            i_bloque = np.searchsorted(self._inicios, t[frias], side='right') - 1
+            for i in np.unique(np.maximum(i_bloque, 0)):
+                sel = frias[np.maximum(i_bloque, 0) == i]
+                bloque = self._frios[i]
+                bt, bv = bloque.descomprimir()
+                todos_t = np.concatenate([bt, t[sel]])
+                todos_v = np.concatenate([bv, valores[:, sel]], axis=1)
+                orden = np.argsort(todos_t, kind='stable')
+                self._frios[i] = _BloqueFrio(todos_t[orden], todos_v[:, orden])
+                self._inicios[i] = self._frios[i].t_min
+                self._cache.pop(id(bloque), None)
+
+    def _congelar(self):
+        bloque = _BloqueFrio(self._t[:self._n], self._v[:, :self._n])
+        self._frios.append(bloque)
+        self._inicios.append(bloque.t_min)
+        self._n = 0
+        if self.retencion:
+            limite = bloque.t_max - self.retencion
+            while self._frios and self._frios[0].t_max < limite:
+                viejo = self._frios.pop(0)
+                self._inicios.pop(0)
+                self._cache.pop(id(viejo), None)
+
+    # --- Lectura ---
+    def _bloque(self, bloque):
+        datos = self._cache.pop(id(bloque), None)
+        if datos is None:
+            datos = bloque.descomprimir()
+            if len(self._cache) >= BLOQUES_EN_CACHE:
+                self._cache.pop(next(iter(self._cache)))
+        # Reinsertado al final: el primero del dict es siempre el menos usado.
+        self._cache[id(bloque)] = datos
+        return datos
+
+    def primer_timestamp(self):
+        if self._frios:
+            return self._frios[0].t_min
+        return float(self._t[0]) if self._n else None
+
+    def consultar(self, inicio=None, fin=None, columnas=COLUMNAS):
+        """{columna: arreglo float64} con las muestras en [inicio, fin], en orden."""
+        inicio = -np.inf if inicio is None else inicio
+        fin = np.inf if fin is None else fin
+        partes_t, partes_v = [], []
+        desde = max(bisect.bisect_right(self._inicios, inicio) - 1, 0)
+        for bloque in self._frios[desde:]:
+            if bloque.t_min > fin:
+                break
+            if bloque.t_max < inicio:
+                continue
+            bt, bv = self._bloque(bloque)
+            partes_t.append(bt)
+            partes_v.append(bv)
+        if self._n:
+            partes_t.append(self._t[:self._n])
+            partes_v.append(self._v[:, :self._n])
+
+        if not partes_t:
+            return {c: np.empty(0) for c in columnas}
+        t = np.concatenate(partes_t)
+        i0, i1 = np.searchsorted(t, inicio, side='left'), np.searchsorted(t, fin, side='right')
+        resultado = {}
+        valores = None
+        for c in columnas:
+            if c == 'timestamp':
+                resultado[c] = t[i0:i1].copy()
+            else:
+                if valores is None:
+                    valores = np.concatenate(partes_v, axis=1)
+                resultado[c] = valores[_VALORES.index(c), i0:i1].astype(float)
+        return resultado
@@ -0,0 +1,242 @@
+import numpy as np
+
+
+class _Creciente:
+    """Arreglo 1-D que crece por duplicación; `datos` es la vista válida."""
+
+    def __init__(self, capacidad=1024):
+        self._buf = np.empty(capacidad)
+        self.n = 0
+
+    @property
+    def datos(self):
+        return self._buf[:self.n]
+
+    def truncar(self, n):
+        self.n = min(self.n, n)
+
+    def descartar(self, n):
+        """Quita los primeros `n` valores (la capacidad no cambia)."""
+        n = min(n, self.n)
+        self._buf[:self.n - n] = self._buf[n:self.n]
+        self.n -= n
+
+    def extender(self, valores):
+        fin = self.n + len(valores)
+        if fin > len(self._buf):
+            nuevo = np.empty(max(fin, 2 * len(self._buf)))
+            nuevo[:self.n] = self._buf[:self.n]
+            self._buf = nuevo
+        self._buf[self.n:fin] = valores
+        self.n = fin
+
+
+class _Nivel:
+    """Un nivel de resumen: por bloque, el mínimo y el máximo con su posición en x."""
+
+    def __init__(self):
+        self.x_min, self.y_min = _Creciente(), _Creciente()
+        self.x_max, self.y_max = _Creciente(), _Creciente()
+
+    def __len__(self):
+        return self.x_min.n
+
+    def truncar(self, n):
+        for arreglo in (self.x_min, self.y_min, self.x_max, self.y_max):
+            arreglo.truncar(n)
+
+    def descartar(self, n):
+        for arreglo in (self.x_min, self.y_min, self.x_max, self.y_max):
+            arreglo.descartar(n)
+
+
+def _reducir(x_min, y_min, x_max, y_max, factor):
+    """Agrupa de `factor` en `factor` y conserva el mínimo y el máximo de cada grupo."""
+    bloques = -(-len(y_min) // factor)
+    relleno = bloques * factor - len(y_min)
+
+    def preparar(arreglo, valor):
+        return np.concatenate([arreglo, np.full(relleno, valor)]).reshape(bloques, factor)
+
+    # Los NaN (huecos) no deben ganar ni el mínimo ni el máximo.
+    ymn = preparar(np.where(np.isnan(y_min), np.inf, y_min), np.inf)
+    ymx = preparar(np.where(np.isnan(y_max), -np.inf, y_max), -np.inf)
+    i_min = ymn.argmin(axis=1)
+    i_max = ymx.argmax(axis=1)
+    filas = np.arange(bloques)
+
+    nuevo_y_min = ymn[filas, i_min]
+    nuevo_y_max = ymx[filas, i_max]
+    nuevo_y_min[np.isinf(nuevo_y_min)] = np.nan
+    nuevo_y_max[np.isinf(nuevo_y_max)] = np.nan
+    return (preparar(x_min, np.nan)[filas, i_min], nuevo_y_min,
+            preparar(x_max, np.nan)[filas, i_max], nuevo_y_max)
+
+
+class LodPyramid:
+    """
+    Resúmenes min/max multi-resolución de una serie (x creciente).
+
+    El nivel 0 son las muestras crudas; cada nivel k agrupa `factor**k`
+    muestras. Al agregar datos solo se recalculan los bloques de la cola, y
+    `ventana()` elige el nivel más fino que no supera el presupuesto de
+    puntos, así el costo de dibujar depende de los píxeles y no del historial.
+    """
+
+    def __init__(self, factor=8):
+        self.factor = factor
+        self.x = _Creciente()
+        self.y = _Creciente()
+        self.niveles = []
+
+    def __len__(self):
+        return self.x.n
+
+    def limpiar(self):
+        self.x, self.y, self.niveles = _Creciente(), _Creciente(), []
+
+    def extender(self, x, y):
+        if len(x) == 0:
+            return
+        previas = self.x.n
+        self.x.extender(x)
+        self.y.extender(y)
+
+        # Cada nivel se recalcula desde el primer bloque que cambió.
+        hijo = (self.x.datos, self.y.datos, self.x.datos, self.y.datos)
+        cambio = previas
+        k = 0
+        while len(hijo[0]) > self.factor:
+            if k == len(self.niveles):
+                self.niveles.append(_Nivel())
+            nivel = self.niveles[k]
+            primer_bloque = cambio // self.factor
+            inicio = primer_bloque * self.factor
+            reducido = _reducir(*(arreglo[inicio:] for arreglo in hijo), self.factor)
+            nivel.truncar(primer_bloque)
+            for destino, valores in zip((nivel.x_min, nivel.y_min, nivel.x_max, nivel.y_max), reducido):
+                destino.extender(valores)
+            hijo = (nivel.x_min.datos, nivel.y_min.datos, nivel.x_max.datos, nivel.y_max.datos)
+            cambio = primer_bloque
+            k += 1
+        # Tras recortar() los niveles de arriba pueden sobrar.
+        del self.niveles[k:]
+
+    def recortar(self, x_minimo):
+        """
+        Descarta las muestras anteriores a `x_minimo` de a bloques completos
+        del nivel más grueso: así cada nivel pierde bloques enteros y sigue
+        alineado sin recalcular nada. Queda a lo sumo un bloque de más.
+        """
+        bloque = self.factor ** len(self.niveles)
+        viejas = int(np.searchsorted(self.x.datos, x_minimo, side='left'))
+        quitar = viejas // bloque * bloque
+        if quitar == 0:
+            return
+        self.x.descartar(quitar)
+        self.y.descartar(quitar)
+        escala = 1
+        for nivel in self.niveles:
+            escala *= self.factor
+            nivel.descartar(quitar // escala)
+
+    def ventana(self, x0, x1, pixeles):
+        """
+        Puntos a dibujar para el rango [x0, x1] con ~2 puntos por píxel.
+        Si caben, devuelve vistas de las muestras crudas sin copiar.
+        """
+        i0 = max(int(np.searchsorted(self.x.datos, x0, side='left')) - 1, 0)
+        i1 = min(int(np.searchsorted(self.x.datos, x1, side='right')) + 1, self.x.n)
+        presupuesto = max(int(pixeles), 1)
+        if i1 - i0 <= 2 * presupuesto:
+            return self.x.datos[i0:i1], self.y.datos[i0:i1]
+
+        escala = 1
+        for nivel in self.niveles:
+            escala *= self.factor
+            b0, b1 = i0 // escala, -(-i1 // escala)
+            if b1 - b0 <= presupuesto or nivel is self.niveles[-1]:
+                return self._intercalar(nivel, b0, b1)
+        return self.x.datos[i0:i1], self.y.datos[i0:i1]
+
+    @staticmethod
+    def _intercalar(nivel, b0, b1):
+        x_min, y_min = nivel.x_min.datos[b0:b1], nivel.y_min.datos[b0:b1]
+        x_max, y_max = nivel.x_max.datos[b0:b1], nivel.y_max.datos[b0:b1]
+        primero_min = x_min <= x_max
+        xs = np.empty(2 * len(x_min))
+        ys = np.empty(2 * len(x_min))
+        xs[0::2] = np.where(primero_min, x_min, x_max)
+        ys[0::2] = np.where(primero_min, y_min, y_max)
+        xs[1::2] = np.where(primero_min, x_max, x_min)
+        ys[1::2] = np.where(primero_min, y_max, y_min)
+        return xs, ys
+
+
+class LodPlot:
+    """
+    Conecta varias curvas de pyqtgraph que comparten un ViewBox con sus
+    LodPyramid y las vuelve a decimar cuando cambia el rango o el tamaño.
+
+    Mientras el usuario no mueva la vista, la gráfica sigue en vivo las
+    últimas `ventana` muestras; al hacer pan/zoom se queda quieta y el
+    botón "A" de pyqtgraph regresa al modo en vivo. Con `segundos`, solo
+    se conserva ese tramo antes de la última muestra (ver recortar()).
+    """
+
+    def __init__(self, plot_widget, curvas, ventana=50, factor=8, segundos=None):
+        self.curvas = list(curvas)
+        self.piramides = [LodPyramid(factor) for _ in self.curvas]
+        self.ventana = ventana
+        self.segundos = segundos
+        self.siguiendo = True
+        self._redibujando = False
+
+        self.vb = plot_widget.getPlotItem().getViewBox()
+        self.vb.sigRangeChangedManually.connect(self._on_rango_manual)
+        self.vb.sigStateChanged.connect(self._on_estado)
+        self.vb.sigXRangeChanged.connect(self.redibujar)
+        self.vb.sigResized.connect(self.redibujar)
+
+    def limpiar(self):
+        for piramide in self.piramides:
+            piramide.limpiar()
+        self.siguiendo = True
+
+    def extender(self, x, series):
+        for piramide, y in zip(self.piramides, series):
+            piramide.extender(x, y)
+            if self.segundos and len(piramide):
+                piramide.recortar(piramide.x.datos[-1] - self.segundos)
+        self.redibujar()
+
+    def _on_rango_manual(self, *args):
+        self.siguiendo = False
+
+    def _on_estado(self, *args):
+        # El botón "A" activa el auto-rango en x: lo tomamos como "volver a vivo".
+        if self.vb.autoRangeEnabled()[0]:
+            self.siguiendo = True
+            self.vb.enableAutoRange(x=False)
+            self.redibujar()
+
+    def redibujar(self, *args):
+        # setXRange vuelve a emitir sigXRangeChanged: evitamos la recursión.
+        if self._redibujando or not self.piramides or len(self.piramides[0]) == 0:
+            return
+        self._redibujando = True
+        try:
+            x = self.piramides[0].x.datos
+            if self.siguiendo:
+                x0 = x[max(len(x) - self.ventana, 0)]
+                x1 = x[-1]
+                if x1 > x0:
+                    self.vb.setXRange(x0, x1, padding=0)
+            else:
+                x0, x1 = self.vb.viewRange()[0]
+
+            pixeles = max(self.vb.width(), 100)
+            for curva, piramide in zip(self.curvas, self.piramides):
+                curva.setData(*piramide.ventana(x0, x1, pixeles))
+        finally:
+            self._redibujando = False
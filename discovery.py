@@ -0,0 +1,144 @@
+import os
+import json
+import socket
+import threading
+
+SERVICE_TYPE = "_http._tcp.local."
+SERVICE_NAME = "sistemaclima-tecnm"
+CACHE_PATH = os.path.join(os.path.expanduser("~"), ".sistema_climatico", "estaciones.json")
+
+
+# --- LÓGICA DE DETECCIÓN ---
+class ArduinoListener:
+    def __init__(self, on_found=None, on_removed=None):
+        self.arduino_info = None
+        self.on_found = on_found
+        self.on_removed = on_removed
+
+    def _resolver(self, zc, type_, name):
+        if SERVICE_NAME not in name:
+            return
+        info = zc.get_service_info(type_, name)
+        if info and info.addresses:
+            ip_address = socket.inet_ntoa(info.addresses[0])
+            self.arduino_info = {"ip": ip_address}
+            print(f"[Discovery] Arduino encontrado en: {ip_address}")
+            if self.on_found:
+                self.on_found(name, ip_address)
+
+    def add_service(self, zc, type_, name):
+        self._resolver(zc, type_, name)
+
+    def update_service(self, zc, type_, name):
+        # El Modulo vuelve a anunciarse tras wifi_reconnect(), a veces con otra IP.
+        self._resolver(zc, type_, name)
+
+    def remove_service(self, zc, type_, name):
+        if SERVICE_NAME in name:
+            print(f"[Discovery] El Modulo {name} dejó de anunciarse.")
+            if self.on_removed:
+                self.on_removed(name)
+
+
+class StationDirectory:
+    """
+    Navegador mDNS de larga duración con caché en disco.
+
+    Mantiene {nombre de servicio: ip} actualizado mientras la aplicación
+    vive, avisa a los suscriptores cuando una estación cambia de IP y guarda
+    las últimas direcciones para que el siguiente arranque pueda conectarse
+    sin esperar a mDNS.
+    """
+
+    def __init__(self, cache_path=CACHE_PATH):
+        self.cache_path = cache_path
+        self.direcciones = self._cargar_cache()
+        self._lock = threading.Lock()
+        self._resuelto = threading.Event()
+        self._ultimo = None
+        self._suscriptores = []
+        self._observadores = []
+        self._zeroconf = None
+        self._browser = None
+
+    def _cargar_cache(self):
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                return dict(json.load(f))
+        except (OSError, ValueError):
+            return {}
+
+    def _guardar_cache(self):
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            temporal = self.cache_path + ".tmp"
+            with open(temporal, "w", encoding="utf-8") as f:
+                json.dump(self.direcciones, f, indent=2)
+            os.replace(temporal, self.cache_path)
+        except OSError as e:
+            print(f"[Discovery] No se pudo guardar la caché: {e}")
+
+    def ips_en_cache(self):
+        return list(dict.fromkeys(self.direcciones.values()))
+
+    def suscribir(self, callback):
+        """callback(ip_anterior, ip_nueva) se llama desde el hilo de Zeroconf."""
+        self._suscriptores.append(callback)
+
+    def observar(self, callback):
+        """
+        callback(nombre, ip) se llama con cada resolución mDNS, empezando por
+        la última ya conocida si la hay.
+        """
+        with self._lock:
+            self._observadores.append(callback)
+            ultimo = dict(self._ultimo) if self._ultimo else None
+        if ultimo:
+            callback(ultimo["name"], ultimo["ip"])
+
+    def dejar_de_observar(self, callback):
+        with self._lock:
+            if callback in self._observadores:
+                self._observadores.remove(callback)
+
+    def iniciar(self):
+        if self._zeroconf is not None:
+            return
+        # zeroconf solo se carga si de verdad se va a buscar por mDNS.
+        from zeroconf import ServiceBrowser, Zeroconf
+        self._zeroconf = Zeroconf()
+        listener = ArduinoListener(on_found=self._on_found)
+        self._browser = ServiceBrowser(self._zeroconf, SERVICE_TYPE, listener)
+
+    def _on_found(self, nombre, ip):
+        with self._lock:
+            ip_anterior = self.direcciones.get(nombre)
+            self.direcciones[nombre] = ip
+            self._ultimo = {"ip": ip, "name": nombre}
+            if ip_anterior != ip:
+                self._guardar_cache()
+            observadores = list(self._observadores)
+        self._resuelto.set()
+
+        for callback in observadores:
+            callback(nombre, ip)
+
+        if ip_anterior and ip_anterior != ip:
+            print(f"[Discovery] {nombre} cambió de {ip_anterior} a {ip}")
+            for callback in self._suscriptores:
+                callback(ip_anterior, ip)
+
+    def esperar(self, timeout=5.0):
+        """Devuelve {"ip", "name"} en cuanto mDNS resuelve un Modulo, o {}."""
+        self.iniciar()
+        self._resuelto.wait(timeout)
+        with self._lock:
+            return dict(self._ultimo) if self._ultimo else {}
+
+    def cerrar(self):
+        if self._zeroconf is None:
+            return
+        self._browser.cancel()
+        self._zeroconf.close()
+        self._zeroconf = None
+        self._browser = None
@@ -1,56 +1,272 @@
-from PyQt5.QtWidgets import QFileDialog
-from openpyxl import Workbook
-from collections import deque
+import os
+import csv
+import gzip
+import time
+import itertools
+from datetime import datetime
 
+import numpy as np
+from PyQt5.QtWidgets import QFileDialog, QInputDialog
 
-def export_data_to_excel(parent_window, status_bar,
-                         temp_history: deque,
-                         hum_history: deque,
-                         pres_history: deque,
-                         qai_history: deque):
+from ring_buffer import COLUMNAS, SENSORES
+
+ENCABEZADOS = ["Estación", "Fecha", "Timestamp", "Temperatura (°C)", "Humedad (%)",
+               "Presión (mbar)", "QAI", "Lluvia", "Calidad"]
+
+FILTROS = ("Archivos de Excel (*.xlsx);;CSV (*.csv);;CSV comprimido (*.csv.gz);;"
+           "NumPy columnar (*.npz);;Todos los archivos (*)")
+
+RANGOS = {
+    "Todo el historial": None,
+    "Última hora": 3600,
+    "Últimas 24 horas": 24 * 3600,
+    "Últimos 7 días": 7 * 24 * 3600,
+}
+
+# Formato de cada sensor en CSV, en el orden de SENSORES.
+FORMATOS_CSV = ("%.2f", "%.2f", "%.2f", "%g", "%g")
+
+# Excel admite 1,048,576 filas por hoja; dejamos margen para el encabezado.
+FILAS_POR_HOJA = 1_000_000
+
+
+# --- FUENTES DE DATOS ---
+def fecha_local(timestamps):
+    """Convierte timestamps (s) a datetimes locales."""
+    return [datetime.fromtimestamp(t) for t in timestamps.tolist()]
+
+
+def fecha_local_iso(timestamps):
+    """Timestamps (s) a texto ISO 8601 en hora local, vectorizado con NumPy."""
+    if len(timestamps) == 0:
+        return []
+    inicio = time.localtime(timestamps[0]).tm_gmtoff
+    fin = time.localtime(timestamps[-1]).tm_gmtoff
+    if inicio == fin:
+        desfase = inicio
+    else:
+        # El bloque cruza un cambio de horario: desfase por muestra.
+        desfase = np.array([time.localtime(t).tm_gmtoff for t in timestamps.tolist()])
+    return np.datetime_as_string((timestamps + desfase).astype('datetime64[s]')).tolist()
+
+
+def _como_texto(valores, formato):
+    """Valores formateados para CSV; NaN (descartado por calidad) queda como campo vacío."""
+    textos = [formato % x for x in valores.tolist()]
+    for i in np.flatnonzero(np.isnan(valores)).tolist():
+        textos[i] = ""
+    return textos
+
+
+def _con_vacios(valores):
+    """Lista de valores con None en lugar de NaN (openpyxl escribe NaN como texto)."""
+    if np.isnan(valores).any():
+        return np.where(np.isnan(valores), None, valores).tolist()
+    return valores.tolist()
+
+
+# --- ESCRITORES ---
+def escribir_xlsx(ruta, bloques, progreso):
+    # openpyxl tarda ~0.1-0.2 s en importarse: solo lo paga quien exporta a Excel.
+    from openpyxl import Workbook
+
+    # write_only: las filas se vuelcan al disco conforme se agregan.
+    wb = Workbook(write_only=True)
+    ws, filas_hoja, hojas = None, FILAS_POR_HOJA, 0
+    for estacion, columnas in bloques:
+        tiempo = columnas['timestamp']
+        # Lo que descartó el filtro de calidad (NaN) va como celda vacía.
+        filas = zip(fecha_local(tiempo), tiempo.tolist(),
+                    *(_con_vacios(columnas[c]) for c in SENSORES),
+                    columnas['quality'].astype(np.int64).tolist())
+        for fila in filas:
+            if filas_hoja >= FILAS_POR_HOJA:
+                hojas += 1
+                ws = wb.create_sheet("Datos de Sensores" if hojas == 1 else f"Datos de Sensores {hojas}")
+                ws.append(ENCABEZADOS)
+                filas_hoja = 0
+            ws.append([estacion, *fila])
+            filas_hoja += 1
+        progreso(len(tiempo))
+    if ws is None:
+        wb.create_sheet("Datos de Sensores").append(ENCABEZADOS)
+    wb.save(ruta)
+
+
+def escribir_csv(ruta, bloques, progreso):
+    comprimido = ruta.lower().endswith(".gz")
+    abrir = gzip.open if comprimido else open
+    opciones = {"compresslevel": 1} if comprimido else {}
+    with abrir(ruta, "wt", encoding="utf-8", newline="", **opciones) as f:
+        # csv.writer entrecomilla lo que haga falta (p. ej. un nombre de estación con coma).
+        escritor = csv.writer(f, lineterminator="\n")
+        escritor.writerow(ENCABEZADOS)
+        for estacion, columnas in bloques:
+            tiempo = columnas['timestamp']
+            escritor.writerows(zip(itertools.repeat(estacion), fecha_local_iso(tiempo),
+                                   _como_texto(tiempo, "%.3f"),
+                                   *(_como_texto(columnas[c], formato)
+                                     for c, formato in zip(SENSORES, FORMATOS_CSV)),
+                                   columnas['quality'].astype(np.int64).tolist()))
+            progreso(len(tiempo))
+
+
+def escribir_npz(ruta, bloques, progreso):
     """
-    Abre un diálogo "Guardar como" y exporta el historial
-    de datos de los sensores a un archivo .xlsx.
+    Formato columnar: un arreglo por columna más `station` (índice en
+    `stations`). Se lee con np.load(ruta) sin necesidad de pickle.
+
+    Cada columna se vuelca a un archivo temporal junto a `ruta` conforme
+    llegan los bloques y al final se copia por trozos dentro del .npz, así
+    la memoria no depende del tamaño de la exportación.
     """
+    import shutil
+    import tempfile
+    import zipfile
+
+    nombres, filas, tipos = [], 0, {}
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(ruta)), prefix=".npz-") as carpeta:
+        archivos = {c: open(os.path.join(carpeta, c), "w+b") for c in ("station", *COLUMNAS)}
+        try:
+            for estacion, columnas in bloques:
+                if estacion not in nombres:
+                    nombres.append(estacion)
+                n = len(columnas['timestamp'])
+                bloque = {c: np.asarray(columnas[c]) for c in COLUMNAS}
+                bloque['station'] = np.full(n, nombres.index(estacion), dtype=np.int32)
+                for c, arreglo in bloque.items():
+                    tipo = tipos.setdefault(c, arreglo.dtype)
+                    archivos[c].write(np.ascontiguousarray(arreglo, dtype=tipo).tobytes())
+                filas += n
+                progreso(n)
 
-    status_bar.showMessage("Generando archivo de Excel...")
+            with zipfile.ZipFile(ruta, "w", zipfile.ZIP_STORED, allowZip64=True) as npz:
+                with npz.open("stations.npy", "w") as f:
+                    np.lib.format.write_array(f, np.array(nombres, dtype=str))
+                for c, archivo in archivos.items():
+                    tipo = tipos.get(c, np.dtype(np.int32 if c == 'station' else float))
+                    with npz.open(f"{c}.npy", "w", force_zip64=True) as f:
+                        np.lib.format.write_array_header_1_0(f, {
+                            "descr": np.lib.format.dtype_to_descr(tipo),
+                            "fortran_order": False, "shape": (filas,)})
+                        archivo.seek(0)
+                        shutil.copyfileobj(archivo, f, 1 << 20)
+        finally:
+            for archivo in archivos.values():
+                archivo.close()
+
+
+def escritor_para(ruta):
+    """Escritor según la extensión de `ruta`; ValueError si no es una conocida."""
+    nombre = ruta.lower()
+    if nombre.endswith(".npz"):
+        return escribir_npz
+    if nombre.endswith(".csv") or nombre.endswith(".csv.gz"):
+        return escribir_csv
+    if nombre.endswith(".xlsx"):
+        return escribir_xlsx
+    raise ValueError(f"No sé exportar a {os.path.basename(ruta)!r}: use .xlsx, .csv, .csv.gz o .npz.")
+
+
+# --- TRABAJO DE EXPORTACIÓN ---
+def exportar(ruta, estaciones, ruta_historial=None, inicio=None, fin=None, compartidos=None, progreso=None):
+    """
+    Escribe el archivo con las muestras de `estaciones` en [inicio, fin],
+    leídas del historial en `ruta_historial` o, sin historial, de
+    `compartidos` ({estacion: columnas}). Pensado para correr en otro
+    proceso (ver jobs.JobManager); `progreso(pct)` reporta el avance.
+    Devuelve {filas, segundos}.
+    """
+    t0 = time.perf_counter()
+    compartidos = compartidos or {}
+    store = None
+    if ruta_historial:
+        from storage import HistoryStore
+        store = HistoryStore(ruta_historial)
+
+    def bloques():
+        for estacion in estaciones:
+            if store:
+                for bloque in store.iterar(estacion, inicio, fin):
+                    yield estacion, bloque
+            elif estacion in compartidos:
+                yield estacion, compartidos[estacion]
+
+    if store:
+        total = sum(store.contar(e, inicio, fin) for e in estaciones)
+    else:
+        total = sum(len(c['timestamp']) for c in compartidos.values())
+    escritas = 0
+
+    def avanzar(filas):
+        nonlocal escritas
+        escritas += filas
+        if progreso and total:
+            progreso(min(100, 100 * escritas // total))
+
+    escritor_para(ruta)(ruta, bloques(), avanzar)
+    return {"filas": escritas, "segundos": time.perf_counter() - t0}
+
+
+def export_data(parent_window, status_bar, estacion_actual, estaciones, trabajos, store=None, historia=None):
+    """
+    Abre un diálogo "Guardar como", pregunta rango y estaciones y manda la
+    exportación a otro proceso con `trabajos` (un JobManager). Devuelve el
+    id del trabajo o None si se canceló.
+    """
+
+    status_bar.showMessage("Preparando exportación...")
 
     # 1. Pedir al usuario dónde guardar el archivo
     options = QFileDialog.Options()
-    filePath, _ = QFileDialog.getSaveFileName(parent_window, "Guardar Archivo", "",
-                                              "Archivos de Excel (*.xlsx);;Todos los archivos (*)", options=options)
+    filePath, filtro = QFileDialog.getSaveFileName(parent_window, "Guardar Archivo", "",
+                                                   FILTROS, options=options)
 
     if not filePath:
         # Si el usuario presionó "Cancelar"
         status_bar.showMessage("Exportación cancelada.")
-        return
-
-    # 2. Crear el libro de Excel en memoria
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Datos de Sensores"
-
-    # 3. Escribir los encabezados
-    ws.append(["Temperatura (°C)", "Humedad (%)", "Presión (mbar)", "QAI"])
-
-    # 4. Escribir los datos
-    temp_data = list(temp_history)
-    hum_data = list(hum_history)
-    pres_data = list(pres_history)
-    qai_data = list(qai_history)
-
-    for i in range(len(temp_data)):
-        ws.append([
-            temp_data[i] if i < len(temp_data) else None,
-            hum_data[i] if i < len(hum_data) else None,
-            pres_data[i] if i < len(pres_data) else None,
-            qai_data[i] if i < len(qai_data) else None
-        ])
-
-    # 5. Guardar el archivo en el disco
+        return None
+
+    extensiones = {"Archivos de Excel": ".xlsx", "CSV comprimido": ".csv.gz", "CSV": ".csv", "NumPy": ".npz"}
+    for nombre, extension in extensiones.items():
+        if filtro.startswith(nombre) and not filePath.endswith(extension):
+            filePath += extension
+            break
     try:
-        wb.save(filePath)
-        status_bar.showMessage(f"¡Datos exportados exitosamente!")
-    except Exception as e:
-        print(f"Error al guardar el archivo: {e}")
-        status_bar.showMessage(f"Error al guardar el archivo.")
\ No newline at end of file
+        escritor_para(filePath)
+    except ValueError as e:
+        status_bar.showMessage(f"Exportación cancelada. {e}")
+        return None
+
+    # 2. Filtros de rango de tiempo y estación
+    rango, ok = QInputDialog.getItem(parent_window, "Exportar", "Rango de tiempo:",
+                                     list(RANGOS), 0, False)
+    if not ok:
+        status_bar.showMessage("Exportación cancelada.")
+        return None
+    seleccion = [estacion_actual]
+    if len(estaciones) > 1:
+        opcion, ok = QInputDialog.getItem(parent_window, "Exportar", "Estaciones:",
+                                          ["Estación visible", "Todas las estaciones"], 0, False)
+        if not ok:
+            status_bar.showMessage("Exportación cancelada.")
+            return None
+        if opcion == "Todas las estaciones":
+            seleccion = list(estaciones)
+
+    segundos = RANGOS[rango]
+    inicio = time.time() - segundos if segundos else None
+
+    # 3. Sin historial en disco, lo que hay en memoria (ver HistoryQuery) se
+    # copia ahora a memoria compartida: el otro proceso lo lee de ahí, sin
+    # pickle y sin ver lo que siga llegando.
+    compartidos = None
+    if not store and historia:
+        compartidos = {e: historia.consultar(e, inicio=inicio) for e in seleccion}
+
+    # 4. Escribir en otro proceso
+    id_trabajo = trabajos.enviar(exportar, filePath, seleccion,
+                                 ruta_historial=store.ruta if store else None,
+                                 inicio=inicio, compartidos=compartidos)
+    status_bar.showMessage("Exportando... 0% (Esc para cancelar)")
+    return id_trabajo
@@ -0,0 +1,215 @@
+import os
+import queue
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+import numpy as np
+from PyQt5 import QtCore
+
+# Trabajos que pueden estar vivos a la vez (una bandera de cancelación cada uno).
+MAX_TRABAJOS = 64
+
+# Lo que el proceso hijo sabe de su trabajo actual (ver _iniciar_proceso).
+_cola_progreso = None
+_cancelados = None
+
+
+# --- MEMORIA COMPARTIDA ---
+def compartir(columnas):
+    """
+    Copia {nombre: arreglo} a un solo bloque de memoria compartida. Devuelve
+    (bloque, descriptor); el descriptor es lo único que viaja por pickle.
+    """
+    arreglos = {nombre: np.ascontiguousarray(valores) for nombre, valores in columnas.items()}
+    bloque = shared_memory.SharedMemory(create=True, size=max(sum(a.nbytes for a in arreglos.values()), 1))
+    disposicion, desplazamiento = [], 0
+    for nombre, arreglo in arreglos.items():
+        destino = np.ndarray(arreglo.shape, arreglo.dtype, buffer=bloque.buf, offset=desplazamiento)
+        destino[...] = arreglo
+        disposicion.append((nombre, arreglo.dtype.str, arreglo.shape, desplazamiento))
+        desplazamiento += arreglo.nbytes
+    return bloque, (bloque.name, disposicion)
+
+
+def abrir_compartido(descriptor):
+    """(bloque, {nombre: vista}) sobre un bloque creado con compartir(); sin copiar."""
+    nombre, disposicion = descriptor
+    bloque = shared_memory.SharedMemory(name=nombre)
+    return bloque, {n: np.ndarray(forma, dtype, buffer=bloque.buf, offset=desplazamiento)
+                    for n, dtype, forma, desplazamiento in disposicion}
+
+
+def _liberar(bloque, borrar=False):
+    try:
+        bloque.close()
+        if borrar:
+            bloque.unlink()
+    except (BufferError, FileNotFoundError):
+        pass
+
+
+# --- LADO DEL PROCESO HIJO ---
+def _iniciar_proceso(cola, cancelados):
+    global _cola_progreso, _cancelados
+    _cola_progreso, _cancelados = cola, cancelados
+
+
+def _ejecutar(id_trabajo, funcion, args, kwargs, compartidos):
+    """Corre `funcion` en el proceso hijo con sus arreglos y un `progreso(pct)` conectado a la GUI."""
+    ranura = id_trabajo % MAX_TRABAJOS
+
+    def progreso(porcentaje):
+        if _cancelados[ranura]:
+            raise InterruptedError("Trabajo cancelado")
+        _cola_progreso.put((id_trabajo, int(porcentaje)))
+
+    bloques, vistas = [], {}
+    try:
+        for clave, descriptor in compartidos.items():
+            bloque, vistas[clave] = abrir_compartido(descriptor)
+            bloques.append(bloque)
+        if vistas:
+            kwargs = dict(kwargs, compartidos=vistas)
+        resultado = funcion(*args, progreso=progreso, **kwargs)
+    finally:
+        # Sin vistas vivas el bloque se puede cerrar.
+        kwargs = vistas = None
+        for bloque in bloques:
+            _liberar(bloque)
+
+    # Los arreglos del resultado vuelven por memoria compartida; el padre la borra.
+    if isinstance(resultado, dict) and any(isinstance(v, np.ndarray) for v in resultado.values()):
+        arreglos = {k: v for k, v in resultado.items() if isinstance(v, np.ndarray)}
+        bloque, descriptor = compartir(arreglos)
+        _liberar(bloque)
+        resultado = {k: v for k, v in resultado.items() if k not in arreglos}
+        resultado["_compartido"] = descriptor
+    return resultado
+
+
+# --- LADO DE LA GUI ---
+class JobManager(QtCore.QObject):
+    """
+    Manda trabajos pesados (exportaciones, importaciones de la SD) a un
+    pool de procesos, así compiten por un núcleo aparte y no por el GIL
+    de la interfaz.
+
+    Los arreglos van y vuelven por memoria compartida, sin pickle. Cada
+    trabajo recibe un `progreso(pct)` que se reporta con la señal
+    `progreso(id, pct)` y que lanza InterruptedError si se pidió
+    cancelar(id). Al final se emite `terminado(id, resultado)`,
+    `cancelado(id)` o `fallido(id, mensaje)`, siempre en el hilo de la GUI.
+    """
+    progreso = QtCore.pyqtSignal(int, int)
+    terminado = QtCore.pyqtSignal(int, object)
+    cancelado = QtCore.pyqtSignal(int)
+    fallido = QtCore.pyqtSignal(int, str)
+    _hecho = QtCore.pyqtSignal(int, object)
+
+    def __init__(self, max_procesos=None, parent=None):
+        super().__init__(parent)
+        self.max_procesos = max_procesos or max(1, min(2, (os.cpu_count() or 2) - 1))
+        # spawn: un fork del proceso de Qt con hilos vivos no es seguro.
+        self._contexto = multiprocessing.get_context("spawn")
+        self._pool = None
+        self._cola = None
+        self._cancelados = None
+        self._ids = itertools.count(1)
+        self._pendientes = {}
+        self._hecho.connect(self._on_hecho)
+        self._timer = QtCore.QTimer(self)
+        self._timer.setInterval(100)
+        self._timer.timeout.connect(self._leer_progreso)
+
+    def _crear_pool(self):
+        self._cola = self._contexto.Queue()
+        self._cancelados = self._contexto.Array('b', MAX_TRABAJOS, lock=False)
+        self._pool = ProcessPoolExecutor(self.max_procesos, mp_context=self._contexto,
+                                         initializer=_iniciar_proceso,
+                                         initargs=(self._cola, self._cancelados))
+
+    def enviar(self, funcion, *args, compartidos=None, **kwargs):
+        """
+        Encola `funcion(*args, progreso=..., **kwargs)` (debe poder importarse
+        desde el hijo). `compartidos` es {clave: {nombre: arreglo}}; la
+        función lo recibe igual, pero leído de memoria compartida. Devuelve el id.
+        """
+        if len(self._pendientes) >= MAX_TRABAJOS:
+            raise RuntimeError("Demasiados trabajos en curso")
+        if self._pool is None:
+            self._crear_pool()
+        id_trabajo = next(self._ids)
+        self._cancelados[id_trabajo % MAX_TRABAJOS] = 0
+        bloques, descriptores = [], {}
+        for clave, columnas in (compartidos or {}).items():
+            bloque, descriptores[clave] = compartir(columnas)
+            bloques.append(bloque)
+        try:
+            futuro = self._pool.submit(_ejecutar, id_trabajo, funcion, args, kwargs, descriptores)
+        except BrokenProcessPool:
+            # Un hijo murió (p. ej. sin memoria): el pool queda inservible y se rehace.
+            self._pool.shutdown(wait=False)
+            self._crear_pool()
+            futuro = self._pool.submit(_ejecutar, id_trabajo, funcion, args, kwargs, descriptores)
+        self._pendientes[id_trabajo] = bloques
+        # El callback corre en un hilo del pool: la señal lo trae al de la GUI.
+        futuro.add_done_callback(lambda f: self._hecho.emit(id_trabajo, f))
+        self._timer.start()
+        return id_trabajo
+
+    def cancelar(self, id_trabajo=None):
+        """Pide cancelar un trabajo (o todos); el hijo se entera en su próximo progreso()."""
+        for i in ([id_trabajo] if id_trabajo is not None else list(self._pendientes)):
+            if i in self._pendientes:
+                self._cancelados[i % MAX_TRABAJOS] = 1
+
+    def en_curso(self, id_trabajo=None):
+        return id_trabajo in self._pendientes if id_trabajo is not None else bool(self._pendientes)
+
+    def _leer_progreso(self):
+        while True:
+            try:
+                id_trabajo, porcentaje = self._cola.get_nowait()
+            except queue.Empty:
+                break
+            if id_trabajo in self._pendientes:
+                self.progreso.emit(id_trabajo, porcentaje)
+        if not self._pendientes:
+            self._timer.stop()
+
+    def _on_hecho(self, id_trabajo, futuro):
+        self._leer_progreso()
+        for bloque in self._pendientes.pop(id_trabajo, ()):
+            _liberar(bloque, borrar=True)
+        if futuro.cancelled():
+            self.cancelado.emit(id_trabajo)
+            return
+        error = futuro.exception()
+        if isinstance(error, InterruptedError):
+            self.cancelado.emit(id_trabajo)
+        elif error is not None:
+            print(f"[Jobs Error] Trabajo {id_trabajo}: {error}")
+            self.fallido.emit(id_trabajo, f"{type(error).__name__}: {error}")
+        else:
+            self.terminado.emit(id_trabajo, self._desempacar(futuro.result()))
+
+    @staticmethod
+    def _desempacar(resultado):
+        if isinstance(resultado, dict) and "_compartido" in resultado:
+            resultado = dict(resultado)
+            bloque, arreglos = abrir_compartido(resultado.pop("_compartido"))
+            resultado.update({k: v.copy() for k, v in arreglos.items()})
+            del arreglos
+            _liberar(bloque, borrar=True)
+        return resultado
+
+    def cerrar(self):
+        """Cancela lo pendiente y espera a que los procesos terminen."""
+        self.cancelar()
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+        self._timer.stop()
@@ -1,48 +1,90 @@
 import sys
 import time
-import requests
-import socket
-from PyQt5 import QtCore, QtGui, QtWidgets
+
+# Referencia para medir el arranque en frío (ver startup.PRESUPUESTOS).
+_INICIO = time.perf_counter()
+
+import json
+import math
+import argparse
+import threading
+from PyQt5 import QtCore, QtGui, QtWidgets, sip
 from PyQt5.QtWidgets import QInputDialog, QApplication, QFileDialog, QMessageBox
-from zeroconf import ServiceBrowser, Zeroconf, ServiceListener
 from GUI.gui import Ui_MainWindow
 
-from collections import deque
-from export_utils import export_data_to_excel
+from polling import FirstResponder, PollingEngine, Station, sondear, es_timeout
+from scheduler import AdaptiveSchedule
+from discovery import StationDirectory
+from ring_buffer import COLUMNAS, BufferStore
+from storage import DB_PATH, HistoryStore
+from decimation import LodPlot
+from startup import reportar_arranque
+from backfill import Backfiller
+from stats import StatsEngine
+from query import HistoryQuery
+from metrics import ETAPAS, METRICAS
+from alerts import AlertEngine
+from quality import QualityFilter, motivos
+
+# (caja de la GUI, campo del JSON, formato) de cada sensor mostrado.
+SENSORES = (
+    ('temp', 'temperature', "{:.1f}°C"),
+    ('hum', 'humidity', "{:.1f}%"),
+    ('pres', 'pressure', "{:.1f} mbar"),
+    ('qai', 'aqi', "{:g}"),
+)
 
 
 # --- LÓGICA DE DETECCIÓN ---
-class ArduinoListener(ServiceListener):
-    def __init__(self):
-        self.arduino_info = None
-
-    def add_service(self, zc, type_, name):
-        if "sistemaclima-tecnm" in name:
-            info = zc.get_service_info(type_, name)
-            if info:
-                ip_address = socket.inet_ntoa(info.addresses[0])
-                self.arduino_info = {"ip": ip_address}
-                print(f"[Discovery] Arduino encontrado en: {ip_address}")
+class DiscoveryWorker(QtCore.QObject):
+    found = QtCore.pyqtSignal(dict)
+    finished = QtCore.pyqtSignal()
 
-    def update_service(self, zc, type_, name):
-        pass
+    def __init__(self, directorio, timeout=5.0):
+        super().__init__()
+        self.directorio = directorio
+        self.timeout = timeout
 
-    def remove_service(self, zc, type_, name):
-        pass
+    # Los run() de los workers son slots de Qt: conectar `started` a un
+    # método sin decorar deja un proxy de PyQt vivo por cada hilo creado.
+    @QtCore.pyqtSlot()
+    def run(self):
+        # Regresa en cuanto mDNS resuelve el Modulo; 5 s es solo el límite.
+        self.found.emit(self.directorio.esperar(self.timeout))
+        self.finished.emit()
 
 
-class DiscoveryWorker(QtCore.QObject):
+class ProbeWorker(QtCore.QObject):
+    """
+    Prueba todas las IPs conocidas y la búsqueda mDNS al mismo tiempo.
+    Emite {"ip", "data"} con la primera estación que responde, o {}.
+    """
     found = QtCore.pyqtSignal(dict)
     finished = QtCore.pyqtSignal()
 
+    def __init__(self, known_ips, directorio, timeout=2.5, espera_mdns=5.0):
+        super().__init__()
+        self.known_ips = list(known_ips)
+        self.directorio = directorio
+        self.timeout = timeout
+        self.espera_mdns = espera_mdns
+
+    @QtCore.pyqtSlot()
     def run(self):
-        zeroconf = Zeroconf()
-        listener = ArduinoListener()
-        browser = ServiceBrowser(zeroconf, "_http._tcp.local.", listener)
-        time.sleep(5)
-        browser.cancel()
-        zeroconf.close()
-        self.found.emit(listener.arduino_info if listener.arduino_info else {})
+        prober = FirstResponder(timeout=self.timeout)
+        for ip in self.known_ips:
+            prober.probar(ip)
+
+        def probar_resuelta(nombre, ip):
+            prober.probar(ip)
+
+        self.directorio.observar(probar_resuelta)
+        try:
+            ganador = prober.esperar(abierto_hasta=time.monotonic() + self.espera_mdns)
+        finally:
+            self.directorio.dejar_de_observar(probar_resuelta)
+
+        self.found.emit(ganador or {})
         self.finished.emit()
 
 
@@ -52,32 +94,127 @@ class ArduinoWorker(QtCore.QObject):
     error_ocurrido = QtCore.pyqtSignal(str)
     finished = QtCore.pyqtSignal()
 
-    def __init__(self, arduino_ip):
+    def __init__(self, arduino_ip, relay_url=None):
         super().__init__()
         self.arduino_url = f"http://{arduino_ip}/data"
+        self.arduino_ip = arduino_ip
         self.is_running = True
-
+        self._parar = threading.Event()
+        self.agenda = AdaptiveSchedule()
+
+        # Con relay nos suscribimos a su stream en lugar de sondear el Modulo.
+        self.relay_url = None
+        self._respuesta = None
+        # Último timestamp emitido por estación: al (re)conectar, el relay
+        # reenvía la última muestra que ya se recibió.
+        self._ultimos_relay = {}
+        if relay_url:
+            filtro = f"?station={arduino_ip}" if arduino_ip else ""
+            self.relay_url = f"{relay_url.rstrip('/')}/stream{filtro}"
+
+    @QtCore.pyqtSlot()
     def run(self):
+        # Se importa ya en el hilo del worker, no durante el arranque de la ventana.
+        import requests
+        if self.relay_url:
+            self._run_relay()
+            self.finished.emit()
+            return
+
         while self.is_running:
+            METRICAS.contar(self.arduino_ip, "solicitudes")
             try:
-                response = requests.get(self.arduino_url, timeout=2.5)
-                response.raise_for_status()
-                data = response.json()
-                self.datos_actualizados.emit(data)
-                time.sleep(1)
+                # Solo emitimos lecturas nuevas; la agenda decide cuándo volver.
+                nuevas = sondear(requests, self.arduino_url, self.agenda, 2.5)
+                for data in nuevas:
+                    data['_emitido'] = time.perf_counter()
+                    self.datos_actualizados.emit(data)
+                if nuevas:
+                    METRICAS.contar(self.arduino_ip, "muestras", len(nuevas))
+                else:
+                    METRICAS.contar(self.arduino_ip, "obsoletas")
             except Exception as e:
                 print(f"[ArduinoWorker Error]: {e}")
+                METRICAS.contar(self.arduino_ip, "timeouts" if es_timeout(e) else "errores")
                 self.error_ocurrido.emit(f"Error: {type(e).__name__}")
-                time.sleep(5)
+                self.agenda.registrar_fallo(time.monotonic())
+            self._parar.wait(max(0.0, self.agenda.siguiente() - time.monotonic()))
         self.finished.emit()
 
+    def _run_relay(self):
+        import requests
+        while self.is_running:
+            try:
+                with requests.get(self.relay_url, stream=True, timeout=(2.5, 30)) as response:
+                    self._respuesta = response
+                    response.raise_for_status()
+                    for linea in response.iter_lines(decode_unicode=True):
+                        if not self.is_running:
+                            break
+                        if linea and linea.startswith("data:"):
+                            data = json.loads(linea[5:])
+                            estacion, marca = data.get('station'), data.get('timestamp')
+                            if marca is not None:
+                                if marca <= self._ultimos_relay.get(estacion, -math.inf):
+                                    continue
+                                self._ultimos_relay[estacion] = marca
+                            data['_emitido'] = time.perf_counter()
+                            self.datos_actualizados.emit(data)
+            except Exception as e:
+                if not self.is_running:
+                    break
+                print(f"[ArduinoWorker Error]: {e}")
+                self.error_ocurrido.emit(f"Error: {type(e).__name__}")
+                self._parar.wait(5)
+            finally:
+                self._respuesta = None
+
     def stop(self):
         self.is_running = False
+        self._parar.set()
+        respuesta = self._respuesta
+        if respuesta is not None:
+            # Desbloquea iter_lines sin esperar al siguiente evento del relay.
+            respuesta.close()
+
+
+class MultiStationWorker(QtCore.QObject):
+    """Sondea varias estaciones en un solo hilo Qt y entrega lotes."""
+    lote_datos = QtCore.pyqtSignal(list, list)
+    finished = QtCore.pyqtSignal()
+
+    def __init__(self, estaciones, max_concurrencia=16):
+        super().__init__()
+        self.engine = PollingEngine([Station(ip) for ip in estaciones],
+                                    on_lote=self._emitir_lote,
+                                    max_concurrencia=max_concurrencia)
+
+    def _emitir_lote(self, muestras, errores):
+        # Para medir cuánto tarda la señal en cruzar al hilo de la GUI.
+        emitido = time.perf_counter()
+        for data in muestras:
+            data['_emitido'] = emitido
+        self.lote_datos.emit(muestras, errores)
+
+    @QtCore.pyqtSlot()
+    def run(self):
+        self.engine.run()
+        self.finished.emit()
+
+    def stop(self):
+        self.engine.stop()
 
 
 # --- LA APLICACIÓN PRINCIPAL ---
 class EstacionApp(Ui_MainWindow):
-    def __init__(self):
+    ip_estacion_cambiada = QtCore.pyqtSignal(str, str)
+    muestras_recuperadas = QtCore.pyqtSignal(str, object)
+
+    def __init__(self, estaciones=None, max_concurrencia=16, modo_conexion="paralelo",
+                 puntos_grafica=50, puntos_historial=500, ruta_historial=DB_PATH,
+                 horas_grafica=24, relay_url=None, fps_maximo=30, puerto_metricas=None,
+                 overlay_metricas=False, replay=None, cerrar_al_terminar=False, horas_memoria=24,
+                 reglas_alertas=None, tablero=False, directorio=None):
         super().__init__()
 
         self.KNOWN_IPS = [
@@ -85,7 +222,27 @@ class EstacionApp(Ui_MainWindow):
             "172.20.0.44",  # 1. TecNM-ITQuerétaro
             "192.168.3.100",  # 2. HUAWEI-C137
         ]
+
+        # Navegador mDNS permanente; las IPs en caché se prueban primero.
+        self.directorio = directorio or StationDirectory()
+        for ip in reversed(self.directorio.ips_en_cache()):
+            if ip not in self.KNOWN_IPS:
+                self.KNOWN_IPS.insert(0, ip)
+        self.directorio.suscribir(self.ip_estacion_cambiada.emit)
+        self.ip_estacion_cambiada.connect(self.on_ip_cambiada)
+        # El navegador mDNS (y la carga de zeroconf) arranca ya con la
+        # ventana visible; los observadores reciben lo resuelto igual.
+        QtCore.QTimer.singleShot(0, self.directorio.iniciar)
         self.current_ip_index = 0
+        self.modo_conexion = modo_conexion
+        self.relay_url = relay_url
+        self.replay = replay
+        self.cerrar_al_terminar = cerrar_al_terminar
+
+        # Modo multi-estación: todas se sondean, se muestra self.arduino_ip
+        self.estaciones = list(estaciones or [])
+        self.max_concurrencia = max_concurrencia
+        self.ultimas_muestras = {}
 
         self.arduino_ip = None
         self.data_thread = None
@@ -94,33 +251,129 @@ class EstacionApp(Ui_MainWindow):
         self.has_connected_once = False
         self.connection_alert_box = None
 
-        # Listas para el gráfico
-        self.max_graph_points = 50
-        self.time_data = []
-        self.temp_data = []
-        self.hum_data = []
-        self.x_counter = 0
-
-        # Listas para historial de exportación
-        self.max_history_points = 500
-        self.temp_history = deque(maxlen=self.max_history_points)
-        self.hum_history = deque(maxlen=self.max_history_points)
-        self.pres_history = deque(maxlen=self.max_history_points)
-        self.qai_history = deque(maxlen=self.max_history_points)
+        # Buffers circulares por estación: la gráfica y la exportación
+        # leen vistas de NumPy sobre el mismo almacenamiento. Detrás de cada
+        # uno, `horas_memoria` de historial comprimido para no ir a disco.
+        self.max_graph_points = puntos_grafica
+        self.max_history_points = max(puntos_historial, puntos_grafica)
+        self.buffers = BufferStore(capacidad=self.max_history_points,
+                                   retencion=horas_memoria * 3600 if horas_memoria else None)
+
+        # Historial en disco; None desactiva la persistencia.
+        self.store = None
+        if ruta_historial:
+            self.store = HistoryStore(ruta_historial)
+            self.store.iniciar()
+
+        # Estadísticas móviles por sensor y rollups de 1 min / 1 h / 1 día,
+        # que se van guardando en el historial a medida que se cierran.
+        self.stats = StatsEngine(on_rollups=self.store.guardar_rollups if self.store else None)
+
+        # Consultas por rango de tiempo sobre buffers, memoria, disco y rollups.
+        self.historia = HistoryQuery(self.buffers, self.store, self.stats)
+
+        # Filtro de calidad: descarta caídas, valores imposibles y picos
+        # antes de que lleguen a memoria, disco, gráfica y alertas.
+        self.calidad = QualityFilter()
+
+        # Reglas de alerta: las muestras se juntan y se evalúan por lote
+        # cuando el ciclo de eventos queda libre, no una por una.
+        self.alertas = AlertEngine(reglas_alertas, on_alertas=self.on_alertas)
+        self._por_evaluar = []
+        self.alertas_timer = QtCore.QTimer(self)
+        self.alertas_timer.setSingleShot(True)
+        self.alertas_timer.setInterval(0)
+        self.alertas_timer.timeout.connect(self.evaluar_alertas)
+
+        # Lo que el Modulo registró en su SD durante un corte se recupera
+        # de /log al reconectar. Con relay no: el relay es quien le habla.
+        self.backfill = None
+        if not self.relay_url:
+            self.backfill = Backfiller(on_recuperadas=self.muestras_recuperadas.emit, store=self.store)
+            self.muestras_recuperadas.connect(self.integrar_recuperadas)
+
+        # Gráfica con decimación min/max: sigue en vivo las últimas
+        # max_graph_points muestras y permite hacer zoom sobre las horas
+        # precargadas (o, sin precarga, las que guarda la memoria): lo más
+        # viejo se descarta para que no crezca durante toda la sesión.
+        self.horas_grafica = horas_grafica
+        horas_lod = horas_grafica or horas_memoria
+        self.lod_plot = LodPlot(self.plot_widget, [self.temp_curve, self.hum_curve],
+                                ventana=self.max_graph_points,
+                                segundos=horas_lod * 3600 if horas_lod else None)
+        self._estacion_graficada = None
+        self._muestras_graficadas = 0
+
+        # Exportaciones e importaciones de la SD corren en otros procesos
+        # (ver jobs.JobManager, que se crea con el primer trabajo).
+        self.trabajos = None
+        self._exportacion = None
+        self._importacion = None
+        QtWidgets.QShortcut(QtGui.QKeySequence("Esc"), self).activated.connect(self.cancelar_trabajos)
+        QtWidgets.QShortcut(QtGui.QKeySequence("Ctrl+I"), self).activated.connect(self.importar_datalog_sd)
+
+        # Tablero con todas las estaciones (F2); se crea la primera vez que se abre.
+        self.tablero = None
+        QtWidgets.QShortcut(QtGui.QKeySequence("F2"), self).activated.connect(self.alternar_tablero)
+        if tablero:
+            QtCore.QTimer.singleShot(0, self.alternar_tablero)
+
+        # Ingesta y dibujo van separados: cada muestra solo marca la vista
+        # como pendiente y este temporizador redibuja a lo sumo fps_maximo
+        # veces por segundo, sin importar cuántas muestras lleguen.
+        self._textos_sensor = {}
+        self._ayudas_sensor = {}
+        self.render_timer = QtCore.QTimer(self)
+        self.render_timer.setSingleShot(True)
+        self.render_timer.setInterval(max(1, int(1000 / fps_maximo)))
+        self.render_timer.timeout.connect(self.renderizar)
+
+        # Métricas de la ingesta: endpoint local opcional y overlay (F3).
+        METRICAS.medidor("muestras_sin_dibujar", self._muestras_sin_dibujar)
+        METRICAS.medidor("memoria_buffers_kb", lambda: self.buffers.bytes_en_memoria() // 1024)
+        if self.store:
+            METRICAS.medidor("cola_historial", self.store.pendientes)
+        self.servidor_metricas = None
+        if puerto_metricas is not None:
+            self.servidor_metricas = METRICAS.servir(puerto_metricas)
+        self._crear_overlay_metricas()
+        if overlay_metricas:
+            self.alternar_overlay_metricas()
 
         self.iniciar_timer_reloj()
 
         self.search_btn.clicked.connect(self.iniciar_busqueda_arduino)
         self.importar_btn.clicked.connect(self.exportar_a_excel)
 
-        self.iniciar_conexion_secuencial()
+        if self.replay:
+            self.iniciar_replay()
+        elif self.relay_url:
+            self.iniciar_desde_relay()
+        elif self.estaciones:
+            self.iniciar_poller_multiple()
+        elif self.modo_conexion == "paralelo":
+            self.iniciar_conexion_paralela()
+        else:
+            self.iniciar_conexion_secuencial()
+
+    def hilo_datos_activo(self):
+        # Un hilo que terminó solo (p. ej. el replay) ya se destruyó con deleteLater.
+        return bool(self.data_thread) and not sip.isdeleted(self.data_thread) and self.data_thread.isRunning()
 
     def stop_current_worker(self):
         """Función de ayuda para detener cualquier hilo de datos activo."""
-        if self.data_thread and self.data_thread.isRunning():
+        if self.hilo_datos_activo():
+            # Un error que el worker ya dejó en cola no es de la conexión que
+            # sigue: sin desconectarlo, en la secuencia inicial detenía también
+            # al worker nuevo y saltaba una IP.
+            if hasattr(self.data_worker, 'error_ocurrido'):
+                self.data_worker.error_ocurrido.disconnect(self.mostrar_error)
             self.data_worker.stop()
             self.data_thread.quit()
             self.data_thread.wait()
+        # El hilo y el worker se destruyen con deleteLater: no se guardan
+        # referencias a objetos de C++ que ya no existen.
+        self.data_thread = self.data_worker = None
 
     def iniciar_conexion_secuencial(self):
         """
@@ -142,6 +395,41 @@ class EstacionApp(Ui_MainWindow):
 
         self.iniciar_hilo_trabajador()
 
+    def iniciar_conexion_paralela(self):
+        """
+        Prueba todas las self.KNOWN_IPS y mDNS a la vez; gana la primera
+        estación que responda a /data.
+        """
+        self.statusBar().showMessage("Buscando el Modulo en las IPs conocidas y en la red...")
+        self.search_btn.setEnabled(False)
+        self.search_btn.setText("Conectando...")
+
+        self.probe_thread = QtCore.QThread()
+        self.probe_worker = ProbeWorker(self.KNOWN_IPS, self.directorio)
+        self.probe_worker.moveToThread(self.probe_thread)
+        self.probe_thread.started.connect(self.probe_worker.run)
+        self.probe_worker.found.connect(self.on_probe_complete)
+        self.probe_worker.finished.connect(self.probe_thread.quit)
+        self.probe_worker.finished.connect(self.probe_worker.deleteLater)
+        self.probe_thread.finished.connect(self.probe_thread.deleteLater)
+        self.probe_thread.start()
+
+    def on_probe_complete(self, resultado):
+        if not resultado:
+            self.statusBar().showMessage("Conexión automática fallida. Use 'BUSCAR IP'.")
+            self.search_btn.setEnabled(True)
+            self.search_btn.setText("BUSCAR IP")
+            return
+
+        self.arduino_ip = resultado['ip']
+        self.ip_display.setText(self.arduino_ip)
+        # La respuesta de la sonda ya es una muestra válida: la mostramos sin
+        # esperar a la primera vuelta del worker, que la toma como ya vista.
+        self.iniciar_hilo_trabajador(muestra=resultado['data'])
+        if not self.relay_url:
+            # Con relay, su stream abre con esta misma lectura.
+            self.actualizar_todo(resultado['data'])
+
     def iniciar_busqueda_arduino(self):
         """Método 2: Detiene cualquier intento y usa Zeroconf."""
         self.stop_current_worker()
@@ -150,7 +438,7 @@ class EstacionApp(Ui_MainWindow):
         self.search_btn.setText("Buscando...")
         self.statusBar().showMessage("Buscando Arduino en la red...")
         self.discovery_thread = QtCore.QThread()
-        self.discovery_worker = DiscoveryWorker()
+        self.discovery_worker = DiscoveryWorker(self.directorio)
         self.discovery_worker.moveToThread(self.discovery_thread)
         self.discovery_thread.started.connect(self.discovery_worker.run)
         self.discovery_worker.found.connect(self.on_discovery_complete)
@@ -171,6 +459,25 @@ class EstacionApp(Ui_MainWindow):
             self.search_btn.setText("BUSCAR IP")
             self.solicitar_ip_manualmente()
 
+    def on_ip_cambiada(self, ip_anterior, ip_nueva):
+        """El Modulo se volvió a anunciar por mDNS con otra IP (p. ej. tras DHCP)."""
+        if self.relay_url:
+            # El relay sondea por su cuenta; aquí no hay nada que re-apuntar.
+            return
+        if self.estaciones:
+            if self.hilo_datos_activo():
+                self.data_worker.engine.reasignar_ip(ip_anterior, ip_nueva)
+            self.backfill.reasignar_ip(ip_anterior, ip_nueva)
+            return
+
+        if ip_anterior != self.arduino_ip:
+            return
+        self.statusBar().showMessage(f"El Modulo cambió a {ip_nueva}. Reconectando...")
+        self.stop_current_worker()
+        self.arduino_ip = ip_nueva
+        self.ip_display.setText(self.arduino_ip)
+        self.iniciar_hilo_trabajador()
+
     def solicitar_ip_manualmente(self):
         """Método 3: Fallback manual."""
         self.stop_current_worker()
@@ -189,55 +496,148 @@ class EstacionApp(Ui_MainWindow):
             self.search_btn.setEnabled(True)
             self.search_btn.setText("BUSCAR IP")
 
-    def iniciar_hilo_trabajador(self):
+    def iniciar_hilo_trabajador(self, muestra=None):
         self.is_connected = False
         if self.connection_alert_box:
             self.connection_alert_box.accept()
             self.connection_alert_box = None
 
         self.data_thread = QtCore.QThread()
-        self.data_worker = ArduinoWorker(arduino_ip=self.arduino_ip)
+        self.data_worker = ArduinoWorker(arduino_ip=self.arduino_ip, relay_url=self.relay_url)
+        if muestra is not None:
+            # Sin esto la agenda nueva no conoce su "seq" y la vuelve a pedir.
+            self.data_worker.agenda.registrar(muestra, time.monotonic())
         self.data_worker.moveToThread(self.data_thread)
         self.data_thread.started.connect(self.data_worker.run)
-        self.data_worker.datos_actualizados.connect(self.actualizar_todo)
+        if self.relay_url:
+            self.data_worker.datos_actualizados.connect(self.actualizar_desde_relay)
+        else:
+            self.data_worker.datos_actualizados.connect(self.actualizar_todo)
         self.data_worker.error_ocurrido.connect(self.mostrar_error)
         self.data_worker.finished.connect(self.data_thread.quit)
         self.data_worker.finished.connect(self.data_worker.deleteLater)
         self.data_thread.finished.connect(self.data_thread.deleteLater)
         self.data_thread.start()
 
+    def iniciar_poller_multiple(self):
+        """Sondea todas las estaciones configuradas con un único worker."""
+        self.stop_current_worker()
+        self.is_connected = False
+        self.arduino_ip = self.estaciones[0]
+        self.ip_display.setText(self.arduino_ip)
+        self.search_btn.setEnabled(False)
+        self.search_btn.setText("Conectando...")
+        self.statusBar().showMessage(f"Sondeando {len(self.estaciones)} estaciones...")
+
+        self.data_thread = QtCore.QThread()
+        self.data_worker = MultiStationWorker(self.estaciones, self.max_concurrencia)
+        self.data_worker.moveToThread(self.data_thread)
+        self.data_thread.started.connect(self.data_worker.run)
+        self.data_worker.lote_datos.connect(self.actualizar_lote)
+        self.data_worker.finished.connect(self.data_thread.quit)
+        self.data_worker.finished.connect(self.data_worker.deleteLater)
+        self.data_thread.finished.connect(self.data_thread.deleteLater)
+        self.data_thread.start()
+
+    def iniciar_desde_relay(self):
+        """Recibe las muestras del relay local en lugar de sondear el Modulo."""
+        self.arduino_ip = self.estaciones[0] if self.estaciones else None
+        self.ip_display.setText(self.arduino_ip or self.relay_url)
+        self.search_btn.setEnabled(False)
+        self.search_btn.setText("Conectando...")
+        self.statusBar().showMessage(f"Suscribiéndose al relay {self.relay_url}...")
+        self.iniciar_hilo_trabajador()
+
+    def iniciar_replay(self):
+        """Reproduce una grabación (ver replay.py) en lugar de hablar con el Modulo."""
+        self.search_btn.setEnabled(False)
+        self.search_btn.setText("Reproduciendo")
+        velocidad = f"{self.replay.velocidad:g}x" if self.replay.velocidad else "sin freno"
+        self.statusBar().showMessage(f"Reproduciendo grabación ({velocidad})...")
+
+        self.data_thread = QtCore.QThread()
+        self.data_worker = self.replay
+        self.data_worker.moveToThread(self.data_thread)
+        self.data_thread.started.connect(self.data_worker.run)
+        # Igual que con el relay: la estación visible es la de la primera muestra.
+        self.data_worker.datos_actualizados.connect(self.actualizar_desde_relay)
+        self.data_worker.error_ocurrido.connect(self.mostrar_error)
+        self.data_worker.terminado.connect(self.on_replay_terminado)
+        self.data_worker.finished.connect(self.data_thread.quit)
+        self.data_worker.finished.connect(self.data_worker.deleteLater)
+        self.data_thread.finished.connect(self.data_thread.deleteLater)
+        self.data_thread.start()
+
+    def on_replay_terminado(self, resumen):
+        """Informa qué tan rápido siguió el ritmo la ingesta, la estadística y la gráfica."""
+        velocidad = f"{resumen['velocidad']:g}x" if resumen['velocidad'] else "sin freno"
+        print(f"[Replay] {resumen['muestras']} muestras en {resumen['segundos']:.2f} s "
+              f"({resumen['muestras_por_s']:.0f} muestras/s, {velocidad})")
+        retraso = resumen['retraso']
+        if retraso and retraso['n']:
+            print(f"[Replay] Retraso de la GUI: p50 {retraso['p50'] * 1e3:.1f} ms, "
+                  f"p99 {retraso['p99'] * 1e3:.1f} ms, máx {retraso['max'] * 1e3:.1f} ms")
+        for etapa in ("senal", "ingesta", "render"):
+            r = METRICAS.etapas[etapa].resumen()
+            if r['n']:
+                print(f"[Replay] {etapa:<8} n={r['n']:<7} p50 {r['p50'] * 1e3:.3f} ms  "
+                      f"p99 {r['p99'] * 1e3:.3f} ms  máx {r['max'] * 1e3:.3f} ms")
+        self.statusBar().showMessage(
+            f"Reproducción terminada: {resumen['muestras']} muestras a {resumen['muestras_por_s']:.0f}/s.")
+        if self.cerrar_al_terminar:
+            self.close()
+
+    def actualizar_desde_relay(self, data):
+        # Sin estación elegida, mostramos la primera que publique el relay.
+        if self.arduino_ip is None:
+            self.arduino_ip = data['station']
+            self.ip_display.setText(self.arduino_ip)
+        self.actualizar_lote([data], [])
+
+    def actualizar_lote(self, muestras, errores):
+        """Recibe un lote del MultiStationWorker y actualiza la estación visible."""
+        # Todo el lote pasa por el filtro de calidad de una vez.
+        self.calidad.filtrar((data['station'], data) for data in muestras)
+        for data in muestras:
+            self.ultimas_muestras[data['station']] = data
+            if data['station'] == self.arduino_ip:
+                self.actualizar_todo(data)
+            else:
+                self.ingerir_muestra(data['station'], data)
+
+        for estacion, mensaje in errores:
+            if estacion != self.arduino_ip:
+                continue
+            if self.has_connected_once:
+                self.mostrar_error(mensaje)
+            else:
+                self.statusBar().showMessage(f"{mensaje} en {estacion}. Reintentando...")
+
     def iniciar_timer_reloj(self):
         self.timer = QtCore.QTimer(self)
         self.timer.timeout.connect(self.actualizar_reloj)
         self.timer.start(1000)
         self.actualizar_reloj()
 
-    def actualizar_sensor(self, sensor_name, nuevo_valor_str):
+    def actualizar_sensor(self, sensor_name, textos):
+        """Pone `textos` (del más reciente al más viejo) en la columna del sensor."""
         try:
             labels = self.sensor_labels[sensor_name]
-            labels[3].setText(labels[2].text())
-            labels[2].setText(labels[1].text())
-            labels[1].setText(labels[0].text())
-            labels[0].setText(nuevo_valor_str)
         except KeyError:
             print(f"Error: No se encontró la clave del sensor '{sensor_name}'")
-
-    def _actualizar_temp(self, temp):
-        self.actualizar_sensor('temp', f"{temp:.1f}°C")
-
-    def _actualizar_hum(self, hum):
-        self.actualizar_sensor('hum', f"{hum:.1f}%")
-
-    def _actualizar_presion(self, presion):
-        self.actualizar_sensor('pres', f"{presion:.1f} mbar")
-
-    def _actualizar_lluv(self, estado_lluvia):
-        self.rain_indicator.setState(estado_lluvia)
-
-    def _actualizar_qai(self, qai):
-        self.actualizar_sensor('qai', str(qai))
+            return
+        for label, texto in zip(labels, textos):
+            # setText invalida el layout aunque el texto no cambie.
+            if self._textos_sensor.get(id(label)) != texto:
+                self._textos_sensor[id(label)] = texto
+                label.setText(texto)
 
     def actualizar_todo(self, data):
+        # Primero la muestra: el aviso de reconexión abre un diálogo modal
+        # y mientras está abierto siguen llegando muestras más nuevas.
+        self.ingerir_muestra(data.get('station', self.arduino_ip), data)
+        self.programar_render()
+
         if not self.is_connected:
             self.is_connected = True
             self.statusBar().showMessage(f"¡Conexión establecida con {self.arduino_ip}!")
@@ -256,32 +656,211 @@ class EstacionApp(Ui_MainWindow):
             else:
                 self.has_connected_once = True
 
-        self._actualizar_temp(data['temperature'])
-        self._actualizar_hum(data['humidity'])
-        self._actualizar_presion(data['pressure'])
-        self._actualizar_qai(data['aqi'])
-        self._actualizar_lluv(data['rainfall'])
-
-        self.time_data.append(self.x_counter)
-        self.temp_data.append(data['temperature'])
-        self.hum_data.append(data['humidity'])
-        self.x_counter += 1
-
-        if len(self.time_data) > self.max_graph_points:
-            self.time_data.pop(0)
-            self.temp_data.pop(0)
-            self.hum_data.pop(0)
-
-        self.temp_history.append(data['temperature'])
-        self.hum_history.append(data['humidity'])
-        self.pres_history.append(data['pressure'])
-        self.qai_history.append(data['aqi'])
+    def programar_render(self):
+        """Pide un cuadro; las muestras que lleguen antes se dibujan juntas."""
+        # Minimizada no se dibuja: al restaurarla, changeEvent pide el cuadro.
+        if not self.render_timer.isActive() and not self.isMinimized():
+            self.render_timer.start()
+
+    def changeEvent(self, event):
+        if event.type() == QtCore.QEvent.WindowStateChange and not self.isMinimized():
+            self.programar_render()
+        super().changeEvent(event)
+
+    # --- Tablero de estaciones ---
+    def alternar_tablero(self):
+        if self.tablero is None:
+            from GUI.dashboard import Dashboard
+            self.tablero = Dashboard(self.buffers)
+            self.tablero.seleccionada.connect(self.inspeccionar_estacion)
+            self.tablero.resaltar(self.arduino_ip)
+        if self.tablero.isVisible():
+            self.tablero.hide()
+        else:
+            self.tablero.show()
+            self.tablero.raise_()
+
+    def inspeccionar_estacion(self, estacion):
+        """Lleva la estación elegida en el tablero a la vista detallada."""
+        if estacion != self.arduino_ip:
+            self.arduino_ip = estacion
+            self.ip_display.setText(estacion)
+            self._estacion_graficada = None
+            self._textos_sensor.clear()
+            self._ayudas_sensor.clear()
+            self.tablero.resaltar(estacion)
+            self.statusBar().showMessage(f"Mostrando {estacion}.")
+        self.programar_render()
+        self.showNormal()
+        self.activateWindow()
+
+    def renderizar(self):
+        """Vuelca a los widgets solo el estado más reciente de la estación visible."""
+        if self.arduino_ip is None:
+            return
+        buf = self.buffers.buffer(self.arduino_ip)
+        n = min(len(buf), 4)
+        if n == 0:
+            return
+        inicio = time.perf_counter()
+        # Columnas de las últimas n muestras, de la más reciente a la más vieja.
+        vista = buf.ultimos(n)[:, ::-1]
+        for sensor, columna, formato in SENSORES:
+            # Las lecturas que descartó el filtro de calidad se muestran como "--".
+            textos = [formato.format(v) if v == v else "--" for v in vista[COLUMNAS.index(columna)].tolist()]
+            self.actualizar_sensor(sensor, textos)
+            self.actualizar_ayuda_sensor(sensor, columna, formato)
+        self.rain_indicator.setState(vista[COLUMNAS.index('rainfall'), 0] > 0)
 
         self.actualizar_grafica()
+        METRICAS.registrar("render", time.perf_counter() - inicio)
+
+    def _muestras_sin_dibujar(self):
+        if self.arduino_ip is None:
+            return 0
+        return self.buffers.buffer(self.arduino_ip).total - self._muestras_graficadas
+
+    # --- Overlay de métricas ---
+    def _crear_overlay_metricas(self):
+        self.overlay_metricas = QtWidgets.QLabel(self.plot_widget)
+        self.overlay_metricas.setStyleSheet(
+            "background-color: rgba(0, 0, 0, 170); color: #9f9; padding: 6px;"
+            "font-family: monospace; font-size: 9pt;")
+        self.overlay_metricas.move(8, 8)
+        self.overlay_metricas.hide()
+        self._metricas_previas = {}
+        self.overlay_timer = QtCore.QTimer(self)
+        self.overlay_timer.setInterval(1000)
+        self.overlay_timer.timeout.connect(self.actualizar_overlay_metricas)
+        atajo = QtWidgets.QShortcut(QtGui.QKeySequence("F3"), self)
+        atajo.activated.connect(self.alternar_overlay_metricas)
+
+    def alternar_overlay_metricas(self):
+        if self.overlay_metricas.isVisible():
+            self.overlay_timer.stop()
+            self.overlay_metricas.hide()
+        else:
+            self.actualizar_overlay_metricas()
+            self.overlay_metricas.show()
+            self.overlay_metricas.raise_()
+            self.overlay_timer.start()
+
+    def actualizar_overlay_metricas(self):
+        """Latencias del último segundo por etapa, contadores de la estación visible y colas."""
+        lineas = [f"{'etapa':<8}{'n':>5}{'p50 ms':>9}{'p99 ms':>9}"]
+        for etapa in ETAPAS:
+            histograma = METRICAS.etapas[etapa]
+            resumen = histograma.resumen(self._metricas_previas.get(etapa))
+            self._metricas_previas[etapa] = histograma.instantanea()
+            if resumen["n"]:
+                lineas.append(f"{etapa:<8}{resumen['n']:>5}{resumen['p50'] * 1e3:>9.2f}{resumen['p99'] * 1e3:>9.2f}")
+            else:
+                lineas.append(f"{etapa:<8}{0:>5}{'-':>9}{'-':>9}")
+        contadores = METRICAS.contadores.get(self.arduino_ip, {})
+        if contadores:
+            lineas.append(" ".join(f"{nombre}={valor}" for nombre, valor in sorted(contadores.items())))
+        for nombre, funcion in METRICAS.medidores.items():
+            lineas.append(f"{nombre}: {funcion()}")
+        self.overlay_metricas.setText("\n".join(lineas))
+        self.overlay_metricas.adjustSize()
+
+    def actualizar_ayuda_sensor(self, sensor_name, columna, formato):
+        """Resumen de la última hora y, si el filtro la descartó, el motivo de la última lectura."""
+        resumen = self.stats.ventana(self.arduino_ip, columna)
+        descartada = motivos(self.buffers.buffer(self.arduino_ip).columna('quality', 1)[0], columna)
+        lineas = []
+        if resumen["n"]:
+            lineas += [f"Última hora ({resumen['n']} lecturas)",
+                       f"Media: {formato.format(resumen['media'])}",
+                       f"Mín: {formato.format(resumen['minimo'])}  Máx: {formato.format(resumen['maximo'])}",
+                       f"Desv. estándar: {resumen['desviacion']:.2f}"]
+        if descartada:
+            lineas.append(f"Última lectura descartada: {', '.join(descartada)}")
+        if not lineas:
+            return
+        ayuda = "\n".join(lineas)
+        label = self.sensor_labels[sensor_name][0]
+        if self._ayudas_sensor.get(sensor_name) != ayuda:
+            self._ayudas_sensor[sensor_name] = ayuda
+            label.setToolTip(ayuda)
+
+    def ingerir_muestra(self, estacion, data):
+        """Guarda la muestra en memoria y la encola para el historial en disco."""
+        inicio = time.perf_counter()
+        emitido = data.pop('_emitido', None)
+        if emitido is not None:
+            METRICAS.registrar("senal", inicio - emitido)
+        if 'quality' not in data:
+            # Muestra suelta (ArduinoWorker, replay de la SD); las del
+            # historial o de un lote ya vienen filtradas.
+            self.calidad.filtrar([(estacion, data)])
+        self.buffers.agregar(estacion, data)
+        self.stats.agregar(estacion, data)
+        if self.store:
+            self.store.guardar(estacion, data)
+        if self.backfill:
+            self.backfill.observar(estacion, data)
+        self._por_evaluar.append((estacion, data))
+        if not self.alertas_timer.isActive():
+            self.alertas_timer.start()
+        if self.tablero is not None:
+            self.tablero.marcar(estacion)
+        METRICAS.registrar("ingesta", time.perf_counter() - inicio)
+
+    def evaluar_alertas(self):
+        muestras, self._por_evaluar = self._por_evaluar, []
+        self.alertas.evaluar(muestras)
+
+    def on_alertas(self, eventos):
+        for evento in eventos:
+            estado = "ALERTA" if evento['estado'] == "activa" else "Resuelta"
+            print(f"[Alertas] {estado}: {evento['mensaje']}")
+        ultimo = eventos[-1]
+        self.statusBar().showMessage(("⚠ " if ultimo['estado'] == "activa" else "Resuelta: ") + ultimo['mensaje'])
+        if any(evento['estado'] == "activa" for evento in eventos):
+            # Parpadeo en la barra de tareas si la ventana no tiene el foco.
+            QApplication.alert(self)
+
+    def integrar_recuperadas(self, estacion, columnas):
+        """Mete en orden las lecturas que el Backfiller recuperó (ya están en disco)."""
+        self.buffers.mezclar(estacion, columnas)
+        self.stats.mezclar(estacion, columnas)
+        if estacion == self.arduino_ip:
+            # La gráfica solo sabe agregar al final: se reconstruye con el hueco lleno.
+            self._estacion_graficada = None
+            self.programar_render()
+        self.statusBar().showMessage(
+            f"Se recuperaron {len(columnas['timestamp'])} lecturas de {estacion} desde su SD.")
 
     def actualizar_grafica(self):
-        self.temp_curve.setData(self.time_data, self.temp_data)
-        self.hum_curve.setData(self.time_data, self.hum_data)
+        buf = self.buffers.buffer(self.arduino_ip)
+        if self._estacion_graficada != self.arduino_ip:
+            self._cargar_grafica_desde_historial(buf)
+
+        # Solo pasamos a la pirámide lo que llegó desde el último dibujo. Si
+        # fue más de lo que guarda el buffer (p. ej. mientras estaba
+        # minimizada), se recarga desde el historial.
+        nuevas = buf.total - self._muestras_graficadas
+        if nuevas > len(buf):
+            self._cargar_grafica_desde_historial(buf)
+            nuevas = buf.total - self._muestras_graficadas
+        vista = buf.ultimos(nuevas)
+        self._muestras_graficadas = buf.total
+        self.lod_plot.extender(vista[0], (vista[1], vista[2]))
+
+    def _cargar_grafica_desde_historial(self, buf):
+        """Al cambiar de estación, precarga las últimas horas (de memoria o del disco)."""
+        self.lod_plot.limpiar()
+        self._estacion_graficada = self.arduino_ip
+        self._muestras_graficadas = buf.total - len(buf)
+        if not self.horas_grafica:
+            return
+
+        primera_en_vivo = buf.columna('timestamp', len(buf))[:1]
+        fin = primera_en_vivo[0] - 1e-6 if len(primera_en_vivo) else time.time()
+        previo = self.historia.consultar(self.arduino_ip, ('temperature', 'humidity'),
+                                         fin - self.horas_grafica * 3600, fin)
+        self.lod_plot.extender(previo['timestamp'], (previo['temperature'], previo['humidity']))
 
     def actualizar_reloj(self):
         now = QtCore.QDateTime.currentDateTime()
@@ -292,6 +871,10 @@ class EstacionApp(Ui_MainWindow):
     def mostrar_error(self, mensaje):
         self.statusBar().showMessage(f"{mensaje}. Reintentando...")
 
+        # Con relay no hay IPs que probar: el worker reintenta solo.
+        if self.relay_url and not self.has_connected_once:
+            return
+
         # Si el error ocurre DURANTE la secuencia automática inicial...
         if not self.has_connected_once:
             print(f"Intento fallido para {self.arduino_ip}. Probando siguiente IP.")
@@ -317,29 +900,205 @@ class EstacionApp(Ui_MainWindow):
                                               "Los datos se están guardando en la SD del Modulo.\n"
                                               "La aplicación intentará reconectarse automáticamente.")
             self.connection_alert_box.setStandardButtons(QMessageBox.Ok)
+            # Al cerrarlo (el usuario o la reconexión) se destruye: si no, cada
+            # corte dejaba un QMessageBox oculto colgando de la ventana.
+            self.connection_alert_box.setAttribute(QtCore.Qt.WA_DeleteOnClose)
+            self.connection_alert_box.finished.connect(self._aviso_conexion_cerrado)
             self.connection_alert_box.show()
         else:
             self.is_connected = False
 
+    def _aviso_conexion_cerrado(self):
+        self.connection_alert_box = None
+
     def closeEvent(self, event):
         self.stop_current_worker()
+        if self.tablero:
+            self.tablero.close()
+        if self.trabajos:
+            self.trabajos.cerrar()
+        if self.backfill:
+            self.backfill.detener()
+        self.directorio.cerrar()
+        # Lo que va de la cubeta actual también se guarda.
+        self.stats.vaciar()
+        if self.store:
+            self.store.cerrar()
+        if self.servidor_metricas:
+            self.servidor_metricas.shutdown()
         event.accept()
 
     def exportar_a_excel(self):
-        export_data_to_excel(
+        if self._exportacion is not None:
+            self.statusBar().showMessage("Ya hay una exportación en curso.")
+            return
+        if not self.arduino_ip:
+            self.statusBar().showMessage("No hay datos para exportar.")
+            return
+
+        # export_utils arrastra openpyxl: se carga hasta que alguien exporta.
+        from export_utils import export_data
+
+        estaciones = self.store.estaciones() if self.store else self.buffers.estaciones()
+        if self.arduino_ip not in estaciones:
+            estaciones.insert(0, self.arduino_ip)
+        self._exportacion = export_data(
             parent_window=self,
             status_bar=self.statusBar(),
-            temp_history=self.temp_history,
-            hum_history=self.hum_history,
-            pres_history=self.pres_history,
-            qai_history=self.qai_history
+            estacion_actual=self.arduino_ip,
+            estaciones=estaciones,
+            trabajos=self._trabajos(),
+            store=self.store,
+            historia=self.historia
         )
 
+    def importar_datalog_sd(self):
+        """Importa el datalog.csv de la SD de la estación visible, en otro proceso."""
+        if self._importacion is not None:
+            self.statusBar().showMessage("Ya hay una importación en curso.")
+            return
+        if not (self.store and self.arduino_ip):
+            self.statusBar().showMessage("Para importar la SD hace falta el historial y una estación conectada.")
+            return
+        ruta, _ = QFileDialog.getOpenFileName(self, "Importar datalog de la SD", "",
+                                              "CSV (*.csv);;Todos los archivos (*)")
+        if not ruta:
+            return
+
+        from sd_import import importar_en_proceso
+
+        estacion = self.arduino_ip
+        self._importacion = (self._trabajos().enviar(importar_en_proceso, ruta, estacion, self.store.ruta),
+                             estacion)
+        self.statusBar().showMessage("Importando SD... 0% (Esc para cancelar)")
+
+    # --- Trabajos en otros procesos ---
+    def _trabajos(self):
+        if self.trabajos is None:
+            from jobs import JobManager
+            self.trabajos = JobManager(parent=self)
+            self.trabajos.progreso.connect(self.on_trabajo_progreso)
+            self.trabajos.terminado.connect(self.on_trabajo_terminado)
+            self.trabajos.cancelado.connect(self.on_trabajo_cancelado)
+            self.trabajos.fallido.connect(self.on_trabajo_fallido)
+        return self.trabajos
+
+    def _es_importacion(self, id_trabajo):
+        return self._importacion is not None and id_trabajo == self._importacion[0]
+
+    def _olvidar_trabajo(self, id_trabajo):
+        if id_trabajo == self._exportacion:
+            self._exportacion = None
+        elif self._es_importacion(id_trabajo):
+            self._importacion = None
+
+    def cancelar_trabajos(self):
+        if self.trabajos and self.trabajos.en_curso():
+            self.trabajos.cancelar()
+            self.statusBar().showMessage("Cancelando...")
+
+    def on_trabajo_progreso(self, id_trabajo, porcentaje):
+        accion = "Importando SD" if self._es_importacion(id_trabajo) else "Exportando"
+        self.statusBar().showMessage(f"{accion}... {porcentaje}% (Esc para cancelar)")
+
+    def on_trabajo_terminado(self, id_trabajo, resultado):
+        if self._es_importacion(id_trabajo):
+            estacion = self._importacion[1]
+            resumen = resultado.pop("resumen")
+            if resumen["nuevas"]:
+                # Ya están en disco: solo falta meterlas en memoria.
+                self.integrar_recuperadas(estacion, resultado)
+            self.statusBar().showMessage(
+                f"SD importada: {resumen['nuevas']} lecturas nuevas, {resumen['duplicadas']} ya estaban, "
+                f"{resumen['descartadas']} líneas ilegibles ({resumen['segundos']:.1f} s).")
+        else:
+            self.statusBar().showMessage(f"¡Datos exportados exitosamente! "
+                                         f"({resultado['filas']} filas en {resultado['segundos']:.1f} s)")
+        self._olvidar_trabajo(id_trabajo)
+
+    def on_trabajo_cancelado(self, id_trabajo):
+        accion = "Importación de la SD cancelada" if self._es_importacion(id_trabajo) else "Exportación cancelada"
+        self.statusBar().showMessage(f"{accion}.")
+        self._olvidar_trabajo(id_trabajo)
+
+    def on_trabajo_fallido(self, id_trabajo, mensaje):
+        accion = "importar la SD" if self._es_importacion(id_trabajo) else "guardar el archivo"
+        self.statusBar().showMessage(f"Error al {accion}: {mensaje}")
+        self._olvidar_trabajo(id_trabajo)
+
 
 # --- PUNTO DE ENTRADA ---
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
+    parser = argparse.ArgumentParser(description="Sistema Climático ITQ")
+    parser.add_argument("--estaciones", nargs="+", metavar="IP",
+                        help="Sondear varias estaciones a la vez (se muestra la primera).")
+    parser.add_argument("--max-concurrencia", type=int, default=16,
+                        help="Peticiones simultáneas como máximo en modo multi-estación.")
+    parser.add_argument("--puntos-grafica", type=int, default=50,
+                        help="Muestras visibles en la gráfica en vivo.")
+    parser.add_argument("--puntos-historial", type=int, default=500,
+                        help="Muestras que se conservan en memoria por estación.")
+    parser.add_argument("--horas-memoria", type=float, default=24,
+                        help="Horas de historial comprimido en memoria por estación (0 para no guardar).")
+    parser.add_argument("--historial", default=DB_PATH, metavar="RUTA",
+                        help="Base SQLite donde se guarda el historial ('' para no guardar).")
+    parser.add_argument("--horas-grafica", type=float, default=24,
+                        help="Horas de historial que se cargan en la gráfica al conectar.")
+    parser.add_argument("--relay", metavar="URL",
+                        help="Recibir los datos de un relay local (python relay.py) en vez del Modulo.")
+    parser.add_argument("--fps", type=float, default=30,
+                        help="Cuadros por segundo como máximo al refrescar la interfaz.")
+    parser.add_argument("--conexion", choices=["paralelo", "secuencial"], default="paralelo",
+                        help="Cómo probar las IPs conocidas al arrancar.")
+    parser.add_argument("--metricas", type=int, metavar="PUERTO",
+                        help="Servir métricas de la ingesta en http://127.0.0.1:PUERTO/metrics (y /metrics.json).")
+    parser.add_argument("--overlay", action="store_true",
+                        help="Mostrar las métricas sobre la gráfica al arrancar (F3 lo alterna).")
+    parser.add_argument("--replay", metavar="FUENTE",
+                        help="Reproducir una grabación: 'historial' (la base de --historial) o un datalog.csv.")
+    parser.add_argument("--replay-estacion", metavar="NOMBRE",
+                        help="Estación a reproducir del historial (por defecto la primera).")
+    parser.add_argument("--velocidad", type=float, default=1.0,
+                        help="Velocidad de la reproducción: 1, 100... o 0 para ir sin freno.")
+    parser.add_argument("--cerrar-al-terminar", action="store_true",
+                        help="Cerrar la ventana al terminar la reproducción (para pruebas de carga).")
+    parser.add_argument("--alertas", metavar="RUTA",
+                        help="Archivo JSON con las reglas de alerta (por defecto: sensores sin lectura y lluvia).")
+    parser.add_argument("--tablero", action="store_true",
+                        help="Abrir al inicio el tablero con todas las estaciones (también con F2).")
+    args, qt_args = parser.parse_known_args()
+
+    reglas_alertas = None
+    if args.alertas:
+        from alerts import cargar_reglas
+        try:
+            reglas_alertas = cargar_reglas(args.alertas)
+        except (OSError, ValueError) as e:
+            print(f"[Alertas] {e}")
+            sys.exit(1)
+
+    app = QApplication(sys.argv[:1] + qt_args)
     app.setStyle("Fusion")
-    window = EstacionApp()
+
+    replay = None
+    if args.replay:
+        from replay import ReplayWorker, abrir_fuente
+        try:
+            muestras = abrir_fuente(args.replay, args.replay_estacion, args.historial)
+        except ValueError as e:
+            print(f"[Replay] {e}")
+            sys.exit(1)
+        replay = ReplayWorker(muestras, velocidad=args.velocidad)
+        # Lo reproducido ya está grabado: no se vuelve a guardar.
+        args.historial = None
+    window = EstacionApp(estaciones=args.estaciones, max_concurrencia=args.max_concurrencia,
+                         modo_conexion=args.conexion, puntos_grafica=args.puntos_grafica,
+                         puntos_historial=args.puntos_historial, ruta_historial=args.historial,
+                         horas_grafica=args.horas_grafica, relay_url=args.relay,
+                         fps_maximo=args.fps, puerto_metricas=args.metricas,
+                         overlay_metricas=args.overlay, replay=replay,
+                         cerrar_al_terminar=args.cerrar_al_terminar, horas_memoria=args.horas_memoria,
+                         reglas_alertas=reglas_alertas, tablero=args.tablero)
     window.show()
+    QtCore.QTimer.singleShot(0, lambda: reportar_arranque("gui", _INICIO))
     sys.exit(app.exec_())
\ No newline at end of file
@@ -0,0 +1,191 @@
+import json
+import math
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Etapas de la ingesta, en el orden en que las recorre una muestra.
+ETAPAS = ("http", "json", "senal", "calidad", "ingesta", "alertas", "render", "tablero")
+
+# Cubetas logarítmicas: SUBDIVISIONES por cada potencia de 2, desde ~1 µs
+# (2**EXP_MIN s) hasta ~2 min; lo que cae fuera se cuenta en los extremos.
+SUBDIVISIONES = 8
+EXP_MIN = -19
+EXP_MAX = 7
+_N_CUBETAS = (EXP_MAX - EXP_MIN) * SUBDIVISIONES
+
+
+def _limite_superior(i):
+    """Límite superior (segundos) de la cubeta i."""
+    exponente, sub = divmod(i, SUBDIVISIONES)
+    return math.ldexp(0.5 + (sub + 1) / (2 * SUBDIVISIONES), exponente + EXP_MIN)
+
+
+def percentil(cuentas, p):
+    """Percentil `p` (0-100) de un histograma; devuelve el límite superior de su cubeta."""
+    total = sum(cuentas)
+    if not total:
+        return math.nan
+    objetivo = total * p / 100.0
+    acumulado = 0
+    for i, n in enumerate(cuentas):
+        acumulado += n
+        if acumulado >= objetivo:
+            return _limite_superior(i)
+    return _limite_superior(len(cuentas) - 1)
+
+
+class Histogram:
+    """
+    Histograma de latencias con cubetas logarítmicas fijas (error relativo
+    de a lo sumo 12.5 %). Registrar cuesta un frexp y un incremento: se puede
+    llamar en cada muestra sin que se note.
+    """
+
+    def __init__(self):
+        self.cuentas = [0] * _N_CUBETAS
+        self.n = 0
+        self.suma = 0.0
+        self.maximo = 0.0
+        self._lock = threading.Lock()
+
+    def registrar(self, segundos):
+        mantisa, exponente = math.frexp(segundos)
+        i = (exponente - EXP_MIN) * SUBDIVISIONES + int((mantisa - 0.5) * 2 * SUBDIVISIONES)
+        if i < 0 or segundos <= 0:
+            i = 0
+        elif i >= _N_CUBETAS:
+            i = _N_CUBETAS - 1
+        with self._lock:
+            self.cuentas[i] += 1
+            self.n += 1
+            self.suma += segundos
+            if segundos > self.maximo:
+                self.maximo = segundos
+
+    def instantanea(self):
+        with self._lock:
+            return list(self.cuentas), self.n, self.suma, self.maximo
+
+    def resumen(self, anterior=None):
+        """
+        {n, media, p50, p90, p99, max} en segundos. Con `anterior` (una
+        instantanea()) solo cuenta lo registrado desde entonces.
+        """
+        cuentas, n, suma, maximo = self.instantanea()
+        if anterior is not None:
+            cuentas = [a - b for a, b in zip(cuentas, anterior[0])]
+            n -= anterior[1]
+            suma -= anterior[2]
+        # El límite de la cubeta puede pasarse del máximo observado.
+        return {"n": n, "media": suma / n if n else math.nan,
+                "p50": min(percentil(cuentas, 50), maximo), "p90": min(percentil(cuentas, 90), maximo),
+                "p99": min(percentil(cuentas, 99), maximo), "max": maximo}
+
+
+class Metrics:
+    """
+    Registro de métricas del proceso: un histograma por etapa, contadores
+    por estación y medidores que se evalúan solo al consultarlos (p. ej.
+    la profundidad de una cola), así no cuestan nada mientras nadie mira.
+    """
+
+    def __init__(self):
+        self.etapas = {etapa: Histogram() for etapa in ETAPAS}
+        self.contadores = {}
+        self.medidores = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, etapa, segundos):
+        histograma = self.etapas.get(etapa)
+        if histograma is None:
+            with self._lock:
+                histograma = self.etapas.setdefault(etapa, Histogram())
+        histograma.registrar(segundos)
+
+    def contar(self, estacion, contador, n=1):
+        with self._lock:
+            por_estacion = self.contadores.get(estacion)
+            if por_estacion is None:
+                por_estacion = self.contadores[estacion] = {}
+            por_estacion[contador] = por_estacion.get(contador, 0) + n
+
+    def medidor(self, nombre, funcion):
+        """Registra `funcion()` como medidor; se llama al pedir las métricas."""
+        self.medidores[nombre] = funcion
+
+    def _leer_medidores(self):
+        valores = {}
+        for nombre, funcion in list(self.medidores.items()):
+            try:
+                valores[nombre] = funcion()
+            except Exception:
+                valores[nombre] = None
+        return valores
+
+    def como_dict(self):
+        with self._lock:
+            contadores = {estacion: dict(c) for estacion, c in self.contadores.items()}
+        return {"etapas": {etapa: h.resumen() for etapa, h in self.etapas.items()},
+                "estaciones": contadores,
+                "medidores": self._leer_medidores()}
+
+    def como_json(self):
+        # NaN no es JSON válido: las etapas sin datos van como null.
+        datos = self.como_dict()
+        for resumen in datos["etapas"].values():
+            for clave, valor in resumen.items():
+                if isinstance(valor, float) and math.isnan(valor):
+                    resumen[clave] = None
+        return json.dumps(datos, indent=1)
+
+    def como_texto(self):
+        """Formato de exposición de texto de Prometheus."""
+        datos = self.como_dict()
+        lineas = ["# TYPE sistema_etapa_segundos summary"]
+        for etapa, r in datos["etapas"].items():
+            for cuantil, clave in (("0.5", "p50"), ("0.9", "p90"), ("0.99", "p99")):
+                lineas.append(f'sistema_etapa_segundos{{etapa="{etapa}",quantile="{cuantil}"}} {r[clave]:.6g}')
+            lineas.append(f'sistema_etapa_segundos_count{{etapa="{etapa}"}} {r["n"]}')
+            lineas.append(f'sistema_etapa_segundos_max{{etapa="{etapa}"}} {r["max"]:.6g}')
+        lineas.append("# TYPE sistema_estacion_total counter")
+        for estacion, contadores in sorted(datos["estaciones"].items()):
+            for contador, valor in sorted(contadores.items()):
+                lineas.append(f'sistema_estacion_total{{estacion="{estacion}",contador="{contador}"}} {valor}')
+        lineas.append("# TYPE sistema_medidor gauge")
+        for nombre, valor in sorted(datos["medidores"].items()):
+            if valor is not None:
+                lineas.append(f'sistema_medidor{{nombre="{nombre}"}} {valor}')
+        return "\n".join(lineas) + "\n"
+
+    def servir(self, puerto, host="127.0.0.1"):
+        """Sirve /metrics (texto) y /metrics.json en un hilo aparte. Devuelve el servidor."""
+        servidor = ThreadingHTTPServer((host, puerto), MetricsHandler)
+        servidor.daemon_threads = True
+        servidor.metricas = self
+        threading.Thread(target=servidor.serve_forever, name="metrics-http", daemon=True).start()
+        print(f"[Metrics] Métricas en http://{host}:{servidor.server_address[1]}/metrics")
+        return servidor
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        metricas = self.server.metricas
+        if self.path.startswith("/metrics.json"):
+            cuerpo, tipo = metricas.como_json().encode(), "application/json"
+        elif self.path.startswith("/metrics"):
+            cuerpo, tipo = metricas.como_texto().encode(), "text/plain; version=0.0.4"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+
+# Registro único del proceso: polling, workers y ventana escriben aquí.
+METRICAS = Metrics()
@@ -0,0 +1,287 @@
+import time
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from metrics import METRICAS
+from scheduler import AdaptiveSchedule
+
+
+def marca_de_tiempo(data):
+    """Hora en que el Modulo tomó la lectura (si la reporta) o la de recepción."""
+    return time.time() - data.get('age_ms', 0) / 1000.0
+
+
+# Una lectura en la respuesta binaria de /data?since= (struct Reading del
+# firmware): seq, age_ms, temperatura, humedad, presión, AQI y lluvia,
+# little-endian y sin relleno, 23 bytes.
+REGISTRO_LOTE = struct.Struct("<IIfffhB")
+
+
+def decodificar_lote(cuerpo):
+    """Lecturas de una respuesta binaria de /data?since=, de la más vieja a la más nueva."""
+    # Los flotantes viajan en float32: se redondean a 2 decimales, como en
+    # el JSON y en la SD.
+    return [{"temperature": round(t, 2), "humidity": round(h, 2), "pressure": round(p, 2),
+             "aqi": aqi, "rainfall": lluvia, "seq": seq, "age_ms": edad}
+            for seq, edad, t, h, p, aqi, lluvia in REGISTRO_LOTE.iter_unpack(cuerpo)]
+
+
+def pedir_datos(sesion, url, timeout, since=None):
+    """
+    GET del /data de un Modulo; registra en METRICAS el tiempo de red y el de
+    decodificación. Con `since` pide /data?since=N: el firmware nuevo responde
+    en binario todas las lecturas con "seq" mayor que N que guarda en RAM, y
+    el viejo ignora el parámetro y manda su JSON de una lectura.
+
+    Devuelve (lecturas de la más vieja a la más nueva, ¿vino por lote?).
+    """
+    inicio = time.perf_counter()
+    response = sesion.get(url, params=None if since is None else {"since": since}, timeout=timeout)
+    response.raise_for_status()
+    recibido = time.perf_counter()
+    if response.headers.get("Content-Type", "").startswith("application/json"):
+        muestras, es_lote = [response.json()], False
+    else:
+        muestras, es_lote = decodificar_lote(response.content), True
+    METRICAS.registrar("http", recibido - inicio)
+    METRICAS.registrar("json", time.perf_counter() - recibido)
+    return muestras, es_lote
+
+
+def sondear(sesion, url, agenda, timeout):
+    """
+    Un sondeo: pide lo que el Modulo tenga desde la última lectura recibida
+    y devuelve las nuevas, en orden y con su 'timestamp'. El primero va sin
+    `since` (solo interesa la lectura actual); la agenda decide cuándo volver.
+    """
+    muestras, es_lote = pedir_datos(sesion, url, timeout, since=agenda.ultima_seq)
+    nuevas = agenda.registrar_lote(muestras, time.monotonic(), es_lote)
+    for data in nuevas:
+        data['timestamp'] = marca_de_tiempo(data)
+    return nuevas
+
+
+def es_timeout(error):
+    # requests ya está cargado si hubo una petición que falló.
+    import requests
+    return isinstance(error, requests.Timeout)
+
+
+class Station:
+    """Describe un Modulo meteorológico a sondear por el motor."""
+
+    def __init__(self, ip, nombre=None, timeout=2.5, agenda=None):
+        self.ip = ip
+        self.nombre = nombre or ip
+        self.timeout = timeout
+        self.agenda = agenda or AdaptiveSchedule()
+
+        self.proximo_sondeo = 0.0
+        self.en_vuelo = False
+
+        # Contadores por estación
+        self.solicitudes = 0
+        self.duplicadas = 0
+        self.errores = 0
+
+    @property
+    def url(self):
+        return f"http://{self.ip}/data"
+
+
+class PollingEngine:
+    """
+    Sondea muchas estaciones con un pool de hilos acotado.
+
+    Cada estación tiene su propio timeout y su AdaptiveSchedule, pero todas comparten
+    `max_concurrencia` hilos: una estación caída solo ocupa un hilo durante
+    su timeout y no detiene a las demás. Las muestras se entregan en lotes
+    a `on_lote(muestras, errores)` como máximo cada `intervalo_lote` segundos.
+    """
+
+    def __init__(self, estaciones, on_lote, max_concurrencia=16, intervalo_lote=0.2):
+        self.estaciones = list(estaciones)
+        self.on_lote = on_lote
+        self.max_concurrencia = max_concurrencia
+        self.intervalo_lote = intervalo_lote
+        self.is_running = True
+
+        self._sesiones = threading.local()
+        self._despertar = threading.Event()
+        self._en_vuelo = {}
+        METRICAS.medidor("peticiones_en_vuelo", lambda: len(self._en_vuelo))
+
+    def _sesion(self):
+        # requests.Session no es seguro entre hilos: una por hilo del pool.
+        sesion = getattr(self._sesiones, "sesion", None)
+        if sesion is None:
+            # Import diferido: requests tarda ~0.1 s en cargar y solo hace
+            # falta cuando sale la primera petición, ya en un hilo del pool.
+            import requests
+            sesion = requests.Session()
+            self._sesiones.sesion = sesion
+        return sesion
+
+    def _sondear(self, estacion):
+        # Corre en un hilo del pool, pero nunca hay dos sondeos de la misma
+        # estación en vuelo: su agenda no se comparte.
+        nuevas = sondear(self._sesion(), estacion.url, estacion.agenda, estacion.timeout)
+        for data in nuevas:
+            data['station'] = estacion.nombre
+        return nuevas
+
+    def reasignar_ip(self, ip_anterior, ip_nueva):
+        """Apunta a la nueva IP las estaciones que usaban `ip_anterior`."""
+        for estacion in self.estaciones:
+            if estacion.ip == ip_anterior:
+                estacion.ip = ip_nueva
+
+    def agregar_estacion(self, estacion):
+        self.estaciones.append(estacion)
+        self._despertar.set()
+
+    def run(self):
+        en_vuelo = self._en_vuelo
+        muestras, errores = [], []
+        ultimo_envio = time.monotonic()
+
+        pool = ThreadPoolExecutor(max_workers=self.max_concurrencia,
+                                  thread_name_prefix="poller")
+        try:
+            while self.is_running:
+                ahora = time.monotonic()
+
+                # 1. Lanzar las estaciones que ya tocan, sin exceder el límite.
+                for estacion in self.estaciones:
+                    if len(en_vuelo) >= self.max_concurrencia:
+                        break
+                    if not estacion.en_vuelo and estacion.proximo_sondeo <= ahora:
+                        estacion.en_vuelo = True
+                        en_vuelo[pool.submit(self._sondear, estacion)] = estacion
+
+                # 2. Esperar a la primera respuesta o al siguiente evento.
+                if len(en_vuelo) >= self.max_concurrencia:
+                    espera = self.intervalo_lote
+                else:
+                    espera = self._tiempo_hasta_siguiente(ahora)
+                if en_vuelo:
+                    hechos, _ = wait(en_vuelo, timeout=espera, return_when=FIRST_COMPLETED)
+                else:
+                    self._despertar.wait(espera)
+                    self._despertar.clear()
+                    hechos = ()
+
+                # 3. Recoger resultados.
+                ahora = time.monotonic()
+                for futuro in hechos:
+                    estacion = en_vuelo.pop(futuro)
+                    estacion.en_vuelo = False
+                    estacion.solicitudes += 1
+                    METRICAS.contar(estacion.nombre, "solicitudes")
+                    try:
+                        nuevas = futuro.result()
+                    except Exception as e:
+                        print(f"[PollingEngine Error] {estacion.nombre}: {e}")
+                        estacion.errores += 1
+                        METRICAS.contar(estacion.nombre, "timeouts" if es_timeout(e) else "errores")
+                        errores.append((estacion.nombre, f"Error: {type(e).__name__}"))
+                        estacion.agenda.registrar_fallo(ahora)
+                    else:
+                        # Las lecturas repetidas no llegan a la GUI.
+                        if nuevas:
+                            muestras.extend(nuevas)
+                            METRICAS.contar(estacion.nombre, "muestras", len(nuevas))
+                        else:
+                            estacion.duplicadas += 1
+                            METRICAS.contar(estacion.nombre, "obsoletas")
+                    estacion.proximo_sondeo = estacion.agenda.siguiente()
+
+                # 4. Entregar el lote acumulado.
+                if (muestras or errores) and ahora - ultimo_envio >= self.intervalo_lote:
+                    self.on_lote(muestras, errores)
+                    muestras, errores = [], []
+                    ultimo_envio = ahora
+        finally:
+            # No esperamos a las peticiones en curso: cada una termina sola
+            # al agotar su timeout.
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _tiempo_hasta_siguiente(self, ahora):
+        pendientes = [e.proximo_sondeo for e in self.estaciones if not e.en_vuelo]
+        siguiente = min(pendientes, default=ahora + self.intervalo_lote)
+        return min(max(0.0, siguiente - ahora), self.intervalo_lote)
+
+    def stop(self):
+        self.is_running = False
+        self._despertar.set()
+
+
+class FirstResponder:
+    """
+    Prueba varias IPs en paralelo y se queda con la primera que responde.
+
+    Se pueden añadir IPs mientras la búsqueda sigue abierta (por ejemplo las
+    que va encontrando mDNS). En cuanto una IP devuelve un /data válido el
+    resto de intentos se descarta: las peticiones en cola se cancelan y las
+    que ya están en curso terminan solas sin que nadie espere su resultado.
+    """
+
+    def __init__(self, timeout=2.5, max_concurrencia=8):
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrencia,
+                                        thread_name_prefix="probe")
+        self._cond = threading.Condition()
+        self._probadas = set()
+        self._pendientes = 0
+        self._ganador = None
+        self._cancelado = False
+
+    def probar(self, ip):
+        with self._cond:
+            if self._ganador or self._cancelado or ip in self._probadas:
+                return
+            self._probadas.add(ip)
+            self._pendientes += 1
+            # Dentro del lock: cancelar() marca _cancelado antes de cerrar el
+            # pool, así un aviso tardío de mDNS nunca llega a un pool cerrado.
+            self._pool.submit(self._intentar, ip)
+
+    def _intentar(self, ip):
+        import requests
+        data = None
+        try:
+            response = requests.get(f"http://{ip}/data", timeout=self.timeout)
+            response.raise_for_status()
+            data = response.json()
+        except Exception as e:
+            if not self._cancelado:
+                print(f"[FirstResponder] {ip} no responde: {type(e).__name__}")
+        with self._cond:
+            self._pendientes -= 1
+            if data is not None and self._ganador is None and not self._cancelado:
+                data['timestamp'] = marca_de_tiempo(data)
+                self._ganador = {"ip": ip, "data": data}
+            self._cond.notify_all()
+
+    def esperar(self, abierto_hasta):
+        """
+        Bloquea hasta tener ganador, o hasta que no queden intentos en curso
+        y haya pasado `abierto_hasta` (time.monotonic) sin nuevas IPs.
+        Devuelve {"ip", "data"} o None.
+        """
+        with self._cond:
+            while self._ganador is None and not self._cancelado:
+                restante = abierto_hasta - time.monotonic()
+                if self._pendientes == 0 and restante <= 0:
+                    break
+                self._cond.wait(max(restante, 0.05) if self._pendientes == 0 else None)
+            ganador = self._ganador
+        self.cancelar()
+        return ganador
+
+    def cancelar(self):
+        with self._cond:
+            self._cancelado = True
+            self._cond.notify_all()
+        self._pool.shutdown(wait=False, cancel_futures=True)
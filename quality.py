@@ -0,0 +1,225 @@
+import time
+
+import numpy as np
+
+from metrics import METRICAS
+from ring_buffer import SENSORES
+
+# Valores posibles de cada sensor (DHT11, BMP180, MQ-135 mapeado a 0-300 y
+# el sensor de lluvia digital); lo que cae fuera es una lectura imposible.
+# El DHT11 mide de 0 a 50 °C y de 20 a 90 %RH (su precisión solo está
+# garantizada hasta 80 %RH, pero en días de lluvia reporta más y es real).
+RANGOS = {
+    "temperature": (0.0, 50.0),
+    "humidity": (20.0, 90.0),
+    "pressure": (300.0, 1100.0),
+    "aqi": (0.0, 300.0),
+    "rainfall": (0.0, 1.0),
+}
+
+# Cambio mínimo que puede contar como pico aunque la serie venga plana
+# (MAD = 0). La lluvia es 0/1: sus saltos no son picos.
+PISOS_PICO = {"temperature": 1.0, "humidity": 3.0, "pressure": 1.0, "aqi": 20.0, "rainfall": np.inf}
+
+# Muestras previas con las que se calculan mediana y MAD, y cuántas MAD
+# (escaladas a desviación estándar) se aleja un pico de la mediana.
+VENTANA = 15
+UMBRAL = 5.0
+MINIMO_VALIDAS = 5
+
+# Motivos por los que se descarta una lectura. La máscara de calidad tiene
+# un bit por motivo y sensor: bit = motivo * len(SENSORES) + índice del sensor.
+FUERA_DE_RANGO, CAIDA, PICO = range(3)
+MOTIVOS = {FUERA_DE_RANGO: "fuera de rango", CAIDA: "sensor sin lectura", PICO: "pico"}
+
+_N = len(SENSORES)
+_MINIMOS = np.array([RANGOS[s][0] for s in SENSORES])
+_MAXIMOS = np.array([RANGOS[s][1] for s in SENSORES])
+_PISOS = np.array([PISOS_PICO[s] for s in SENSORES])
+_PESOS = {motivo: 2 ** (motivo * _N + np.arange(_N)) for motivo in MOTIVOS}
+_TEMP, _HUM, _PRES = (SENSORES.index(s) for s in ("temperature", "humidity", "pressure"))
+# Escala la MAD a desviación estándar para datos normales.
+_K_MAD = 1.4826
+# Filas por tramo en filtrar_columnas: acota la memoria de las ventanas.
+_TRAMO = 65536
+
+
+def bit(sensor, motivo):
+    return 1 << (motivo * _N + SENSORES.index(sensor))
+
+
+def descartadas(calidad, sensor):
+    """Máscara booleana de las muestras en que `sensor` se descartó, por cualquier motivo."""
+    calidad = np.nan_to_num(np.asarray(calidad)).astype(np.int64)
+    mascara = sum(bit(sensor, motivo) for motivo in MOTIVOS)
+    return (calidad & mascara) != 0
+
+
+def motivos(calidad, sensor):
+    """Nombres de los motivos por los que se descartó `sensor` en una muestra."""
+    calidad = int(calidad) if calidad == calidad else 0
+    return [nombre for motivo, nombre in MOTIVOS.items() if calidad & bit(sensor, motivo)]
+
+
+def _mediana(ventanas, validas):
+    """
+    Mediana de `ventanas` (B, sensores, W) sobre el último eje ignorando
+    NaN: al ordenar quedan al final y se toman los índices centrales según
+    cuántas `validas` hay, sin np.nanmedian (más lento y con avisos).
+    """
+    ordenado = np.sort(ventanas, axis=2)
+    bajo = (np.maximum(validas - 1, 0) // 2)[..., None]
+    alto = np.minimum(validas // 2, ventanas.shape[2] - 1)[..., None]
+    return (np.take_along_axis(ordenado, bajo, axis=2) + np.take_along_axis(ordenado, alto, axis=2))[..., 0] / 2
+
+
+def _invalidas(valores):
+    """(caída, fuera de rango) por muestra y sensor; no dependen de las lecturas previas."""
+    cero = valores == 0.0
+    caida = np.zeros(valores.shape, dtype=bool)
+    # El firmware pone temperatura, humedad y presión en 0 antes de leer y
+    # las deja así si el sensor falla. Humedad o presión en 0 no son reales;
+    # temperatura en 0 solo es caída si la humedad del mismo DHT también.
+    caida[:, _HUM] = cero[:, _HUM]
+    caida[:, _PRES] = cero[:, _PRES]
+    caida[:, _TEMP] = cero[:, _TEMP] & cero[:, _HUM]
+    with np.errstate(invalid='ignore'):
+        fuera = ~caida & ((valores < _MINIMOS) | (valores > _MAXIMOS))
+    return caida, fuera
+
+
+def _sin_invalidas(valores):
+    """Lo que entra a las ventanas: los crudos menos caídas y fuera de rango (los picos sí)."""
+    caida, fuera = _invalidas(valores)
+    return np.where(caida | fuera, np.nan, valores)
+
+
+def evaluar(valores, ventanas, umbral=UMBRAL, minimo=MINIMO_VALIDAS):
+    """
+    Núcleo del filtro. `valores` es (B, sensores) en el orden de SENSORES y
+    `ventanas` (B, sensores, W) las W lecturas previas de cada una (NaN donde
+    no hay). Devuelve (valores con lo descartado en NaN, máscara de calidad).
+    """
+    valores = np.array(valores, dtype=float)
+    caida, fuera = _invalidas(valores)
+    validas = (~np.isnan(ventanas)).sum(axis=2)
+    centro = _mediana(ventanas, validas)
+    desvio = np.abs(valores - centro)
+    # Como la escala nunca baja del piso, solo puede ser pico lo que se
+    # aleja más de umbral * piso: la MAD se calcula solo para esas filas.
+    with np.errstate(invalid='ignore'):
+        pico = ~caida & ~fuera & (validas >= minimo) & (desvio > umbral * _PISOS)
+    filas = np.flatnonzero(pico.any(axis=1))
+    if len(filas):
+        mad = _mediana(np.abs(ventanas[filas] - centro[filas, :, None]), validas[filas])
+        pico[filas] &= desvio[filas] > umbral * np.maximum(_K_MAD * mad, _PISOS)
+
+    calidad = (caida @ _PESOS[CAIDA] + fuera @ _PESOS[FUERA_DE_RANGO] + pico @ _PESOS[PICO])
+    valores[caida | fuera | pico] = np.nan
+    return valores, calidad.astype(float)
+
+
+def filtrar_columnas(columnas, ventana=VENTANA, umbral=UMBRAL, minimo=MINIMO_VALIDAS):
+    """
+    Filtra de una vez muestras ya ordenadas ({timestamp, sensor...}, p. ej.
+    de la SD o del log): devuelve columnas nuevas con lo descartado en NaN
+    y la columna `quality`. Cada muestra se compara con las `ventana`
+    anteriores del mismo arreglo, igual que en vivo.
+    """
+    crudos = np.column_stack([np.asarray(columnas[s], dtype=float) for s in SENSORES]).reshape(-1, _N)
+    n = len(crudos)
+    relleno = np.vstack([np.full((ventana, _N), np.nan), _sin_invalidas(crudos)])
+    resultado, calidades = [], []
+    for i in range(0, n, _TRAMO):
+        j = min(i + _TRAMO, n)
+        # Ventana de la fila k: las `ventana` filas anteriores (k-ventana .. k-1).
+        ventanas = np.lib.stride_tricks.sliding_window_view(relleno[i:j + ventana - 1], ventana, axis=0)
+        valores, calidad_tramo = evaluar(crudos[i:j], ventanas, umbral, minimo)
+        resultado.append(valores)
+        calidades.append(calidad_tramo)
+    valores = np.vstack(resultado) if resultado else crudos
+    filtradas = {'timestamp': np.asarray(columnas['timestamp'], dtype=float)}
+    filtradas.update({s: valores[:, i] for i, s in enumerate(SENSORES)})
+    filtradas['quality'] = np.concatenate(calidades) if calidades else np.empty(0)
+    return filtradas
+
+
+class QualityFilter:
+    """
+    Filtro de calidad en streaming, entre la llegada de las muestras y el
+    almacenamiento.
+
+    Descarta (pone en NaN) tres tipos de lecturas: fuera del rango físico
+    del sensor, caídas (el 0.0 que deja el firmware cuando el DHT o el BMP
+    no responden) y picos, que se alejan de la mediana de las últimas
+    `ventana` lecturas más de `umbral` veces la MAD. Cada muestra sale con
+    `quality`, la máscara de bits con el motivo por sensor (ver bit() y
+    descartadas()), que se guarda en el historial y se exporta.
+
+    Como en AlertEngine, las ventanas de todas las estaciones viven en un
+    solo arreglo (estaciones, sensores, ventana) y cada lote se evalúa con
+    unas pocas operaciones de NumPy, sin importar cuántas estaciones traiga.
+    """
+
+    def __init__(self, ventana=VENTANA, umbral=UMBRAL, minimo=MINIMO_VALIDAS):
+        self.ventana = ventana
+        self.umbral = umbral
+        self.minimo = minimo
+        self._filas = {}
+        self._ventanas = np.full((16, _N, ventana), np.nan)
+        self._cabeza = np.zeros(16, dtype=np.intp)
+        self._ultimo_t = np.full(16, -np.inf)
+
+    def _fila(self, estacion):
+        fila = self._filas.get(estacion)
+        if fila is None:
+            fila = len(self._filas)
+            if fila >= len(self._cabeza):
+                capacidad = 2 * len(self._cabeza)
+                self._ventanas = np.concatenate([self._ventanas, np.full_like(self._ventanas, np.nan)])
+                self._cabeza = np.resize(self._cabeza, capacidad)
+                self._cabeza[fila:] = 0
+                self._ultimo_t = np.concatenate([self._ultimo_t, np.full(capacidad - fila, -np.inf)])
+            self._filas[estacion] = fila
+        return fila
+
+    def filtrar(self, muestras):
+        """
+        Filtra en el lugar un lote de pares (estacion, data): los sensores
+        descartados quedan en NaN y cada `data` recibe su 'quality'.
+        """
+        muestras = list(muestras)
+        if not muestras:
+            return muestras
+        inicio = time.perf_counter()
+        filas = np.array([self._fila(estacion) for estacion, _ in muestras], dtype=np.intp)
+        tiempos = np.array([data.get('timestamp') or time.time() for _, data in muestras], dtype=float)
+        crudos = np.array([[data.get(s, np.nan) for s in SENSORES] for _, data in muestras], dtype=float)
+
+        valores = np.empty_like(crudos)
+        calidad = np.empty(len(muestras))
+        # Una estación con varias muestras en el lote va por rondas, en orden
+        # de llegada: cada una se compara con la ventana que dejó la anterior.
+        pendientes = np.arange(len(muestras))
+        while len(pendientes):
+            _, primeras = np.unique(filas[pendientes], return_index=True)
+            ronda = pendientes[primeras]
+            pendientes = np.delete(pendientes, primeras)
+            f = filas[ronda]
+            valores[ronda], calidad[ronda] = evaluar(crudos[ronda], self._ventanas[f], self.umbral, self.minimo)
+
+            # Los picos sí entran a la ventana: la mediana los aguanta y así un
+            # cambio de nivel real se acepta tras media ventana. Las atrasadas no.
+            vigentes = tiempos[ronda] > self._ultimo_t[f]
+            f, ronda = f[vigentes], ronda[vigentes]
+            self._ventanas[f, :, self._cabeza[f]] = _sin_invalidas(crudos[ronda])
+            self._cabeza[f] = (self._cabeza[f] + 1) % self.ventana
+            self._ultimo_t[f] = tiempos[ronda]
+
+        for (_, data), fila_valores, fila_calidad in zip(muestras, valores.tolist(), calidad.tolist()):
+            for sensor, valor in zip(SENSORES, fila_valores):
+                if sensor in data:
+                    data[sensor] = valor
+            data['quality'] = int(fila_calidad)
+        METRICAS.registrar("calidad", time.perf_counter() - inicio)
+        return muestras
@@ -0,0 +1,191 @@
+import re
+
+import numpy as np
+
+from ring_buffer import COLUMNAS
+from stats import DESFASE_LOCAL, RESOLUCIONES, SENSORES_STATS, Acumulador, agregados_por_cubeta
+
+# Los timestamps del historial comprimido están redondeados al milisegundo:
+# al empalmar con el disco se deja este margen para no repetir muestras.
+_EMPALME = 1e-3
+
+_UNIDADES = {"s": 1, "min": 60, "h": 3600, "d": 86400}
+
+
+def resolucion_en_segundos(resample):
+    """"1min", "15min", "6h", "1d", 300... a segundos por cubeta."""
+    if isinstance(resample, str):
+        if resample in RESOLUCIONES:
+            return RESOLUCIONES[resample]
+        coincidencia = re.fullmatch(r"(\d+(?:\.\d+)?)\s*(s|min|h|d)", resample.strip())
+        if not coincidencia:
+            raise ValueError(f"Resolución desconocida: {resample!r}")
+        segundos = float(coincidencia.group(1)) * _UNIDADES[coincidencia.group(2)]
+    else:
+        segundos = float(resample)
+    if segundos <= 0:
+        raise ValueError("La resolución debe ser positiva")
+    return segundos
+
+
+def reagrupar(cubetas, resolucion, desfase=DESFASE_LOCAL):
+    """
+    Combina cubetas finas ordenadas ({inicio, n, media, m2, minimo, maximo})
+    en cubetas de `resolucion` segundos, con la fórmula de Chan vectorizada.
+    """
+    inicio = cubetas["inicio"]
+    if len(inicio) == 0:
+        return cubetas
+    nuevo = np.floor((inicio + desfase) / resolucion) * resolucion - desfase
+    cambia = np.r_[True, nuevo[1:] != nuevo[:-1]]
+    cortes = np.flatnonzero(cambia)
+    grupo = np.cumsum(cambia) - 1
+    n = np.add.reduceat(cubetas["n"], cortes)
+    media = np.add.reduceat(cubetas["n"] * cubetas["media"], cortes) / n
+    m2 = np.add.reduceat(cubetas["m2"] + cubetas["n"] * (cubetas["media"] - media[grupo]) ** 2, cortes)
+    return {"inicio": nuevo[cortes], "n": n, "media": media, "m2": m2,
+            "minimo": np.minimum.reduceat(cubetas["minimo"], cortes),
+            "maximo": np.maximum.reduceat(cubetas["maximo"], cortes)}
+
+
+class HistoryQuery:
+    """
+    Consultas por rango de tiempo sobre todo lo que se sabe de una estación:
+    el buffer circular, el historial comprimido en memoria, el historial en
+    disco y los rollups.
+
+    Todas las fuentes están ordenadas por tiempo, así que cada consulta es
+    una búsqueda binaria de los extremos (searchsorted en memoria, el índice
+    (estacion, timestamp) en SQLite) más la copia del resultado: el costo
+    depende de cuánto se devuelve, no de cuánto historial hay. Si el rango
+    cae entero en el buffer circular se devuelven vistas sin copiar, válidas
+    hasta la siguiente muestra de esa estación.
+
+    Con `resample` se devuelven cubetas: se arman con los rollups de la
+    resolución más gruesa que divida a la pedida (1 min, 1 h, 1 día) y solo
+    si ninguna sirve se calculan desde las muestras.
+    """
+
+    def __init__(self, buffers, store=None, stats=None):
+        self.buffers = buffers
+        self.store = store
+        self.stats = stats
+
+    def consultar(self, estacion, sensores=None, inicio=None, fin=None, resample=None):
+        """
+        Sin `resample`: {timestamp, sensor..., quality} con las muestras en
+        [inicio, fin] (ver quality.py para la máscara de calidad).
+        Con `resample`: {timestamp, sensor, sensor_min, sensor_max,
+        sensor_desv, sensor_n...} por cubeta, con timestamp = inicio de la
+        cubeta; entran las cubetas que empiezan en el rango o lo contienen.
+        """
+        sensores = tuple(SENSORES_STATS if sensores is None else sensores)
+        desconocidos = set(sensores) - set(SENSORES_STATS)
+        if desconocidos:
+            raise ValueError(f"Sensores desconocidos: {sorted(desconocidos)}")
+        inicio = -np.inf if inicio is None else inicio
+        fin = np.inf if fin is None else fin
+        if resample is None:
+            return self._crudo(estacion, ('timestamp',) + sensores + ('quality',), inicio, fin)
+        return self._remuestrear(estacion, sensores, inicio, fin, resolucion_en_segundos(resample))
+
+    # --- Muestras ---
+    def _crudo(self, estacion, columnas, inicio, fin):
+        memoria = None
+        buf = self.buffers.buffers.get(estacion)
+        if buf is not None and len(buf):
+            vista = buf.ultimos()
+            if inicio >= vista[0, 0]:
+                i0 = np.searchsorted(vista[0], inicio, side='left')
+                i1 = np.searchsorted(vista[0], fin, side='right')
+                return {c: vista[COLUMNAS.index(c), i0:i1] for c in columnas}
+            memoria = vista
+
+        partes = []
+        historial = self.buffers.historiales.get(estacion)
+        primero = historial.primer_timestamp() if historial is not None else None
+        if primero is None and memoria is not None:
+            primero = memoria[0, 0]
+        # Lo anterior a lo que hay en memoria sale del disco.
+        if self.store and (primero is None or inicio < primero):
+            hasta = fin if primero is None else min(fin, primero - _EMPALME)
+            partes.append(self.store.consultar(estacion, inicio, hasta, columnas=columnas))
+        if primero is not None and fin >= primero:
+            desde = max(inicio, primero)
+            if historial is not None and historial.primer_timestamp() is not None:
+                partes.append(historial.consultar(desde, fin, columnas))
+            else:
+                i0 = np.searchsorted(memoria[0], desde, side='left')
+                i1 = np.searchsorted(memoria[0], fin, side='right')
+                partes.append({c: memoria[COLUMNAS.index(c), i0:i1].copy() for c in columnas})
+
+        if not partes:
+            return {c: np.empty(0) for c in columnas}
+        if len(partes) == 1:
+            return partes[0]
+        return {c: np.concatenate([p[c] for p in partes]) for c in columnas}
+
+    # --- Cubetas ---
+    def _remuestrear(self, estacion, sensores, inicio, fin, resolucion):
+        bases = [r for r in sorted(RESOLUCIONES.values(), reverse=True)
+                 if r <= resolucion and resolucion % r == 0]
+        if bases and (self.store or self.stats):
+            base = bases[0]
+            desde = np.floor((inicio + DESFASE_LOCAL) / resolucion) * resolucion - DESFASE_LOCAL
+            por_sensor = {s: reagrupar(self._rollups(estacion, s, base, desde, fin), resolucion)
+                          for s in sensores}
+        else:
+            # Resolución más fina que los rollups (o sin rollups): desde las muestras.
+            muestras = self._crudo(estacion, COLUMNAS, inicio, fin)
+            filas = agregados_por_cubeta(muestras, resolucion)
+            por_sensor = {s: _columnas_de_filas([f for f in filas if f[1] == s]) for s in sensores}
+        return _alinear(por_sensor)
+
+    def _rollups(self, estacion, sensor, resolucion, inicio, fin):
+        """Cubetas de `resolucion` con inicio en [inicio, fin], incluida la que sigue abierta."""
+        if self.store:
+            cubetas = self.store.consultar_rollups(estacion, resolucion, sensor, inicio, fin)
+            cubetas["m2"] = cubetas.pop("desviacion") ** 2 * cubetas["n"]
+            abierta = self.stats.abierta(estacion, resolucion, sensor) if self.stats else None
+            if abierta is not None and inicio <= abierta[0] <= fin:
+                cubetas = _sumar_abierta(cubetas, *abierta)
+            return cubetas
+        cubetas = self.stats.rollups(estacion, resolucion, sensor)
+        cubetas["m2"] = cubetas.pop("desviacion") ** 2 * cubetas["n"]
+        i0 = np.searchsorted(cubetas["inicio"], inicio, side='left')
+        i1 = np.searchsorted(cubetas["inicio"], fin, side='right')
+        return {campo: valores[i0:i1] for campo, valores in cubetas.items()}
+
+
+def _sumar_abierta(cubetas, inicio, acumulado):
+    """La cubeta abierta del StatsEngine aún no está en disco (o solo en parte)."""
+    if len(cubetas["inicio"]) and cubetas["inicio"][-1] == inicio:
+        guardada = Acumulador(*(float(cubetas[c][-1]) for c in ("n", "media", "m2", "minimo", "maximo")))
+        guardada.combinar(acumulado)
+        cubetas = {c: v[:-1] for c, v in cubetas.items()}
+        acumulado = guardada
+    fila = {"inicio": inicio, "n": acumulado.n, "media": acumulado.media, "m2": acumulado.m2,
+            "minimo": acumulado.minimo, "maximo": acumulado.maximo}
+    return {c: np.append(v, fila[c]) for c, v in cubetas.items()}
+
+
+def _columnas_de_filas(filas):
+    columnas = np.array([(f[0],) + tuple(f[2:]) for f in filas], dtype=float).reshape(-1, 6)
+    return dict(zip(("inicio", "n", "media", "m2", "minimo", "maximo"), columnas.T))
+
+
+def _alinear(por_sensor):
+    """Une las cubetas de cada sensor en una sola tabla; donde un sensor no tiene, NaN."""
+    inicios = np.unique(np.concatenate([c["inicio"] for c in por_sensor.values()] or [np.empty(0)]))
+    resultado = {"timestamp": inicios}
+    for sensor, cubetas in por_sensor.items():
+        i = np.searchsorted(inicios, cubetas["inicio"])
+        columnas = {sensor: cubetas["media"], f"{sensor}_min": cubetas["minimo"],
+                    f"{sensor}_max": cubetas["maximo"],
+                    f"{sensor}_desv": np.sqrt(cubetas["m2"] / cubetas["n"]) if len(i) else np.empty(0)}
+        for nombre, valores in columnas.items():
+            resultado[nombre] = np.full(len(inicios), np.nan)
+            resultado[nombre][i] = valores
+        resultado[f"{sensor}_n"] = np.zeros(len(inicios))
+        resultado[f"{sensor}_n"][i] = cubetas["n"]
+    return resultado
@@ -0,0 +1,200 @@
+import json
+import argparse
+import threading
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+from metrics import METRICAS
+from polling import PollingEngine, Station
+
+# Comentario SSE periódico para que proxies y clientes no cierren el stream.
+KEEPALIVE_SEGUNDOS = 15
+
+# Lecturas por estación que se guardan para un cliente que se atrasa: varios
+# lotes completos de /data?since= (el anillo del firmware guarda 64). Lo que
+# todos los clientes ya recibieron se descarta antes.
+HISTORIAL_POR_ESTACION = 4 * 64
+
+
+class Relay:
+    """
+    Sondea cada estación una sola vez y vuelve a servir la última muestra a
+    cualquier número de clientes locales.
+
+    Rutas:
+      /data[?station=IP]    última muestra (mismo JSON que el Modulo)
+      /stations             {estación: última muestra}
+      /stream[?station=IP]  Server-Sent Events con cada muestra nueva
+    """
+
+    def __init__(self, estaciones, host="0.0.0.0", puerto=8080, max_concurrencia=16):
+        self.estaciones = list(estaciones)
+        self.ultimas = {}
+        self.version = 0
+        self._historial = deque()
+        self._cursores = {}
+        self._cond = threading.Condition()
+        self.is_running = True
+
+        self.engine = PollingEngine([Station(ip) for ip in self.estaciones],
+                                    on_lote=self._on_lote, max_concurrencia=max_concurrencia)
+        self.servidor = ThreadingHTTPServer((host, puerto), RelayHandler)
+        self.servidor.daemon_threads = True
+        self.servidor.relay = self
+        self._hilos = []
+
+    def _on_lote(self, muestras, errores):
+        with self._cond:
+            for data in muestras:
+                self.version += 1
+                self.ultimas[data['station']] = data
+                self._historial.append((self.version, data['station'], json.dumps(data).encode()))
+            self._podar()
+            self._cond.notify_all()
+
+    def _podar(self):
+        # Lo que ya vieron todos los clientes sobra; si alguno se quedó muy
+        # atrás, lo acota HISTORIAL_POR_ESTACION.
+        vista = min(self._cursores.values(), default=self.version)
+        maximo = HISTORIAL_POR_ESTACION * max(len(self.estaciones), 1)
+        while self._historial and (self._historial[0][0] <= vista or len(self._historial) > maximo):
+            self._historial.popleft()
+
+    def ultima(self, estacion=None):
+        with self._cond:
+            return self.ultimas.get(estacion or self.estaciones[0])
+
+    def instantanea(self, estacion=None, cliente=None):
+        """
+        (versión actual, últimas muestras) para arrancar un stream sin huecos.
+        Con `cliente`, el historial guarda desde ahí lo que ese cliente aún no
+        recibió (ver esperar_nuevas() y desuscribir()).
+        """
+        with self._cond:
+            if cliente is not None:
+                self._cursores[cliente] = self.version
+            if estacion is None:
+                return self.version, list(self.ultimas.values())
+            actual = self.ultimas.get(estacion)
+            return self.version, [actual] if actual else []
+
+    def esperar_nuevas(self, version_vista, estacion=None, timeout=KEEPALIVE_SEGUNDOS, cliente=None):
+        """Bloquea hasta que haya muestras más nuevas que `version_vista`."""
+        with self._cond:
+            if cliente is not None:
+                self._cursores[cliente] = version_vista
+            self._cond.wait_for(lambda: self.version > version_vista or not self.is_running, timeout)
+            nuevas = [(v, cuerpo) for v, e, cuerpo in self._historial
+                      if v > version_vista and (estacion is None or e == estacion)]
+            return self.version, nuevas
+
+    def desuscribir(self, cliente):
+        with self._cond:
+            self._cursores.pop(cliente, None)
+
+    def iniciar(self):
+        for objetivo, nombre in ((self.engine.run, "relay-poller"),
+                                 (self.servidor.serve_forever, "relay-http")):
+            hilo = threading.Thread(target=objetivo, name=nombre, daemon=True)
+            hilo.start()
+            self._hilos.append(hilo)
+        host, puerto = self.servidor.server_address[:2]
+        print(f"[Relay] Sirviendo {len(self.estaciones)} estaciones en http://{host}:{puerto}")
+
+    def detener(self):
+        self.is_running = False
+        with self._cond:
+            self._cond.notify_all()
+        self.engine.stop()
+        self.servidor.shutdown()
+        self.servidor.server_close()
+        for hilo in self._hilos:
+            hilo.join(timeout=5)
+
+
+class RelayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _responder_json(self, objeto, codigo=200):
+        cuerpo = json.dumps(objeto).encode()
+        self.send_response(codigo)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def do_GET(self):
+        relay = self.server.relay
+        url = urlparse(self.path)
+        estacion = parse_qs(url.query).get("station", [None])[0]
+
+        if url.path == "/data":
+            data = relay.ultima(estacion)
+            if data is None:
+                self._responder_json({"error": "sin datos"}, 503)
+            else:
+                self._responder_json(data)
+        elif url.path == "/stations":
+            self._responder_json({data['station']: data for data in relay.instantanea()[1]})
+        elif url.path == "/stream":
+            self._stream(relay, estacion)
+        else:
+            self._responder_json({"error": "ruta desconocida"}, 404)
+
+    def _enviar_chunk(self, datos):
+        # Transfer-Encoding: chunked para que el cliente reciba cada evento al instante.
+        self.wfile.write(f"{len(datos):X}\r\n".encode() + datos + b"\r\n")
+        self.wfile.flush()
+
+    def _stream(self, relay, estacion):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+
+        # Primero las últimas muestras conocidas, luego cada muestra nueva.
+        version, actuales = relay.instantanea(estacion, cliente=self)
+        try:
+            for data in actuales:
+                self._enviar_chunk(b"data: " + json.dumps(data).encode() + b"\n\n")
+            while relay.is_running:
+                anterior = version
+                version, nuevas = relay.esperar_nuevas(version, estacion, cliente=self)
+                if nuevas:
+                    self._enviar_chunk(b"".join(b"data: " + cuerpo + b"\n\n" for _, cuerpo in nuevas))
+                elif version == anterior:
+                    self._enviar_chunk(b": ping\n\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            relay.desuscribir(self)
+        self.close_connection = True
+
+
+# --- PUNTO DE ENTRADA ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Relay local para varios tableros.")
+    parser.add_argument("estaciones", nargs="+", metavar="IP", help="Estaciones a sondear.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--puerto", type=int, default=8080)
+    parser.add_argument("--max-concurrencia", type=int, default=16)
+    parser.add_argument("--metricas", type=int, metavar="PUERTO",
+                        help="Servir métricas del sondeo en http://127.0.0.1:PUERTO/metrics.")
+    args = parser.parse_args()
+
+    relay = Relay(args.estaciones, host=args.host, puerto=args.puerto,
+                  max_concurrencia=args.max_concurrencia)
+    relay.iniciar()
+    if args.metricas is not None:
+        METRICAS.servir(args.metricas)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        relay.detener()
@@ -0,0 +1,157 @@
+import time
+import threading
+from collections import deque
+
+from PyQt5 import QtCore
+
+from metrics import METRICAS
+from ring_buffer import COLUMNAS
+
+# Muestras emitidas que la GUI aún no procesa. Sin este límite, en modo sin
+# freno la cola de señales de Qt crecería sin medida en lugar de frenar.
+MAX_EN_VUELO = 64
+
+# Un hueco en la grabación nunca detiene la reproducción más que esto.
+PAUSA_MAXIMA = 5.0
+
+
+# --- FUENTES ---
+def muestras_del_historial(store, estacion, inicio=None, fin=None):
+    """Genera las muestras guardadas de `estacion`, en orden, como dicts de /data."""
+    for bloque in store.iterar(estacion, inicio, fin):
+        for fila in zip(*(bloque[c].tolist() for c in COLUMNAS)):
+            data = dict(zip(COLUMNAS, fila))
+            data['station'] = estacion
+            yield data
+
+
+def muestras_del_datalog(ruta, estacion, ancla=None, periodo=None):
+    """
+    Genera las filas de un datalog.csv de la SD. El archivo no trae horas:
+    la fila i se fecha como ancla + i * periodo (ancla = ahora si no se da).
+    """
+    from sd_import import COLUMNAS_SD, PERIODO_SD, leer_bloques, parsear_bloque
+
+    periodo = periodo or PERIODO_SD
+    t = time.time() if ancla is None else ancla
+    for datos in leer_bloques(ruta):
+        valores, _ = parsear_bloque(datos)
+        for fila in valores.tolist():
+            data = dict(zip(COLUMNAS_SD, fila))
+            data['timestamp'] = t
+            data['station'] = estacion
+            t += periodo
+            yield data
+
+
+def abrir_fuente(fuente, estacion=None, ruta_historial=None):
+    """
+    `fuente` es "historial" (la base SQLite en `ruta_historial`) o la ruta a
+    un datalog.csv. Devuelve el generador de muestras.
+    """
+    if fuente == "historial":
+        from storage import DB_PATH, HistoryStore
+        store = HistoryStore(ruta_historial or DB_PATH)
+        if estacion is None:
+            estaciones = store.estaciones()
+            if not estaciones:
+                raise ValueError(f"El historial {store.ruta} está vacío.")
+            estacion = estaciones[0]
+        return muestras_del_historial(store, estacion)
+    return muestras_del_datalog(fuente, estacion or "replay")
+
+
+class _Acuse(QtCore.QObject):
+    """Vive en el hilo de la GUI: se entera de cuándo ya se procesó cada muestra."""
+
+    def __init__(self, worker):
+        super().__init__()
+        self.worker = worker
+
+    def recibido(self, data):
+        self.worker._procesada()
+
+
+class ReplayWorker(QtCore.QObject):
+    """
+    Reproduce muestras grabadas con el mismo contrato que ArduinoWorker
+    (`datos_actualizados(dict)`), para reproducir incidentes o probar la
+    GUI con carga sin hardware.
+
+    `velocidad` 1 respeta los tiempos originales, 100 los acelera cien
+    veces y 0 emite tan rápido como la GUI alcance a procesar. Al terminar
+    emite `terminado` con el resumen: si la tasa lograda queda por debajo
+    de la pedida, o el retraso crece, la ingesta no da abasto.
+    """
+    datos_actualizados = QtCore.pyqtSignal(dict)
+    error_ocurrido = QtCore.pyqtSignal(str)
+    terminado = QtCore.pyqtSignal(dict)
+    finished = QtCore.pyqtSignal()
+
+    def __init__(self, muestras, velocidad=1.0, max_en_vuelo=MAX_EN_VUELO, pausa_maxima=PAUSA_MAXIMA):
+        super().__init__()
+        self.muestras = muestras
+        self.velocidad = velocidad
+        self.pausa_maxima = pausa_maxima
+        self.is_running = True
+        self.emitidas = 0
+        self.procesadas = 0
+        self._parar = threading.Event()
+        self._en_vuelo = threading.Semaphore(max_en_vuelo)
+        self._objetivos = deque()
+        # Se crea aquí, en el hilo de la GUI, antes de moveToThread().
+        self._acuse = _Acuse(self)
+
+    @QtCore.pyqtSlot()
+    def run(self):
+        # Conectado después que la GUI: Qt entrega las señales en orden de
+        # conexión, así el acuse llega cuando la muestra ya se procesó.
+        self.datos_actualizados.connect(self._acuse.recibido)
+        inicio = time.perf_counter()
+        reloj = inicio
+        anterior = None
+        try:
+            for data in self.muestras:
+                t = data['timestamp']
+                if self.velocidad and anterior is not None:
+                    reloj += min(max(t - anterior, 0.0) / self.velocidad, self.pausa_maxima)
+                    espera = reloj - time.perf_counter()
+                    if espera > 0 and self._parar.wait(espera):
+                        break
+                anterior = t
+                while not self._en_vuelo.acquire(timeout=0.1):
+                    if not self.is_running:
+                        break
+                if not self.is_running:
+                    break
+                ahora = time.perf_counter()
+                self._objetivos.append(reloj if self.velocidad else ahora)
+                data['_emitido'] = ahora
+                self.emitidas += 1
+                self.datos_actualizados.emit(data)
+        except Exception as e:
+            print(f"[Replay Error]: {e}")
+            self.error_ocurrido.emit(f"Error: {type(e).__name__}")
+
+        # Esperamos a que la GUI termine con lo ya emitido antes de medir.
+        while self.is_running and self.procesadas < self.emitidas:
+            self._parar.wait(0.05)
+        segundos = time.perf_counter() - inicio
+        self.terminado.emit({
+            "muestras": self.procesadas,
+            "segundos": segundos,
+            "muestras_por_s": self.procesadas / segundos if segundos else 0.0,
+            "velocidad": self.velocidad,
+            "retraso": METRICAS.etapas["replay_retraso"].resumen() if "replay_retraso" in METRICAS.etapas else None,
+        })
+        self.finished.emit()
+
+    def _procesada(self):
+        # Retraso de la GUI respecto a cuándo debía mostrarse la muestra.
+        METRICAS.registrar("replay_retraso", max(time.perf_counter() - self._objetivos.popleft(), 0.0))
+        self.procesadas += 1
+        self._en_vuelo.release()
+
+    def stop(self):
+        self.is_running = False
+        self._parar.set()
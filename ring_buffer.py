@@ -0,0 +1,123 @@
+import time
+
+import numpy as np
+
+SENSORES = ("temperature", "humidity", "pressure", "aqi", "rainfall")
+
+# `quality` es la máscara de bits del filtro de calidad (ver quality.py).
+COLUMNAS = ("timestamp",) + SENSORES + ("quality",)
+
+
+class StationBuffer:
+    """
+    Buffer circular columnar y preasignado para las muestras de una estación.
+
+    Cada escritura se guarda dos veces (en `i` y en `i + capacidad`), así las
+    últimas `n` muestras siempre forman un tramo contiguo del arreglo y se
+    pueden entregar como vistas de NumPy sin copiar nada. Agregar una muestra
+    cuesta O(1) sin importar la capacidad.
+    """
+
+    def __init__(self, capacidad=500):
+        if capacidad < 1:
+            raise ValueError("La capacidad debe ser al menos 1")
+        self.capacidad = capacidad
+        self._datos = np.full((len(COLUMNAS), 2 * capacidad), np.nan)
+        self._cabeza = 0
+        self.total = 0
+
+    def __len__(self):
+        return min(self.total, self.capacidad)
+
+    def agregar(self, data):
+        fila = [data.get('timestamp') or time.time()]
+        fila.extend(float(data[c]) for c in SENSORES)
+        fila.append(data.get('quality', 0))
+
+        i = self._cabeza
+        self._datos[:, i] = fila
+        self._datos[:, i + self.capacidad] = fila
+        self._cabeza = (i + 1) % self.capacidad
+        self.total += 1
+
+    def mezclar(self, columnas):
+        """
+        Inserta en orden de tiempo muestras atrasadas (p. ej. recuperadas del
+        log del Modulo) y conserva las `capacidad` más recientes. Reescribe el
+        buffer completo, O(capacidad): es para casos raros, no para cada muestra.
+        """
+        nuevas = np.vstack([np.asarray(columnas[c], dtype=float) for c in COLUMNAS])
+        todas = np.concatenate([self.ultimos(), nuevas], axis=1)
+        todas = todas[:, np.argsort(todas[0], kind='stable')][:, -self.capacidad:]
+        n = todas.shape[1]
+        self._datos[:, :n] = todas
+        self._datos[:, self.capacidad:self.capacidad + n] = todas
+        self._cabeza = n % self.capacidad
+        self.total += nuevas.shape[1]
+
+    def ultimos(self, n=None):
+        """Vista (columnas, n) de las últimas `n` muestras, de la más vieja a la más nueva."""
+        disponibles = len(self)
+        n = disponibles if n is None else min(n, disponibles)
+        fin = self._cabeza + self.capacidad
+        return self._datos[:, fin - n:fin]
+
+    def columna(self, nombre, n=None):
+        return self.ultimos(n)[COLUMNAS.index(nombre)]
+
+
+class BufferStore:
+    """
+    Un StationBuffer por estación, creado la primera vez que llega una muestra.
+
+    Con `retencion` (segundos) cada estación lleva además un CompactHistory
+    con ese tanto de historial comprimido, para graficar y exportar más
+    allá de las `capacidad` muestras del buffer sin tener que ir a disco.
+    """
+
+    def __init__(self, capacidad=500, retencion=None):
+        self.capacidad = capacidad
+        self.retencion = retencion
+        self.buffers = {}
+        self.historiales = {}
+
+    def buffer(self, estacion):
+        buf = self.buffers.get(estacion)
+        if buf is None:
+            buf = StationBuffer(self.capacidad)
+            self.buffers[estacion] = buf
+        return buf
+
+    def historial(self, estacion):
+        """CompactHistory de la estación, o None si no se retiene historial en memoria."""
+        if not self.retencion:
+            return None
+        historial = self.historiales.get(estacion)
+        if historial is None:
+            from compact_history import CompactHistory
+            historial = CompactHistory(self.retencion)
+            self.historiales[estacion] = historial
+        return historial
+
+    def agregar(self, estacion, data):
+        buf = self.buffer(estacion)
+        buf.agregar(data)
+        historial = self.historial(estacion)
+        if historial is not None:
+            # Reusa la fila ya convertida a float en el buffer.
+            fila = buf.ultimos(1)[:, 0]
+            historial.agregar(fila[0], fila[1:])
+
+    def mezclar(self, estacion, columnas):
+        self.buffer(estacion).mezclar(columnas)
+        historial = self.historial(estacion)
+        if historial is not None:
+            historial.mezclar(columnas)
+
+    def bytes_en_memoria(self):
+        """Memoria de los buffers y los historiales comprimidos, en bytes."""
+        return (sum(b._datos.nbytes for b in self.buffers.values())
+                + sum(h.nbytes for h in self.historiales.values()))
+
+    def estaciones(self):
+        return list(self.buffers)
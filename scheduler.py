@@ -0,0 +1,169 @@
+import random
+
+# Campos que identifican una lectura cuando el firmware no envía "seq".
+CAMPOS_FIRMA = ("temperature", "humidity", "pressure", "aqi", "rainfall")
+
+# Con firmware que sirve /data?since=, lecturas que se dejan juntar en el
+# Modulo entre un sondeo y el siguiente (su anillo en RAM guarda 64).
+MUESTRAS_POR_SONDEO = 5
+
+
+class AdaptiveSchedule:
+    """
+    Decide cuándo volver a sondear una estación.
+
+    Aprende cada cuánto refresca el Modulo sus lecturas (2 s en el firmware
+    actual) y en qué fase, y programa el siguiente sondeo justo después de
+    la próxima actualización. Con firmware nuevo usa "seq" y "age_ms" del
+    JSON; con el viejo compara los valores y acota el instante del cambio
+    entre dos sondeos. Tras un fallo espera con backoff exponencial y jitter.
+
+    Si el Modulo responde por lotes (ver registrar_lote()), no hace falta
+    ir a cada actualización: se vuelve cada `muestras_por_sondeo` lecturas
+    y se traen todas juntas.
+
+    Todos los tiempos son de time.monotonic().
+    """
+
+    def __init__(self, periodo_inicial=2.0, margen=0.1, periodo_min=0.5, periodo_max=60.0,
+                 backoff_base=1.0, backoff_max=60.0, suavizado=0.2,
+                 muestras_por_sondeo=MUESTRAS_POR_SONDEO):
+        self.periodo = periodo_inicial
+        self.margen = margen
+        self.periodo_min = periodo_min
+        self.periodo_max = periodo_max
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.suavizado = suavizado
+        self.muestras_por_sondeo = muestras_por_sondeo
+
+        self.fallos = 0
+        self.ultimo_cambio = None
+        self._cambio_observado = None
+        self._ultima_firma = None
+        self._ultima_seq = None
+        self._ultimo_sondeo = None
+        self._proximo = 0.0
+
+    @property
+    def ultima_seq(self):
+        """"seq" de la última lectura recibida (None sin firmware nuevo o sin lecturas)."""
+        return self._ultima_seq
+
+    def _firma(self, data):
+        return tuple(data.get(c) for c in CAMPOS_FIRMA)
+
+    def registrar(self, data, ahora):
+        """Registra una respuesta; devuelve True si trae una lectura nueva."""
+        self.fallos = 0
+        seq = data.get('seq')
+        if seq is not None:
+            nueva = seq != self._ultima_seq
+            if self._ultima_seq is None:
+                saltos = 1
+            elif seq > self._ultima_seq:
+                saltos = seq - self._ultima_seq
+            else:
+                # El Modulo se reinició: los saltos se estiman como sin "seq".
+                saltos = None
+        else:
+            nueva = self._firma(data) != self._ultima_firma
+            saltos = None
+
+        if nueva:
+            cambio = self._estimar_cambio(data, ahora)
+            self._aprender_periodo(cambio, saltos)
+            self.ultimo_cambio = cambio
+            self._cambio_observado = cambio
+            self._ultima_seq = seq
+            self._ultima_firma = self._firma(data)
+            self._proximo = self._siguiente_cambio(ahora) + self._margen(data)
+        else:
+            self._reintentar_pronto(ahora)
+
+        self._ultimo_sondeo = ahora
+        return nueva
+
+    def registrar_lote(self, muestras, ahora, es_lote=True):
+        """
+        Registra la respuesta de /data?since= (las lecturas de la más vieja a
+        la más nueva) y devuelve las que son nuevas. Con `es_lote` False
+        (firmware viejo, una lectura en JSON) se sondea a cada actualización.
+        """
+        if not muestras:
+            # Lote vacío: la lectura siguiente aún no ocurre.
+            self.fallos = 0
+            self._reintentar_pronto(ahora)
+            self._ultimo_sondeo = ahora
+            return []
+        anterior, ultima = self._ultima_seq, muestras[-1]
+        if not self.registrar(ultima, ahora):
+            return []
+        # Si "seq" retrocedió, el Modulo se reinició y todo el lote es nuevo.
+        if anterior is not None and ultima.get('seq') is not None and ultima['seq'] > anterior:
+            muestras = [data for data in muestras if data['seq'] > anterior]
+        if es_lote:
+            self._proximo += (self.muestras_por_sondeo - 1) * self.periodo
+        return muestras
+
+    def _reintentar_pronto(self, ahora):
+        # Llegamos antes de la actualización: sabemos que aún no ocurre,
+        # así que corremos la fase (no el periodo) y reintentamos en breve.
+        if self.ultimo_cambio is not None:
+            esperado = self._cambio_previsto(ahora)
+            if esperado > self.ultimo_cambio and esperado <= ahora:
+                self.ultimo_cambio += ahora - esperado
+        self._proximo = ahora + max(0.1, 0.1 * self.periodo)
+
+    def _margen(self, data):
+        # Con "age_ms" la fase es exacta; sin él dejamos holgura para no llegar antes.
+        return self.margen if 'age_ms' in data else max(self.margen, 0.1 * self.periodo)
+
+    def _cambio_previsto(self, ahora):
+        """Última actualización que la fase aprendida sitúa en o antes de `ahora`."""
+        pasos = max(1, int((ahora - self.ultimo_cambio) // self.periodo))
+        return self.ultimo_cambio + pasos * self.periodo
+
+    def _estimar_cambio(self, data, ahora):
+        if 'age_ms' in data:
+            return ahora - data['age_ms'] / 1000.0
+        if self.ultimo_cambio is None:
+            return ahora
+        # El cambio ocurrió entre el sondeo anterior y este: nos quedamos con
+        # la predicción si cae en ese intervalo, o con el extremo más cercano.
+        inferior = self._ultimo_sondeo if self._ultimo_sondeo is not None else ahora - self.periodo
+        return min(max(self._cambio_previsto(ahora), inferior), ahora)
+
+    def _aprender_periodo(self, cambio, saltos):
+        if self._cambio_observado is None:
+            return
+        delta = cambio - self._cambio_observado
+        if delta <= 0:
+            return
+        if saltos is None:
+            # Sin "seq" no sabemos si hubo lecturas idénticas intermedias, y
+            # solo se pueden descubrir periodos más largos que el supuesto.
+            saltos = 1 if delta < 1.75 * self.periodo else round(delta / self.periodo)
+            peso = self.suavizado
+        else:
+            # Con "seq" la medición abarca `saltos` periodos conocidos y su
+            # error se reparte entre ellos: pesa más (p. ej. en un lote).
+            peso = min(1.0, self.suavizado * saltos)
+        medido = min(max(delta / saltos, self.periodo_min), self.periodo_max)
+        self.periodo += peso * (medido - self.periodo)
+
+    def _siguiente_cambio(self, ahora):
+        if self.ultimo_cambio is None:
+            return ahora + self.periodo
+        pasos = int((ahora - self.ultimo_cambio) // self.periodo) + 1
+        return self.ultimo_cambio + pasos * self.periodo
+
+    def registrar_fallo(self, ahora):
+        self.fallos += 1
+        espera = min(self.backoff_max, self.backoff_base * 2 ** (self.fallos - 1))
+        # Jitter para que muchas estaciones caídas no reintenten a la vez.
+        self._proximo = ahora + espera * random.uniform(0.5, 1.5)
+        self._ultimo_sondeo = None
+
+    def siguiente(self):
+        return self._proximo
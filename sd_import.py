@@ -0,0 +1,417 @@
+import os
+import time
+import argparse
+from datetime import datetime
+
+import numpy as np
+
+from ring_buffer import COLUMNAS, SENSORES
+from quality import filtrar_columnas
+from storage import DB_PATH, HistoryStore
+
+# El firmware escribe una fila en datalog.csv en cada lectura (cada 2 s).
+PERIODO_SD = 2.0
+
+# Columnas de cada fila de datalog.csv, en el orden de logDataToSD(). El
+# firmware nuevo agrega el "seq" de la lectura al final: no se guarda, pero
+# fecha la fila (ver lecturas()).
+COLUMNAS_SD = SENSORES
+_CAMPOS_LINEA = (len(COLUMNAS_SD), len(COLUMNAS_SD) + 1)
+
+# Primera línea que escribe el firmware al crear datalog.csv.
+_ENCABEZADO = b"Temperatura,"
+
+TAM_BLOQUE = 16 * 1024 * 1024
+# Por debajo de este tamaño un bloque con líneas raras va directo al parser lento.
+_BLOQUE_MINIMO = 64 * 1024
+
+# Coincidencias mínimas con el historial para confiar en el anclaje automático.
+MIN_COINCIDENCIAS = 5
+
+# Clase de cada byte posible, para validar y separar en una sola pasada.
+_INVALIDO, _DIGITO, _COMA, _FIN, _PUNTO, _MENOS, _IGNORAR = range(7)
+_CLASES = np.zeros(256, dtype=np.uint8)
+_CLASES[ord("0"):ord("9") + 1] = _DIGITO
+_CLASES[ord(",")] = _COMA
+_CLASES[ord("\n")] = _FIN
+_CLASES[ord(".")] = _PUNTO
+_CLASES[ord("-")] = _MENOS
+_CLASES[[ord("\r"), ord(" ")]] = _IGNORAR
+
+_POTENCIAS = 10.0 ** np.arange(0, 40)
+
+
+# --- LECTURA Y PARSEO ---
+def leer_bloques(ruta, tam_bloque=TAM_BLOQUE):
+    """Genera bloques de bytes de `ruta` que siempre terminan en fin de línea."""
+    with open(ruta, "rb") as f:
+        resto = b""
+        while True:
+            datos = f.read(tam_bloque)
+            if not datos:
+                break
+            datos = resto + datos
+            corte = datos.rfind(b"\n") + 1
+            resto = datos[corte:]
+            if corte:
+                yield datos[:corte]
+        if resto.strip():
+            # La última fila puede quedar sin salto de línea si se cortó la luz.
+            yield resto + b"\n"
+
+
+def parsear_bloque(datos):
+    """
+    Convierte líneas "t,h,p,qai,lluvia[,seq]" a un arreglo (n, 5).
+
+    Devuelve (valores, descartadas): el encabezado, las líneas vacías y
+    las que quedaron a medias o con basura no cuentan como filas, y solo
+    las dos últimas se cuentan como descartadas.
+    """
+    valores, _, descartadas = parsear_con_seq(datos)
+    return valores, descartadas
+
+
+def parsear_con_seq(datos):
+    """
+    Igual que parsear_bloque() pero devuelve (valores, seq, descartadas),
+    con el "seq" de cada fila (NaN en las líneas del firmware viejo).
+    """
+    if datos.startswith(_ENCABEZADO):
+        datos = datos[datos.find(b"\n") + 1:]
+    if not datos.endswith(b"\n"):
+        datos += b"\n"
+    rapido = _parsear_rapido(datos)
+    if rapido is not None:
+        return (*rapido, 0)
+    # Hay alguna línea rara: partimos el bloque a la mitad para que solo el
+    # pedazo que la contiene pase por el parser lento.
+    mitad = datos.rfind(b"\n", 0, len(datos) // 2) + 1
+    if len(datos) <= _BLOQUE_MINIMO or mitad == 0:
+        return _parsear_general(datos)
+    (v1, s1, malas_1), (v2, s2, malas_2) = parsear_con_seq(datos[:mitad]), parsear_con_seq(datos[mitad:])
+    return np.concatenate([v1, v2]), np.concatenate([s1, s2]), malas_1 + malas_2
+
+
+def _parsear_rapido(datos):
+    """
+    String(float) del Arduino siempre escribe 2 decimales: sin los puntos
+    cada fila son 5 enteros (t, h y p en centésimas) que NumPy lee directo.
+    Devuelve (valores, seq), o None si los conteos no cuadran o algo no es
+    un número.
+    """
+    lineas = datos.count(b"\n")
+    comas = datos.count(b",")
+    # Todas las filas con el mismo formato: con o sin "seq" (entero, sin punto).
+    campos = next((n for n in _CAMPOS_LINEA if comas == (n - 1) * lineas), None)
+    if campos is None or datos.count(b".") != 3 * lineas:
+        return None
+    try:
+        enteros = np.fromstring(datos.translate(None, b"\r. ").replace(b"\n", b","),
+                                dtype=np.int64, sep=",")
+    except ValueError:
+        return None
+    if len(enteros) != campos * lineas:
+        return None
+    enteros = enteros.reshape(-1, campos)
+    valores = enteros[:, :len(COLUMNAS_SD)].astype(float)
+    valores[:, :3] /= 100
+    if campos > len(COLUMNAS_SD):
+        return valores, enteros[:, -1].astype(float)
+    return valores, np.full(lineas, np.nan)
+
+
+def _parsear_general(datos):
+    """
+    Igual que parsear_con_seq() pero tolera cualquier contenido: valida y
+    convierte byte por byte con operaciones de NumPy (sin un float() por
+    valor) y descarta solo las líneas malas.
+    """
+    b = np.frombuffer(datos, dtype=np.uint8)
+    clase = _CLASES[b]
+    es_sep = (clase == _COMA) | (clase == _FIN)
+
+    # Campo de cada byte: el separador pertenece al campo que cierra.
+    campo = np.cumsum(es_sep, dtype=np.int32)
+    campo -= es_sep
+    separadores = np.flatnonzero(es_sep)
+    n_campos = len(separadores)
+
+    # Línea de cada campo y campos por línea.
+    cierra_linea = b[separadores] == ord("\n")
+    linea = np.cumsum(cierra_linea, dtype=np.int32) - cierra_linea
+    n_lineas = int(cierra_linea.sum())
+    campos_por_linea = np.bincount(linea, minlength=n_lineas)
+
+    # Valor de cada campo: sus dígitos como entero, dividido entre 10**decimales.
+    digitos = np.flatnonzero(clase == _DIGITO)
+    campo_digito = campo[digitos]
+    por_campo = np.bincount(campo_digito, minlength=n_campos)
+    ultimo = np.cumsum(por_campo) - 1
+    exponente = ultimo[campo_digito] - np.arange(len(digitos))
+    exponente = np.minimum(exponente, len(_POTENCIAS) - 1)
+    enteros = np.bincount(campo_digito, minlength=n_campos,
+                          weights=(b[digitos] - 48) * _POTENCIAS[exponente])
+
+    puntos = np.flatnonzero(clase == _PUNTO)
+    posicion_punto = np.full(n_campos, len(b))
+    posicion_punto[campo[puntos]] = puntos
+    decimales = np.bincount(campo_digito[digitos > posicion_punto[campo_digito]], minlength=n_campos)
+    valores = enteros / _POTENCIAS[np.minimum(decimales, len(_POTENCIAS) - 1)]
+
+    menos = np.flatnonzero(clase == _MENOS)
+    signos = np.bincount(campo[menos], minlength=n_campos)
+    valores[signos == 1] *= -1
+
+    # Líneas con basura, campos de más o de menos, campos vacíos o con dos
+    # puntos o signos: se descartan completas.
+    campo_malo = (por_campo == 0) | (np.bincount(campo[puntos], minlength=n_campos) > 1) | (signos > 1)
+    basura = campo[np.flatnonzero(clase == _INVALIDO)]
+    campo_malo[basura] = True
+    mala = ~np.isin(campos_por_linea, _CAMPOS_LINEA) | (np.bincount(linea[campo_malo], minlength=n_lineas) > 0)
+
+    # El "seq" final, si lo hay, va aparte. String(float) del Arduino usa 2
+    # decimales: redondeamos el error de la suma.
+    en_linea = np.arange(n_campos) - (np.cumsum(campos_por_linea) - campos_por_linea)[linea]
+    seq = np.full(n_lineas, np.nan)
+    es_seq = en_linea == len(COLUMNAS_SD)
+    seq[linea[es_seq]] = valores[es_seq]
+    seq = seq[~mala]
+    valores = np.round(valores[~mala[linea] & (en_linea < len(COLUMNAS_SD))], 2).reshape(-1, len(COLUMNAS_SD))
+
+    # Las líneas en blanco (p. ej. "\r\n" suelto) no se reportan como descartadas.
+    longitud = np.diff(separadores, prepend=-1) - 1
+    ignorados = np.bincount(campo[np.flatnonzero(clase == _IGNORAR)], minlength=n_campos)
+    fin_de_linea = np.flatnonzero(cierra_linea)
+    vacias = (campos_por_linea == 1) & (longitud[fin_de_linea] == ignorados[fin_de_linea])
+    return valores, seq, int((mala & ~vacias).sum())
+
+
+def lecturas(seq, previa=(np.nan, -1.0)):
+    """
+    Número de lectura de cada fila, para fechar el archivo con
+    ancla + lectura * periodo.
+
+    Dentro de un tramo con "seq" creciente la lectura avanza lo que avanza el
+    seq, así que las filas que no llegaron a la SD (SD.open falló) dejan su
+    hueco. Un seq que no crece es un reinicio del Modulo: el tramo nuevo
+    sigue a una lectura del anterior, igual que las líneas sin seq del
+    firmware viejo. `previa` es (seq, lectura) de la última fila del bloque
+    anterior; devuelve (lecturas, previa para el bloque siguiente).
+    """
+    if len(seq) == 0:
+        return np.empty(0), previa
+    anterior = np.concatenate([[previa[0]], seq[:-1]])
+    paso = np.ones(len(seq))
+    with np.errstate(invalid="ignore"):
+        continua = seq > anterior
+    paso[continua] = (seq - anterior)[continua]
+    numeros = previa[1] + np.cumsum(paso)
+    return numeros, (seq[-1], numeros[-1])
+
+
+def leer_lecturas(ruta, tam_bloque=TAM_BLOQUE):
+    """Genera (bytes leídos, valores, lecturas, descartadas) por bloque de `ruta`."""
+    previa = (np.nan, -1.0)
+    for datos in leer_bloques(ruta, tam_bloque):
+        valores, seq, descartadas = parsear_con_seq(datos)
+        numeros, previa = lecturas(seq, previa)
+        yield len(datos), valores, numeros, descartadas
+
+
+def claves(valores):
+    """Una clave entera por fila para comparar lecturas del SD con las sondeadas."""
+    # En el historial las caídas del sensor quedaron en NaN; en la SD, en 0.
+    enteros = np.round(np.nan_to_num(np.asarray(valores, dtype=float)) * 100).astype(np.int64)
+    clave = np.zeros(len(enteros), dtype=np.int64)
+    # Mezcla multiplicativa; el desbordamiento de int64 es intencional.
+    with np.errstate(over="ignore"):
+        for i in range(enteros.shape[1]):
+            clave = clave * np.int64(1_000_003) + enteros[:, i]
+    return clave
+
+
+# --- ANCLAJE EN EL TIEMPO ---
+def anclar_con_historial(ruta, estacion, store, periodo=PERIODO_SD, tam_bloque=TAM_BLOQUE):
+    """
+    Busca en el historial las lecturas sondeadas en vivo que también están en
+    el archivo y ajusta t = ancla + lectura * periodo sobre ellas (ver
+    lecturas()).
+
+    Cada coincidencia propone un desfase; el más votado separa las
+    coincidencias reales de las lecturas que se repiten por casualidad, y
+    con ellas se ajusta por mínimos cuadrados el periodo real (el Modulo se
+    atrasa unos ms en cada lectura). Devuelve (ancla, periodo) o None.
+    """
+    claves_vivas, tiempos_vivos = [], []
+    for bloque in store.iterar(estacion):
+        claves_vivas.append(claves(np.column_stack([bloque[c] for c in COLUMNAS_SD])))
+        tiempos_vivos.append(bloque['timestamp'])
+    if not claves_vivas:
+        return None
+    claves_vivas = np.concatenate(claves_vivas)
+    tiempos_vivos = np.concatenate(tiempos_vivos)
+
+    # Solo sirven las lecturas que aparecen una vez en el historial.
+    unicas, indice, cuentas = np.unique(claves_vivas, return_index=True, return_counts=True)
+    unicas, tiempos_unicos = unicas[cuentas == 1], tiempos_vivos[indice[cuentas == 1]]
+
+    filas, tiempos = [], []
+    for _, valores, numeros, _ in leer_lecturas(ruta, tam_bloque):
+        clave = claves(valores)
+        pos = np.clip(np.searchsorted(unicas, clave), 0, max(len(unicas) - 1, 0))
+        coincide = unicas[pos] == clave if len(unicas) else np.zeros(len(clave), bool)
+        filas.append(numeros[coincide])
+        tiempos.append(tiempos_unicos[pos[coincide]])
+    filas = np.concatenate(filas).astype(float)
+    tiempos = np.concatenate(tiempos)
+    if len(filas) < MIN_COINCIDENCIAS:
+        return None
+
+    desfases = np.round((tiempos - filas * periodo) / periodo)
+    votos, cuentas = np.unique(desfases, return_counts=True)
+    elegidas = desfases == votos[cuentas.argmax()]
+    if elegidas.sum() < MIN_COINCIDENCIAS:
+        return None
+
+    # Ajuste lineal y una segunda pasada con las coincidencias que encajan.
+    for _ in range(2):
+        if np.ptp(filas[elegidas]) > 0:
+            periodo, ancla = np.polyfit(filas[elegidas], tiempos[elegidas], 1)
+        else:
+            ancla = np.median(tiempos[elegidas] - filas[elegidas] * periodo)
+        elegidas = np.abs(tiempos - (ancla + filas * periodo)) < periodo / 2
+    return float(ancla), float(periodo)
+
+
+# --- IMPORTACIÓN ---
+def contar_filas(ruta, tam_bloque=TAM_BLOQUE):
+    return sum(len(valores) for _, valores, _, _ in leer_lecturas(ruta, tam_bloque))
+
+
+def lectura_de_fila(ruta, fila, tam_bloque=TAM_BLOQUE):
+    """Número de lectura (ver lecturas()) de la fila `fila`; negativa cuenta desde el final."""
+    if fila < 0:
+        fila += contar_filas(ruta, tam_bloque)
+    vistas = 0
+    for _, valores, numeros, _ in leer_lecturas(ruta, tam_bloque):
+        if fila < vistas + len(valores):
+            return float(numeros[fila - vistas])
+        vistas += len(valores)
+    raise ValueError(f"El archivo tiene {vistas} filas; no hay fila {fila}.")
+
+
+def importar_datalog(ruta, estacion, store, ancla=None, fila_ancla=0, periodo=PERIODO_SD,
+                     tam_bloque=TAM_BLOQUE, progreso=None, al_importar=None):
+    """
+    Importa un datalog.csv de la SD del Modulo al historial de `estacion`.
+
+    El archivo no trae horas: cada fila se fecha como
+    ancla + (lectura - lectura de fila_ancla) * periodo, con la lectura
+    sacada del "seq" (ver lecturas()) o, en líneas sin seq, de la posición;
+    `fila_ancla` negativa cuenta desde el final (-1 = última fila). Sin
+    `ancla` se alinea el archivo con las
+    muestras sondeadas en vivo (ver anclar_con_historial). Las filas que
+    caen a menos de medio periodo de una muestra ya guardada se descartan.
+    `al_importar(columnas)` recibe cada bloque recién insertado.
+
+    Devuelve un resumen {filas, nuevas, duplicadas, descartadas, ancla, periodo, segundos}.
+    """
+    inicio = time.perf_counter()
+    if ancla is None:
+        encontrado = anclar_con_historial(ruta, estacion, store, periodo, tam_bloque)
+        if encontrado is None:
+            raise ValueError(f"No hay suficientes lecturas de {estacion} en el historial "
+                             "para fechar el archivo; indique un ancla.")
+        ancla, periodo = encontrado
+        lectura_ancla = 0.0
+    else:
+        lectura_ancla = lectura_de_fila(ruta, fila_ancla, tam_bloque)
+
+    tamano = max(os.path.getsize(ruta), 1)
+    leidos = 0
+    resumen = {"filas": 0, "nuevas": 0, "duplicadas": 0, "descartadas": 0,
+               "ancla": ancla - lectura_ancla * periodo, "periodo": periodo}
+    for tam_datos, valores, numeros, descartadas in leer_lecturas(ruta, tam_bloque):
+        leidos += tam_datos
+        resumen["descartadas"] += descartadas
+        if len(valores) == 0:
+            continue
+
+        tiempos = ancla + (numeros - lectura_ancla) * periodo
+        resumen["filas"] += len(valores)
+        # El filtro de calidad va sobre el bloque entero, antes de deduplicar,
+        # para que cada fila se compare con sus vecinas reales.
+        filtradas = filtrar_columnas({'timestamp': tiempos, **{c: valores[:, i] for i, c in enumerate(COLUMNAS_SD)}})
+
+        # Deduplicación contra lo ya sondeado en vivo en ese intervalo.
+        previas = store.consultar(estacion, tiempos[0] - periodo, tiempos[-1] + periodo,
+                                  columnas=('timestamp',))['timestamp']
+        nuevas = np.ones(len(tiempos), dtype=bool)
+        if len(previas):
+            pos = np.searchsorted(previas, tiempos)
+            izquierda = previas[np.clip(pos - 1, 0, len(previas) - 1)]
+            derecha = previas[np.clip(pos, 0, len(previas) - 1)]
+            cercania = np.minimum(np.abs(tiempos - izquierda), np.abs(derecha - tiempos))
+            nuevas = cercania >= periodo / 2
+        resumen["duplicadas"] += int((~nuevas).sum())
+        resumen["nuevas"] += int(nuevas.sum())
+
+        columnas = {c: filtradas[c][nuevas] for c in COLUMNAS}
+        store.importar_arreglos(estacion, columnas)
+        if al_importar:
+            al_importar(columnas)
+        if progreso:
+            progreso(min(100, 100 * leidos // tamano))
+
+    resumen["segundos"] = time.perf_counter() - inicio
+    return resumen
+
+
+def importar_en_proceso(ruta, estacion, ruta_historial, progreso=None):
+    """
+    Trabajo para jobs.JobManager: importa desde otro proceso y devuelve
+    {resumen, columna...} con lo insertado, para que la GUI lo mezcle en
+    memoria (los arreglos vuelven por memoria compartida).
+    """
+    partes = []
+    resumen = importar_datalog(ruta, estacion, HistoryStore(ruta_historial),
+                               progreso=progreso, al_importar=partes.append)
+    resultado = {"resumen": resumen}
+    for c in COLUMNAS:
+        resultado[c] = np.concatenate([p[c] for p in partes]) if partes else np.empty(0)
+    return resultado
+
+
+# --- PUNTO DE ENTRADA ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Importa el datalog.csv de la SD de un Modulo al historial.")
+    parser.add_argument("archivo", help="Ruta a datalog.csv")
+    parser.add_argument("--estacion", required=True, metavar="IP",
+                        help="Estación a la que pertenece el archivo.")
+    parser.add_argument("--historial", default=DB_PATH, metavar="RUTA")
+    parser.add_argument("--ancla", metavar="FECHA",
+                        help="Hora local de la fila ancla, p. ej. '2026-10-18 14:30:00'. "
+                             "Sin ella se alinea con el historial.")
+    parser.add_argument("--fila-ancla", type=int, default=-1,
+                        help="Fila a la que corresponde --ancla (-1 = la última).")
+    parser.add_argument("--periodo", type=float, default=PERIODO_SD,
+                        help="Segundos entre filas del archivo.")
+    args = parser.parse_args()
+
+    ancla = datetime.fromisoformat(args.ancla).timestamp() if args.ancla else None
+    store = HistoryStore(args.historial)
+    try:
+        resumen = importar_datalog(args.archivo, args.estacion, store, ancla=ancla,
+                                   fila_ancla=args.fila_ancla, periodo=args.periodo)
+    except ValueError as e:
+        print(f"[SD Import] {e}")
+        raise SystemExit(1)
+    finally:
+        store.cerrar()
+
+    print(f"[SD Import] {resumen['filas']} filas en {resumen['segundos']:.1f} s: "
+          f"{resumen['nuevas']} nuevas, {resumen['duplicadas']} ya estaban en el historial, "
+          f"{resumen['descartadas']} líneas ilegibles.")
+    print(f"[SD Import] Primera fila: {datetime.fromtimestamp(resumen['ancla'])}, "
+          f"periodo {resumen['periodo']:.4f} s")
@@ -0,0 +1,267 @@
+import json
+import time
+import random
+import argparse
+import threading
+from collections import deque
+from http.server import HTTPServer, ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+from polling import REGISTRO_LOTE
+
+# Igual que LOG_CHUNK_MAX y DATA_RING_SIZE en el firmware.
+LOG_CHUNK_MAX = 4096
+ANILLO_DATOS = 64
+
+ENCABEZADO_LOG = b"Temperatura,Humedad,Presion,QAI,Lluvia,Seq\r\n"
+
+
+class SimulatedStation:
+    """
+    Modulo meteorológico simulado para pruebas sin hardware.
+
+    Habla el mismo protocolo que el firmware: /data con "seq" y "age_ms",
+    /data?since=N con las últimas lecturas en binario (salvo con `lotes`
+    False, que imita al firmware viejo y responde siempre el JSON) y /log
+    con el datalog.csv por rangos de bytes. Las lecturas se generan
+    según el reloj cada `periodo` segundos y se agregan al log aunque la
+    estación esté "sin red" (ver cortar()), igual que la SD del Modulo.
+
+    Cada respuesta se demora `latencia` ± `jitter` segundos y una fracción
+    `perdida` de las peticiones se cierra sin respuesta. Con `bloqueante`
+    atiende de a un cliente, como el WiFiServer (WiFiS3) del Arduino UNO
+    R4 WiFi: mientras responde, las demás conexiones esperan en la cola del
+    socket.
+    """
+
+    def __init__(self, puerto=0, host="127.0.0.1", periodo=2.0, semilla=None,
+                 latencia=0.0, jitter=0.0, perdida=0.0, bloqueante=False, lotes=True):
+        self.periodo = periodo
+        self.latencia = latencia
+        self.jitter = jitter
+        self.perdida = perdida
+        self.lotes = lotes
+        self.seq = 0
+        self.log = bytearray(ENCABEZADO_LOG)
+        # (seq, instante de la lectura, valores) de las últimas lecturas, como la RAM del Modulo.
+        self.anillo = deque(maxlen=ANILLO_DATOS)
+        self.solicitudes = 0
+        self._azar = random.Random(semilla)
+        self._valores = {"temperature": 22.0, "humidity": 50.0, "pressure": 1013.0, "aqi": 40, "rainfall": 0}
+        self._ultima_lectura = time.monotonic()
+        self._sin_red_hasta = 0.0
+        self._fallas_sd = 0
+        self._lock = threading.Lock()
+        self._hilo = None
+
+        if bloqueante:
+            self.servidor = HTTPServer((host, puerto), _SimHandler)
+        else:
+            self.servidor = ThreadingHTTPServer((host, puerto), _SimHandler)
+            self.servidor.daemon_threads = True
+        self.servidor.simulador = self
+
+    @property
+    def ip(self):
+        host, puerto = self.servidor.server_address[:2]
+        return f"{host}:{puerto}"
+
+    # --- Sensores ---
+    def _leer_sensores(self):
+        v = self._valores
+        v["temperature"] = round(v["temperature"] + self._azar.gauss(0, 0.05), 2)
+        v["humidity"] = round(min(max(v["humidity"] + self._azar.gauss(0, 0.2), 0), 100), 2)
+        v["pressure"] = round(v["pressure"] + self._azar.gauss(0, 0.02), 2)
+        v["aqi"] = min(max(v["aqi"] + self._azar.randint(-2, 2), 0), 300)
+        if self._azar.random() < 0.01:
+            v["rainfall"] = 1 - v["rainfall"]
+        self.seq += 1
+        self.anillo.append((self.seq, self._ultima_lectura, dict(v)))
+        if self._fallas_sd:
+            # SD.open falló: la lectura existe en vivo pero no en el log.
+            self._fallas_sd -= 1
+            return
+        # Mismo formato que logDataToSD(): String(float) con 2 decimales y el seq al final.
+        self.log += (f"{v['temperature']:.2f},{v['humidity']:.2f},{v['pressure']:.2f},"
+                     f"{v['aqi']},{v['rainfall']},{self.seq}\r\n").encode()
+
+    def _avanzar(self):
+        """Genera las lecturas que tocaban desde la última vez (sin hilo propio)."""
+        ahora = time.monotonic()
+        while ahora - self._ultima_lectura >= self.periodo:
+            self._ultima_lectura += self.periodo
+            self._leer_sensores()
+        return ahora
+
+    def datos(self):
+        with self._lock:
+            ahora = self._avanzar()
+            data = dict(self._valores)
+            data["seq"] = self.seq
+            data["age_ms"] = int((ahora - self._ultima_lectura) * 1000)
+            return data
+
+    def lote(self, since):
+        """Respuesta de /data?since=: las lecturas con seq > `since` que siguen en el anillo."""
+        with self._lock:
+            ahora = self._avanzar()
+            if since > self.seq:
+                # El cliente viene de antes de un reinicio.
+                since = 0
+            return b"".join(
+                REGISTRO_LOTE.pack(seq, int((ahora - t) * 1000), v["temperature"], v["humidity"],
+                                   v["pressure"], v["aqi"], v["rainfall"])
+                for seq, t, v in self.anillo if seq > since), self.seq
+
+    def fragmento_log(self, offset, largo):
+        with self._lock:
+            self._avanzar()
+            tamano = len(self.log)
+            offset = min(max(offset, 0), tamano)
+            largo = min(max(largo, 0), LOG_CHUNK_MAX, tamano - offset)
+            return bytes(self.log[offset:offset + largo]), tamano, self.seq
+
+    # --- Fallas simuladas ---
+    def cortar(self, segundos):
+        """Deja de responder `segundos` (como un corte de WiFi); el log sigue creciendo."""
+        self._sin_red_hasta = time.monotonic() + segundos
+
+    def fallar_sd(self, lecturas=1):
+        """Las próximas `lecturas` no llegan al log, como si SD.open fallara; "seq" avanza igual."""
+        with self._lock:
+            self._avanzar()
+            self._fallas_sd += lecturas
+
+    def sin_red(self):
+        return time.monotonic() < self._sin_red_hasta
+
+    def perder(self):
+        """¿Se pierde esta petición? (según `perdida`)"""
+        return self.perdida > 0 and self._azar.random() < self.perdida
+
+    def retardo(self):
+        if not (self.latencia or self.jitter):
+            return 0.0
+        return max(0.0, self.latencia + self._azar.uniform(-self.jitter, self.jitter))
+
+    def reiniciar(self):
+        """Como un reinicio del Modulo: "seq" vuelve a empezar, la SD se conserva."""
+        with self._lock:
+            self._avanzar()
+            self.seq = 0
+            self.anillo.clear()
+
+    # --- Servidor ---
+    def iniciar(self):
+        self._hilo = threading.Thread(target=self.servidor.serve_forever,
+                                      name=f"sim-{self.ip}", daemon=True)
+        self._hilo.start()
+        return self
+
+    def detener(self):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+
+class _SimHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _responder(self, cuerpo, tipo, encabezados=()):
+        self.send_response(200)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(cuerpo)))
+        for nombre, valor in encabezados:
+            self.send_header(nombre, str(valor))
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def do_GET(self):
+        sim = self.server.simulador
+        sim.solicitudes += 1
+        if sim.sin_red() or sim.perder():
+            # Sin red el cliente ve la conexión cerrarse sin respuesta.
+            self.close_connection = True
+            return
+        retardo = sim.retardo()
+        if retardo:
+            time.sleep(retardo)
+
+        url = urlparse(self.path)
+        consulta = parse_qs(url.query)
+        if url.path == "/data" and "since" in consulta and sim.lotes:
+            cuerpo, seq = sim.lote(int(consulta["since"][0]))
+            self._responder(cuerpo, "application/octet-stream", [("X-Data-Seq", seq)])
+        elif url.path == "/data":
+            self._responder(json.dumps(sim.datos()).encode(), "application/json")
+        elif url.path == "/log":
+            offset = int(consulta.get("offset", ["0"])[0])
+            largo = int(consulta.get("len", [str(LOG_CHUNK_MAX)])[0])
+            cuerpo, tamano, seq = sim.fragmento_log(offset, largo)
+            self._responder(cuerpo, "text/csv", [("X-Log-Size", tamano), ("X-Log-Seq", seq)])
+        else:
+            self._responder(b"Modulo simulado", "text/plain")
+
+
+class SimulatedFleet:
+    """
+    Muchas SimulatedStation en un solo proceso, cada una en su puerto.
+    Con `puerto_base` 0 cada estación toma un puerto libre; si no, usan
+    puertos consecutivos desde `puerto_base`.
+    """
+
+    def __init__(self, n, puerto_base=0, host="127.0.0.1", semilla=None, **opciones):
+        self.estaciones = [
+            SimulatedStation(puerto_base + i if puerto_base else 0, host,
+                             semilla=None if semilla is None else semilla + i, **opciones)
+            for i in range(n)]
+
+    @property
+    def ips(self):
+        return [estacion.ip for estacion in self.estaciones]
+
+    def iniciar(self):
+        for estacion in self.estaciones:
+            estacion.iniciar()
+        return self
+
+    def detener(self):
+        for estacion in self.estaciones:
+            estacion.detener()
+
+
+# --- PUNTO DE ENTRADA ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Estaciones meteorológicas simuladas.")
+    parser.add_argument("--estaciones", type=int, default=1,
+                        help="Cuántos Modulos simular.")
+    parser.add_argument("--puerto", type=int, default=8081,
+                        help="Puerto de la primera estación; las demás usan los siguientes (0 = libres).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--periodo", type=float, default=2.0,
+                        help="Segundos entre lecturas.")
+    parser.add_argument("--latencia", type=float, default=0.0,
+                        help="Segundos que tarda cada respuesta.")
+    parser.add_argument("--jitter", type=float, default=0.0,
+                        help="Variación aleatoria (±s) de la latencia.")
+    parser.add_argument("--perdida", type=float, default=0.0,
+                        help="Fracción de peticiones que se cierran sin respuesta.")
+    parser.add_argument("--bloqueante", action="store_true",
+                        help="Atender de a un cliente, como el Arduino UNO R4 WiFi.")
+    parser.add_argument("--sin-lotes", action="store_true",
+                        help="Ignorar /data?since= y responder siempre una lectura en JSON, como el firmware viejo.")
+    parser.add_argument("--semilla", type=int)
+    args = parser.parse_args()
+
+    flota = SimulatedFleet(args.estaciones, args.puerto, args.host, semilla=args.semilla,
+                           periodo=args.periodo, latencia=args.latencia, jitter=args.jitter,
+                           perdida=args.perdida, bloqueante=args.bloqueante,
+                           lotes=not args.sin_lotes).iniciar()
+    for ip in flota.ips:
+        print(f"[Simulador] Modulo simulado en http://{ip}")
+    print(f"[Simulador] {len(flota.estaciones)} estaciones listas", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        flota.detener()
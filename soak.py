@@ -0,0 +1,311 @@
+import os
+import gc
+import sys
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+import numpy as np
+
+from benchmark import rss_kb
+from discovery import StationDirectory
+
+# IP que rechaza la conexión al instante: el primer intento de la conexión
+# secuencial falla y se pasa a la siguiente, como con una IP vieja.
+IP_MUERTA = "127.0.0.1:1"
+
+# Cuánto puede crecer cada medida, según la recta ajustada desde el fin del
+# calentamiento hasta el último ciclo, antes de considerarla una fuga.
+LIMITES = {"hilos": 2, "objetos_qt": 25, "rss_kb": 16384, "python_kb": 2048}
+
+# Lo que crece con las muestras ingeridas y no con los ciclos (gráfica,
+# ventanas de estadísticas, historial comprimido): se reporta aparte, como
+# retenido_kb, y no cuenta para python_kb.
+RETENCION = ("*decimation.py", "*stats.py", "*compact_history.py")
+
+
+def hilos_vivos():
+    """Hilos nativos del proceso (incluye los QThread, que Python no ve)."""
+    try:
+        return len(os.listdir("/proc/self/task"))
+    except OSError:
+        import threading
+        return threading.active_count()
+
+
+def objetos_qt_vivos(app):
+    """QObjects vivos: los que Python todavía envuelve más los árboles de las ventanas."""
+    from PyQt5 import QtCore, sip
+    vivos = set()
+    for objeto in gc.get_objects():
+        if isinstance(objeto, QtCore.QObject) and not sip.isdeleted(objeto):
+            vivos.add(sip.unwrapinstance(objeto))
+    for ventana in app.topLevelWidgets():
+        vivos.add(sip.unwrapinstance(ventana))
+        vivos.update(sip.unwrapinstance(hijo) for hijo in ventana.findChildren(QtCore.QObject))
+    return len(vivos)
+
+
+def _instantanea():
+    """(instantánea sin RETENCION, KB que ocupa RETENCION)."""
+    completa = tracemalloc.take_snapshot()
+    instantanea = completa.filter_traces(
+        [tracemalloc.Filter(False, tracemalloc.__file__)] +
+        [tracemalloc.Filter(False, patron) for patron in RETENCION])
+    retenido = completa.filter_traces([tracemalloc.Filter(True, patron) for patron in RETENCION])
+    return instantanea, sum(traza.size for traza in retenido.traces) // 1024
+
+
+class DirectorioSimulado(StationDirectory):
+    """StationDirectory sin red: las IPs en "caché" y la resolución mDNS las pone el soak."""
+
+    def __init__(self, carpeta, ips):
+        super().__init__(os.path.join(carpeta, "mdns.json"))
+        self.direcciones = {f"sim-{i}": ip for i, ip in enumerate(ips)}
+
+    def iniciar(self):
+        pass
+
+    def resolver(self, ip):
+        self._on_found("Sistema Clima._http._tcp.local.", ip)
+
+
+CAMINOS = ("corte", "secuencial", "busqueda")
+
+
+class Soak:
+    """
+    Maneja una EstacionApp real contra una estación simulada y la hace
+    desconectarse y reconectarse `ciclos` veces, rotando por los caminos que
+    crean hilos, workers y diálogos:
+
+      corte       el Modulo deja de responder: mostrar_error abre el aviso,
+                  el worker reintenta y al volver aparece "Conexión Recuperada"
+      secuencial  iniciar_conexion_secuencial desde cero: la primera IP falla,
+                  mostrar_error detiene ese worker y se pasa a la siguiente
+      busqueda    iniciar_busqueda_arduino: otro QThread de descubrimiento y
+                  un worker nuevo con la IP que "resolvió" mDNS
+
+    Cada ciclo es un generador que hace su acción y cede condiciones; un
+    QTimer las revisa sin bloquear el ciclo de eventos y cierra los diálogos
+    modales como lo haría el usuario. Cada `cada` ciclos se mide RSS, hilos
+    nativos, QObjects vivos y memoria de Python (tracemalloc).
+    """
+
+    def __init__(self, ciclos, periodo=0.5, muestras=25, espera=10.0, rastrear=True, caminos=CAMINOS):
+        self.ciclos = ciclos
+        self.caminos = tuple(caminos)
+        self.periodo = periodo
+        self.cada = max(1, ciclos // muestras)
+        self.espera = espera
+        self.rastrear = rastrear
+        self.serie = []
+        self.atascados = {camino: 0 for camino in self.caminos}
+        self.hechos = 0
+        self._camino = None
+        self._ciclo = None
+        self._condicion = None
+        self._limite = 0.0
+        self._base = None
+
+    # --- Ciclos ---
+    def _conexion_inicial(self):
+        yield lambda: self.ventana.is_connected
+
+    def _corte(self):
+        # Sin red hasta que la app lo note; luego vuelve enseguida.
+        self.sim.cortar(self.espera)
+        yield lambda: not self.ventana.is_connected
+        self.sim.cortar(0)
+        yield lambda: self.ventana.is_connected
+
+    def _secuencial(self):
+        ventana = self.ventana
+        ventana.stop_current_worker()
+        ventana.has_connected_once = False
+        ventana.current_ip_index = 0
+        ventana.iniciar_conexion_secuencial()
+        yield lambda: ventana.is_connected
+
+    def _busqueda(self):
+        ventana = self.ventana
+        anterior = ventana.data_worker
+        ventana.iniciar_busqueda_arduino()
+        yield lambda: ventana.data_worker is not anterior and ventana.is_connected
+
+    # --- Bucle ---
+    def _paso(self):
+        from PyQt5.QtWidgets import QApplication
+        modal = QApplication.activeModalWidget()
+        if modal is not None:
+            # "Conexión Recuperada": el usuario le da Aceptar.
+            modal.done(0)
+            return
+        if self._condicion is not None:
+            if self._condicion():
+                self._avanzar()
+            elif time.monotonic() > self._limite:
+                print(f"[Soak] Ciclo {self.hechos} ({self._camino}) atascado; se sigue con el próximo.")
+                self.atascados[self._camino] += 1
+                self._ciclo = self._condicion = None
+                self._terminar_ciclo()
+            return
+        self._iniciar_ciclo()
+
+    def _iniciar_ciclo(self):
+        self._camino = self.caminos[self.hechos % len(self.caminos)]
+        self._ciclo = getattr(self, f"_{self._camino}")()
+        self._avanzar()
+
+    def _avanzar(self):
+        try:
+            self._condicion = next(self._ciclo)
+            self._limite = time.monotonic() + self.espera
+        except StopIteration:
+            self._ciclo = self._condicion = None
+            self._terminar_ciclo()
+
+    def _terminar_ciclo(self):
+        if self._camino is None:
+            # La conexión del arranque no cuenta como ciclo.
+            return
+        self.hechos += 1
+        if self.hechos % self.cada == 0 or self.hechos == self.ciclos:
+            self._medir()
+        if self.hechos >= self.ciclos:
+            self.timer.stop()
+            self.app.quit()
+
+    def _medir(self):
+        from PyQt5 import QtCore
+        # Lo que quedó con deleteLater se borra antes de contar.
+        QtCore.QCoreApplication.sendPostedEvents(None, QtCore.QEvent.DeferredDelete)
+        gc.collect()
+        punto = {"ciclo": self.hechos, "segundos": time.perf_counter() - self._inicio,
+                 "rss_kb": rss_kb(), "hilos": hilos_vivos(), "objetos_qt": objetos_qt_vivos(self.app)}
+        if self.rastrear:
+            # Las trazas de tracemalloc también ocupan RSS y crecen con la corrida.
+            punto["rss_kb"] -= tracemalloc.get_tracemalloc_memory() // 1024
+            instantanea, punto["retenido_kb"] = _instantanea()
+            punto["python_kb"] = sum(stat.size for stat in instantanea.statistics("filename")) // 1024
+            if self._base is None and len(self.serie) >= self._calentamiento():
+                self._base = instantanea
+            self._ultima = instantanea
+        self.serie.append(punto)
+        print(f"[Soak] ciclo {punto['ciclo']:>6}  {punto['segundos']:7.1f} s  RSS {punto['rss_kb'] / 1024:7.1f} MB  "
+              f"hilos {punto['hilos']:>3}  QObjects {punto['objetos_qt']:>5}"
+              + (f"  Python {punto['python_kb'] / 1024:6.1f} MB  retenido {punto['retenido_kb'] / 1024:6.1f} MB"
+                 if self.rastrear else ""), flush=True)
+
+    def _calentamiento(self):
+        """Muestras que se descartan al ajustar la recta: cachés y pools se llenan al principio."""
+        return max(1, len(range(self.cada, self.ciclos + 1, self.cada)) // 5)
+
+    def correr(self):
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        from PyQt5 import QtCore
+        from PyQt5.QtWidgets import QApplication
+        from simulator import SimulatedStation
+        import main
+
+        if self.rastrear:
+            tracemalloc.start()
+        self.app = QApplication.instance() or QApplication(sys.argv[:1])
+        # Responde siempre en JSON: el worker sondea a cada lectura y nota el corte enseguida.
+        self.sim = SimulatedStation(periodo=self.periodo, lotes=False).iniciar()
+        with tempfile.TemporaryDirectory() as carpeta:
+            directorio = DirectorioSimulado(carpeta, [IP_MUERTA, self.sim.ip])
+            directorio.resolver(self.sim.ip)
+            self.ventana = main.EstacionApp(modo_conexion="secuencial", ruta_historial=None,
+                                            directorio=directorio)
+            iniciar_hilo = self.ventana.iniciar_hilo_trabajador
+
+            def iniciar_hilo_rapido():
+                iniciar_hilo()
+                # Reintentos en milisegundos y no en segundos: miles de cortes en minutos.
+                agenda = self.ventana.data_worker.agenda
+                agenda.backoff_base = agenda.backoff_max = 0.01
+            self.ventana.iniciar_hilo_trabajador = iniciar_hilo_rapido
+            self.ventana.show()
+
+            self._ciclo = self._conexion_inicial()
+            self._avanzar()
+            self.timer = QtCore.QTimer()
+            self.timer.setInterval(1)
+            self.timer.timeout.connect(self._paso)
+            self._inicio = time.perf_counter()
+            self.timer.start()
+            self.app.exec_()
+            self.ventana.close()
+        self.sim.detener()
+        return self.veredicto()
+
+    # --- Resultado ---
+    def crecimiento(self):
+        """Crecimiento de cada medida según la recta ajustada tras el calentamiento."""
+        serie = self.serie[self._calentamiento():]
+        if len(serie) < 3:
+            return {}
+        ciclos = np.array([p["ciclo"] for p in serie], dtype=float)
+        resultado = {}
+        for medida in (*LIMITES, "retenido_kb"):
+            if medida in serie[0]:
+                pendiente = np.polyfit(ciclos, [p[medida] for p in serie], 1)[0]
+                resultado[medida] = float(pendiente * (ciclos[-1] - ciclos[0]))
+        return resultado
+
+    def veredicto(self):
+        """Imprime el resumen y devuelve las medidas que crecieron más de su límite."""
+        print(f"[Soak] {self.hechos} ciclos en {self.serie[-1]['segundos']:.1f} s; atascados: "
+              + ", ".join(f"{camino} {n}" for camino, n in self.atascados.items()))
+        fugas = [camino for camino, n in self.atascados.items() if n]
+        for medida, crecio in self.crecimiento().items():
+            if medida not in LIMITES:
+                print(f"[Soak]   {medida:<12} {crecio:+12.1f} (crece con las muestras, sin límite)")
+                continue
+            marca = "  << CRECE" if crecio > LIMITES[medida] else ""
+            print(f"[Soak]   {medida:<12} {crecio:+12.1f} (límite {LIMITES[medida]}){marca}")
+            if marca:
+                fugas.append(medida)
+        if self.rastrear and self._base is not None:
+            print("[Soak] Líneas que más memoria sumaron desde el calentamiento:")
+            for stat in self._ultima.compare_to(self._base, "lineno")[:10]:
+                print(f"[Soak]   {stat}")
+        return fugas
+
+
+# --- PUNTO DE ENTRADA ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Soak de reconexiones: busca hilos, QObjects y memoria que no se liberan.")
+    parser.add_argument("--ciclos", type=int, default=3000,
+                        help="Desconexiones y reconexiones a provocar.")
+    parser.add_argument("--periodo", type=float, default=0.5,
+                        help="Segundos entre lecturas de la estación simulada (la agenda no baja de 0.5).")
+    parser.add_argument("--muestras", type=int, default=25,
+                        help="Cuántas veces medir a lo largo de la corrida.")
+    parser.add_argument("--caminos", default=",".join(CAMINOS),
+                        help="Caminos de reconexión a rotar, separados por comas (para aislar una fuga).")
+    parser.add_argument("--sin-tracemalloc", action="store_true",
+                        help="No medir la memoria de Python: la corrida va más rápido y el RSS "
+                             "no carga con las instantáneas de tracemalloc.")
+    parser.add_argument("--json", metavar="RUTA", help="Guardar la serie de mediciones.")
+    args = parser.parse_args()
+
+    caminos = [c.strip() for c in args.caminos.split(",") if c.strip()]
+    desconocidos = set(caminos) - set(CAMINOS)
+    if not caminos or desconocidos:
+        parser.error(f"caminos válidos: {', '.join(CAMINOS)}")
+    soak = Soak(args.ciclos, periodo=args.periodo, muestras=args.muestras, rastrear=not args.sin_tracemalloc,
+                caminos=caminos)
+    fugas = soak.correr()
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"serie": soak.serie, "crecimiento": soak.crecimiento(), "atascados": soak.atascados},
+                      f, indent=1)
+    if fugas:
+        print(f"[Soak] Crecimiento sin cota o ciclos atascados: {', '.join(fugas)}")
+        sys.exit(1)
+    print("[Soak] Sin fugas.")
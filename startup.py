@@ -0,0 +1,28 @@
+import sys
+import time
+
+# Presupuesto de arranque en frío por modo (segundos desde que arranca el
+# script hasta que la ventana se muestra o el recolector empieza a sondear).
+PRESUPUESTOS = {
+    "gui": 1.0,
+    "collector": 0.3,
+}
+
+# Módulos que el modo sin interfaz nunca debe cargar.
+MODULOS_GRAFICOS = ("PyQt5", "pyqtgraph", "openpyxl")
+
+
+def reportar_arranque(modo, inicio):
+    """Imprime cuánto tardó el arranque de `modo` y avisa si excede su presupuesto."""
+    duracion = time.perf_counter() - inicio
+    presupuesto = PRESUPUESTOS.get(modo)
+    print(f"[Arranque] {modo} listo en {duracion * 1000:.0f} ms"
+          + (f" (presupuesto {presupuesto * 1000:.0f} ms)" if presupuesto else ""))
+    if presupuesto and duracion > presupuesto:
+        print(f"[Arranque] Aviso: {modo} excedió su presupuesto de arranque.")
+    return duracion
+
+
+def modulos_cargados(nombres=MODULOS_GRAFICOS):
+    """Cuáles de `nombres` ya están importados en este proceso."""
+    return [nombre for nombre in nombres if nombre in sys.modules]
@@ -0,0 +1,371 @@
+import math
+import time
+from collections import deque
+
+import numpy as np
+
+from ring_buffer import SENSORES
+
+SENSORES_STATS = SENSORES
+
+# Ventanas móviles (segundos) que se mantienen por sensor y estación.
+VENTANAS = (300, 3600)
+
+# Resúmenes materializados: nombre -> segundos por cubeta.
+RESOLUCIONES = {"1min": 60, "1h": 3600, "1d": 86400}
+
+# Timestamps recientes que se recuerdan por estación para ignorar muestras
+# repetidas: el relay al reconectar o un lote de /data?since= pueden volver
+# a entregar lecturas de todo el anillo del firmware (64).
+RECIENTES = 512
+
+# Las cubetas diarias empiezan a medianoche local. México ya no cambia de
+# horario, así que un desfase fijo basta.
+DESFASE_LOCAL = time.localtime().tm_gmtoff
+
+
+def inicio_cubeta(t, resolucion, desfase=DESFASE_LOCAL):
+    """Inicio (timestamp) de la cubeta de `resolucion` segundos que contiene `t`."""
+    return math.floor((t + desfase) / resolucion) * resolucion - desfase
+
+
+class Acumulador:
+    """
+    Conteo, media, M2, mínimo y máximo por el método de Welford. Dos
+    acumuladores se combinan sin volver a ver las muestras (Chan et al.).
+    """
+
+    __slots__ = ("n", "media", "m2", "minimo", "maximo")
+
+    def __init__(self, n=0, media=0.0, m2=0.0, minimo=math.inf, maximo=-math.inf):
+        self.n = n
+        self.media = media
+        self.m2 = m2
+        self.minimo = minimo
+        self.maximo = maximo
+
+    def agregar(self, x):
+        self.n += 1
+        delta = x - self.media
+        self.media += delta / self.n
+        self.m2 += delta * (x - self.media)
+        if x < self.minimo:
+            self.minimo = x
+        if x > self.maximo:
+            self.maximo = x
+
+    def combinar(self, otro):
+        if otro.n == 0:
+            return
+        n = self.n + otro.n
+        delta = otro.media - self.media
+        self.media += delta * otro.n / n
+        self.m2 += otro.m2 + delta * delta * self.n * otro.n / n
+        self.n = n
+        self.minimo = min(self.minimo, otro.minimo)
+        self.maximo = max(self.maximo, otro.maximo)
+
+    def copia(self):
+        return Acumulador(self.n, self.media, self.m2, self.minimo, self.maximo)
+
+    @property
+    def desviacion(self):
+        """Desviación estándar poblacional (como np.std)."""
+        return math.sqrt(self.m2 / self.n) if self.n else math.nan
+
+    def resumen(self):
+        if not self.n:
+            return {"n": 0, "media": math.nan, "desviacion": math.nan,
+                    "minimo": math.nan, "maximo": math.nan}
+        return {"n": self.n, "media": self.media, "desviacion": self.desviacion,
+                "minimo": self.minimo, "maximo": self.maximo}
+
+
+class RollingWindow:
+    """
+    Media, desviación, mínimo y máximo de las muestras de los últimos
+    `ventana` segundos, con costo O(1) amortizado por muestra.
+
+    La varianza se lleva con Welford (y su inversa al expirar muestras); el
+    mínimo y el máximo con deques monótonas. Para que el error de las
+    restas no se acumule, los momentos se recalculan desde cero cada vez
+    que expira una ventana completa de muestras.
+    """
+
+    def __init__(self, ventana):
+        self.ventana = ventana
+        self._muestras = deque()
+        self._minimos = deque()
+        self._maximos = deque()
+        self._acumulado = Acumulador()
+        self._expiradas = 0
+
+    def __len__(self):
+        return len(self._muestras)
+
+    def agregar(self, t, x):
+        if x != x:  # NaN: sensor sin lectura
+            self.expirar(t)
+            return
+        self._muestras.append((t, x))
+        self._acumulado.agregar(x)
+        while self._minimos and self._minimos[-1][1] >= x:
+            self._minimos.pop()
+        self._minimos.append((t, x))
+        while self._maximos and self._maximos[-1][1] <= x:
+            self._maximos.pop()
+        self._maximos.append((t, x))
+        self.expirar(t)
+
+    def expirar(self, ahora):
+        limite = ahora - self.ventana
+        muestras = self._muestras
+        acumulado = self._acumulado
+        while muestras and muestras[0][0] <= limite:
+            _, x = muestras.popleft()
+            acumulado.n -= 1
+            if acumulado.n == 0:
+                acumulado.media = acumulado.m2 = 0.0
+            else:
+                delta = x - acumulado.media
+                acumulado.media -= delta / acumulado.n
+                acumulado.m2 = max(acumulado.m2 - delta * (x - acumulado.media), 0.0)
+            self._expiradas += 1
+        while self._minimos and self._minimos[0][0] <= limite:
+            self._minimos.popleft()
+        while self._maximos and self._maximos[0][0] <= limite:
+            self._maximos.popleft()
+
+        if muestras and self._expiradas >= len(muestras):
+            self._recalcular()
+
+    def _recalcular(self):
+        valores = [x for _, x in self._muestras]
+        media = math.fsum(valores) / len(valores)
+        self._acumulado.media = media
+        self._acumulado.m2 = math.fsum((x - media) ** 2 for x in valores)
+        self._expiradas = 0
+
+    def resumen(self):
+        resumen = self._acumulado.resumen()
+        if self._muestras:
+            resumen["minimo"] = self._minimos[0][1]
+            resumen["maximo"] = self._maximos[0][1]
+        return resumen
+
+
+def agregados_por_cubeta(columnas, resolucion, desfase=DESFASE_LOCAL):
+    """
+    Resume muchas muestras de una vez (importaciones, backfill). Devuelve
+    filas (inicio, sensor, n, media, m2, minimo, maximo) por cubeta con datos.
+    """
+    t = np.asarray(columnas['timestamp'], dtype=float)
+    if len(t) == 0:
+        return []
+    orden = np.argsort(t, kind='stable')
+    inicios = np.floor((t[orden] + desfase) / resolucion) * resolucion - desfase
+    cortes = np.flatnonzero(np.r_[True, inicios[1:] != inicios[:-1]])
+    grupo = np.cumsum(np.r_[True, inicios[1:] != inicios[:-1]]) - 1
+
+    filas = []
+    for sensor in SENSORES_STATS:
+        x = np.asarray(columnas[sensor], dtype=float)[orden]
+        validos = ~np.isnan(x)
+        n = np.add.reduceat(validos.astype(np.int64), cortes)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            media = np.add.reduceat(np.where(validos, x, 0.0), cortes) / n
+        # Dos pasadas: las sumas de cuadrados sobre la media son exactas.
+        m2 = np.add.reduceat(np.where(validos, x - media[grupo], 0.0) ** 2, cortes)
+        minimo = np.minimum.reduceat(np.where(validos, x, np.inf), cortes)
+        maximo = np.maximum.reduceat(np.where(validos, x, -np.inf), cortes)
+        for i in np.flatnonzero(n):
+            filas.append((float(inicios[cortes[i]]), sensor, int(n[i]), float(media[i]),
+                          float(m2[i]), float(minimo[i]), float(maximo[i])))
+    return filas
+
+
+class _EstadoEstacion:
+    def __init__(self, ventanas, resoluciones):
+        self.ventanas = {(sensor, v): RollingWindow(v) for sensor in SENSORES_STATS for v in ventanas}
+        # Por resolución: (inicio, {sensor: Acumulador}) de lo aún no entregado.
+        self.abiertas = {res: (None, {}) for res in resoluciones.values()}
+        # Por resolución: {inicio: {sensor: Acumulador}} con lo ya entregado.
+        self.cerradas = {res: {} for res in resoluciones.values()}
+        self.ultimo = -math.inf
+        self.recientes = deque()
+        self.vistos = set()
+
+    def ver(self, t):
+        """Recuerda `t`; devuelve False si ya se había visto."""
+        if t in self.vistos:
+            return False
+        self.vistos.add(t)
+        self.recientes.append(t)
+        if len(self.recientes) > RECIENTES:
+            self.vistos.discard(self.recientes.popleft())
+        return True
+
+
+class StatsEngine:
+    """
+    Estadísticas en streaming alimentadas desde la ingesta.
+
+    Por estación y sensor mantiene ventanas móviles (ver RollingWindow) y
+    resúmenes por cubetas de 1 minuto, 1 hora y 1 día que se materializan
+    al vuelo: cada vez que se cierra una cubeta se entregan a `on_rollups`
+    los acumulados pendientes de todas las resoluciones, como filas
+    (inicio, sensor, n, media, m2, minimo, maximo) que el historial suma a
+    lo que ya tenía (HistoryStore.guardar_rollups). Así un tablero o una
+    exportación leen agregados ya hechos y un cierre inesperado pierde a
+    lo sumo el último minuto de resúmenes.
+    """
+
+    def __init__(self, ventanas=VENTANAS, resoluciones=RESOLUCIONES, on_rollups=None,
+                 max_cubetas=1500, desfase=DESFASE_LOCAL):
+        self.ventanas = tuple(ventanas)
+        self.resoluciones = dict(resoluciones)
+        self.on_rollups = on_rollups
+        self.max_cubetas = max_cubetas
+        self.desfase = desfase
+        self._estaciones = {}
+
+    def _estado(self, estacion):
+        estado = self._estaciones.get(estacion)
+        if estado is None:
+            estado = _EstadoEstacion(self.ventanas, self.resoluciones)
+            self._estaciones[estacion] = estado
+        return estado
+
+    def estaciones(self):
+        return list(self._estaciones)
+
+    # --- Ingesta ---
+    def agregar(self, estacion, data):
+        """
+        Una muestra en vivo. Las que llegan atrasadas solo cuentan en los
+        resúmenes; una repetida (mismo timestamp que una de las últimas
+        RECIENTES, p. ej. las que el relay reenvía al reconectar) se ignora,
+        como en el historial.
+        """
+        estado = self._estado(estacion)
+        t = data.get('timestamp') or time.time()
+        if not estado.ver(t):
+            return
+        valores = {sensor: float(data[sensor]) for sensor in SENSORES_STATS if sensor in data}
+        atrasada = t < estado.ultimo
+
+        if not atrasada:
+            estado.ultimo = t
+            for (sensor, _), ventana in estado.ventanas.items():
+                ventana.agregar(t, valores.get(sensor, math.nan))
+
+        inicios = {res: inicio_cubeta(t, res, self.desfase) for res in estado.abiertas}
+        if not atrasada and any(estado.abiertas[res][0] not in (None, inicio)
+                                for res, inicio in inicios.items()):
+            # Se cerró al menos una cubeta: se entregan los pendientes de todas.
+            self._vaciar_estacion(estacion, estado)
+
+        valores = {sensor: x for sensor, x in valores.items() if x == x}
+        for res, inicio in inicios.items():
+            abierta, acumulados = estado.abiertas[res]
+            if abierta is None:
+                estado.abiertas[res] = (inicio, acumulados)
+            elif abierta != inicio:
+                # Atrasada y de una cubeta ya entregada: va sola.
+                self._entregar(estacion, estado, res, inicio,
+                               {sensor: Acumulador(1, x, 0.0, x, x) for sensor, x in valores.items()})
+                continue
+            for sensor, x in valores.items():
+                acumulado = acumulados.get(sensor)
+                if acumulado is None:
+                    acumulado = acumulados[sensor] = Acumulador()
+                acumulado.agregar(x)
+
+    def mezclar(self, estacion, columnas):
+        """
+        Suma a los resúmenes en memoria muestras que ya se guardaron en el
+        historial por otra vía (HistoryStore.importar_arreglos ya actualizó
+        sus rollups): no se vuelven a entregar.
+        """
+        estado = self._estado(estacion)
+        for t in np.asarray(columnas['timestamp'])[-RECIENTES:].tolist():
+            estado.ver(t)
+        for res in self.resoluciones.values():
+            for inicio, sensor, n, media, m2, minimo, maximo in agregados_por_cubeta(columnas, res, self.desfase):
+                cubeta = estado.cerradas[res].setdefault(inicio, {})
+                cubeta.setdefault(sensor, Acumulador()).combinar(
+                    Acumulador(n, media, m2, minimo, maximo))
+            self._podar(estado.cerradas[res])
+
+    def vaciar(self):
+        """Entrega todo lo pendiente (al cerrar la aplicación)."""
+        for estacion, estado in self._estaciones.items():
+            self._vaciar_estacion(estacion, estado)
+
+    def _vaciar_estacion(self, estacion, estado):
+        for res, (inicio, acumulados) in estado.abiertas.items():
+            if inicio is not None and acumulados:
+                self._entregar(estacion, estado, res, inicio, acumulados)
+            estado.abiertas[res] = (None, {})
+
+    def _entregar(self, estacion, estado, res, inicio, acumulados):
+        cubeta = estado.cerradas[res].setdefault(inicio, {})
+        filas = []
+        for sensor, acumulado in acumulados.items():
+            cubeta.setdefault(sensor, Acumulador()).combinar(acumulado)
+            filas.append((inicio, sensor, acumulado.n, acumulado.media, acumulado.m2,
+                          acumulado.minimo, acumulado.maximo))
+        self._podar(estado.cerradas[res])
+        if self.on_rollups and filas:
+            self.on_rollups(estacion, res, filas)
+
+    def _podar(self, cerradas):
+        # Se poda de a varias para no ordenar en cada cubeta nueva.
+        if len(cerradas) > self.max_cubetas * 5 // 4:
+            for inicio in sorted(cerradas)[:len(cerradas) - self.max_cubetas]:
+                del cerradas[inicio]
+
+    # --- Lectura ---
+    def ventana(self, estacion, sensor, segundos=VENTANAS[-1]):
+        """{n, media, desviacion, minimo, maximo} de los últimos `segundos`."""
+        estado = self._estaciones.get(estacion)
+        if estado is None or (sensor, segundos) not in estado.ventanas:
+            return Acumulador().resumen()
+        return estado.ventanas[(sensor, segundos)].resumen()
+
+    def abierta(self, estacion, resolucion, sensor):
+        """(inicio, Acumulador) de la cubeta aún no entregada a `on_rollups`, o None."""
+        res = self.resoluciones.get(resolucion, resolucion)
+        estado = self._estaciones.get(estacion)
+        if estado is None or res not in estado.abiertas:
+            return None
+        inicio, acumulados = estado.abiertas[res]
+        if sensor not in acumulados:
+            return None
+        return inicio, acumulados[sensor].copia()
+
+    def rollups(self, estacion, resolucion, sensor):
+        """
+        Cubetas en memoria de `resolucion` (nombre o segundos), incluida la
+        que sigue abierta, como {inicio, n, media, desviacion, minimo, maximo}
+        de arreglos ordenados por inicio.
+        """
+        res = self.resoluciones.get(resolucion, resolucion)
+        estado = self._estaciones.get(estacion)
+        cubetas = {}
+        if estado is not None:
+            for inicio, acumulados in estado.cerradas[res].items():
+                if sensor in acumulados:
+                    cubetas[inicio] = acumulados[sensor].copia()
+            inicio, acumulados = estado.abiertas[res]
+            if sensor in acumulados:
+                cubetas.setdefault(inicio, Acumulador()).combinar(acumulados[sensor])
+        return _como_arreglos(sorted(cubetas.items()))
+
+
+def _como_arreglos(cubetas):
+    resumenes = [acumulado.resumen() for _, acumulado in cubetas]
+    resultado = {"inicio": np.array([inicio for inicio, _ in cubetas], dtype=float)}
+    for campo in ("n", "media", "desviacion", "minimo", "maximo"):
+        resultado[campo] = np.array([r[campo] for r in resumenes], dtype=float)
+    return resultado
@@ -0,0 +1,297 @@
+import os
+import time
+import queue
+import itertools
+import sqlite3
+import threading
+
+import numpy as np
+
+from ring_buffer import COLUMNAS, SENSORES
+from stats import RESOLUCIONES, agregados_por_cubeta
+
+DB_PATH = os.path.join(os.path.expanduser("~"), ".sistema_climatico", "historial.db")
+
+_FIN = object()
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS estaciones (
+    id     INTEGER PRIMARY KEY,
+    nombre TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS muestras (
+    estacion    INTEGER NOT NULL,
+    timestamp   REAL NOT NULL,
+    temperature REAL,
+    humidity    REAL,
+    pressure    REAL,
+    aqi         REAL,
+    rainfall    REAL,
+    quality     INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (estacion, timestamp)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollups (
+    estacion   INTEGER NOT NULL,
+    resolucion INTEGER NOT NULL,
+    sensor     TEXT NOT NULL,
+    inicio     REAL NOT NULL,
+    n          INTEGER NOT NULL,
+    media      REAL,
+    m2         REAL,
+    minimo     REAL,
+    maximo     REAL,
+    PRIMARY KEY (estacion, resolucion, sensor, inicio)
+) WITHOUT ROWID;
+"""
+
+_INSERTAR_MUESTRAS = "INSERT OR IGNORE INTO muestras VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+
+# Los rollups llegan por partes (cada minuto, o tarde por un backfill): una
+# cubeta que ya existe se combina con la nueva parte (Chan et al.). En el
+# SET, las columnas sin "excluded." conservan el valor anterior.
+_SUMAR_ROLLUPS = """
+INSERT INTO rollups VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (estacion, resolucion, sensor, inicio) DO UPDATE SET
+    n = n + excluded.n,
+    media = media + (excluded.media - media) * excluded.n / (n + excluded.n),
+    m2 = m2 + excluded.m2
+         + (excluded.media - media) * (excluded.media - media) * n * excluded.n / (n + excluded.n),
+    minimo = min(minimo, excluded.minimo),
+    maximo = max(maximo, excluded.maximo)
+"""
+
+
+def _en_orden(columnas):
+    """Arreglos en el orden de COLUMNAS; sin `quality` (datos sin filtrar) va en 0."""
+    n = len(columnas['timestamp'])
+    return [np.asarray(columnas[c], dtype=float) if c in columnas else np.zeros(n) for c in COLUMNAS]
+
+
+class HistoryStore:
+    """
+    Historial persistente en SQLite (modo WAL) con escritura en segundo plano.
+
+    `guardar()` solo encola la muestra; un hilo escritor agrupa lo pendiente
+    y lo confirma en una sola transacción cada `intervalo_commit` segundos o
+    cada `lote_maximo` muestras, así el disco nunca bloquea el hilo de Qt.
+    La tabla está ordenada por (estacion, timestamp), que sirve de índice
+    para las consultas por rango.
+    """
+
+    def __init__(self, ruta=DB_PATH, lote_maximo=1000, intervalo_commit=1.0):
+        self.ruta = ruta
+        self.lote_maximo = lote_maximo
+        self.intervalo_commit = intervalo_commit
+
+        self._cola = queue.Queue()
+        self._hilo = None
+        self._ids = {}
+        self._lectura = threading.local()
+
+        directorio = os.path.dirname(os.path.abspath(ruta))
+        os.makedirs(directorio, exist_ok=True)
+        conexion = self._conectar()
+        try:
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.executescript(_ESQUEMA)
+            if "quality" not in {fila[1] for fila in conexion.execute("PRAGMA table_info(muestras)")}:
+                # Historial de antes del filtro de calidad: sus muestras quedan sin marcas.
+                conexion.execute("ALTER TABLE muestras ADD COLUMN quality INTEGER NOT NULL DEFAULT 0")
+            self._ids = dict(conexion.execute("SELECT nombre, id FROM estaciones"))
+        finally:
+            conexion.close()
+
+    def _conectar(self):
+        conexion = sqlite3.connect(self.ruta, timeout=10)
+        conexion.execute("PRAGMA synchronous=NORMAL")
+        return conexion
+
+    def iniciar(self):
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._escritor, name="history-writer", daemon=True)
+            self._hilo.start()
+
+    def guardar(self, estacion, data):
+        fila = [data.get('timestamp') or time.time()]
+        fila.extend(data.get(c) for c in SENSORES)
+        fila.append(data.get('quality', 0))
+        self._cola.put((_INSERTAR_MUESTRAS, estacion, [fila]))
+
+    def guardar_arreglos(self, estacion, columnas):
+        """Encola muchas muestras a la vez; `columnas` es {nombre: arreglo}."""
+        filas = np.column_stack(_en_orden(columnas))
+        if len(filas):
+            self._cola.put((_INSERTAR_MUESTRAS, estacion, filas.tolist()))
+
+    def guardar_rollups(self, estacion, resolucion, filas):
+        """
+        Encola partes de rollups (inicio, sensor, n, media, m2, minimo, maximo)
+        de `resolucion` segundos; se suman a lo ya guardado (ver StatsEngine).
+        """
+        self._cola.put((_SUMAR_ROLLUPS, estacion,
+                        [(resolucion, sensor, inicio, *resto) for inicio, sensor, *resto in filas]))
+
+    def importar_arreglos(self, estacion, columnas):
+        """
+        Inserta muchas muestras en una sola transacción desde el hilo que
+        llama, sin pasar por la cola. Para importaciones masivas, no en vivo.
+        Los rollups de esas muestras se actualizan en la misma transacción,
+        así que deben ser muestras nuevas (ya deduplicadas).
+        """
+        conexion = self._conectar()
+        try:
+            with conexion:
+                id_estacion = self._id_estacion(conexion, estacion)
+                conexion.executemany(
+                    _INSERTAR_MUESTRAS,
+                    zip(itertools.repeat(id_estacion),
+                        *(arreglo.tolist() for arreglo in _en_orden(columnas))))
+                for resolucion in RESOLUCIONES.values():
+                    conexion.executemany(
+                        _SUMAR_ROLLUPS,
+                        ((id_estacion, resolucion, sensor, inicio, *resto)
+                         for inicio, sensor, *resto in agregados_por_cubeta(columnas, resolucion)))
+        finally:
+            conexion.close()
+
+    def pendientes(self):
+        """Lotes esperando al hilo escritor."""
+        return self._cola.qsize()
+
+    # --- Hilo escritor ---
+    def _escritor(self):
+        conexion = self._conectar()
+        terminar = False
+        while not terminar:
+            elemento = self._cola.get()
+            if elemento is _FIN:
+                break
+            pendientes = [elemento]
+            n_filas = len(elemento[2])
+            limite = time.monotonic() + self.intervalo_commit
+
+            # Agrupamos todo lo que llegue durante la ventana de commit.
+            while n_filas < self.lote_maximo:
+                restante = limite - time.monotonic()
+                try:
+                    elemento = self._cola.get(timeout=max(restante, 0)) if restante > 0 \
+                        else self._cola.get_nowait()
+                except queue.Empty:
+                    break
+                if elemento is _FIN:
+                    terminar = True
+                    break
+                pendientes.append(elemento)
+                n_filas += len(elemento[2])
+
+            try:
+                self._escribir(conexion, pendientes)
+            except sqlite3.Error as e:
+                print(f"[HistoryStore Error]: {e}")
+        conexion.close()
+
+    def _escribir(self, conexion, pendientes):
+        with conexion:
+            for consulta, estacion, filas in pendientes:
+                id_estacion = self._id_estacion(conexion, estacion)
+                conexion.executemany(consulta, ((id_estacion, *fila) for fila in filas))
+
+    def _id_estacion(self, conexion, estacion):
+        id_estacion = self._ids.get(estacion)
+        if id_estacion is None:
+            conexion.execute("INSERT OR IGNORE INTO estaciones (nombre) VALUES (?)", (estacion,))
+            id_estacion = conexion.execute(
+                "SELECT id FROM estaciones WHERE nombre = ?", (estacion,)).fetchone()[0]
+            self._ids[estacion] = id_estacion
+        return id_estacion
+
+    # --- Consultas (desde cualquier hilo) ---
+    def _conexion_lectura(self):
+        conexion = getattr(self._lectura, "conexion", None)
+        if conexion is None:
+            conexion = self._conectar()
+            self._lectura.conexion = conexion
+        return conexion
+
+    def estaciones(self):
+        return [nombre for (nombre,) in
+                self._conexion_lectura().execute("SELECT nombre FROM estaciones ORDER BY nombre")]
+
+    def consultar(self, estacion, inicio=None, fin=None, columnas=COLUMNAS):
+        """
+        Devuelve {columna: np.ndarray} con las muestras de `estacion` cuyo
+        timestamp cae en [inicio, fin], ordenadas por tiempo.
+        """
+        desconocidas = set(columnas) - set(COLUMNAS)
+        if desconocidas:
+            raise ValueError(f"Columnas desconocidas: {sorted(desconocidas)}")
+        inicio = -np.inf if inicio is None else inicio
+        fin = np.inf if fin is None else fin
+        cursor = self._conexion_lectura().execute(
+            f"SELECT {', '.join(columnas)} FROM muestras "
+            "WHERE estacion = (SELECT id FROM estaciones WHERE nombre = ?) "
+            "AND timestamp BETWEEN ? AND ? ORDER BY timestamp",
+            (estacion, inicio, fin))
+        filas = np.array(cursor.fetchall(), dtype=float).reshape(-1, len(columnas))
+        return {c: np.ascontiguousarray(filas[:, i]) for i, c in enumerate(columnas)}
+
+    def contar(self, estacion, inicio=None, fin=None):
+        inicio = -np.inf if inicio is None else inicio
+        fin = np.inf if fin is None else fin
+        fila = self._conexion_lectura().execute(
+            "SELECT COUNT(*) FROM muestras "
+            "WHERE estacion = (SELECT id FROM estaciones WHERE nombre = ?) "
+            "AND timestamp BETWEEN ? AND ?", (estacion, inicio, fin)).fetchone()
+        return fila[0]
+
+    def iterar(self, estacion, inicio=None, fin=None, tam_bloque=50000):
+        """
+        Igual que consultar() pero en bloques de `tam_bloque` filas, para
+        recorrer rangos enormes con memoria constante.
+        """
+        inicio = -np.inf if inicio is None else inicio
+        fin = np.inf if fin is None else fin
+        cursor = self._conectar().execute(
+            f"SELECT {', '.join(COLUMNAS)} FROM muestras "
+            "WHERE estacion = (SELECT id FROM estaciones WHERE nombre = ?) "
+            "AND timestamp BETWEEN ? AND ? ORDER BY timestamp",
+            (estacion, inicio, fin))
+        try:
+            while True:
+                filas = cursor.fetchmany(tam_bloque)
+                if not filas:
+                    break
+                bloque = np.array(filas, dtype=float)
+                yield {c: np.ascontiguousarray(bloque[:, i]) for i, c in enumerate(COLUMNAS)}
+        finally:
+            cursor.connection.close()
+
+    def consultar_rollups(self, estacion, resolucion, sensor, inicio=None, fin=None):
+        """
+        Cubetas de `resolucion` (nombre o segundos) de un sensor con inicio en
+        [inicio, fin], como {inicio, n, media, desviacion, minimo, maximo}.
+        """
+        resolucion = RESOLUCIONES.get(resolucion, resolucion)
+        inicio = -np.inf if inicio is None else inicio
+        fin = np.inf if fin is None else fin
+        cursor = self._conexion_lectura().execute(
+            "SELECT inicio, n, media, m2, minimo, maximo FROM rollups "
+            "WHERE estacion = (SELECT id FROM estaciones WHERE nombre = ?) "
+            "AND resolucion = ? AND sensor = ? AND inicio BETWEEN ? AND ? ORDER BY inicio",
+            (estacion, resolucion, sensor, inicio, fin))
+        filas = np.array(cursor.fetchall(), dtype=float).reshape(-1, 6)
+        return {"inicio": filas[:, 0], "n": filas[:, 1], "media": filas[:, 2],
+                "desviacion": np.sqrt(filas[:, 3] / filas[:, 1]),
+                "minimo": filas[:, 4], "maximo": filas[:, 5]}
+
+    def ultimo_timestamp(self, estacion):
+        fila = self._conexion_lectura().execute(
+            "SELECT MAX(timestamp) FROM muestras "
+            "WHERE estacion = (SELECT id FROM estaciones WHERE nombre = ?)", (estacion,)).fetchone()
+        return fila[0]
+
+    def cerrar(self):
+        if self._hilo is not None:
+            self._cola.put(_FIN)
+            self._hilo.join()
+            self._hilo = None
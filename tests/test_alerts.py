@@ -0,0 +1,64 @@
+import unittest
+
+from alerts import AlertEngine
+
+T0 = 1_700_000_000.0
+
+
+def muestra(t, **valores):
+    data = {'timestamp': T0 + t, 'temperature': 20.0, 'humidity': 50.0, 'pressure': 1013.0,
+            'aqi': 40, 'rainfall': 0}
+    data.update(valores)
+    return data
+
+
+class AlertEngineUmbralTest(unittest.TestCase):
+    """Reglas de umbral: encendido, histéresis, "durante" y varias estaciones por lote."""
+
+    def transiciones(self, engine, estacion, temperaturas, paso=2.0):
+        eventos = []
+        for i, temperatura in enumerate(temperaturas):
+            eventos += engine.evaluar([(estacion, muestra(i * paso, temperature=temperatura))])
+        return [(e["estado"], e["timestamp"] - T0) for e in eventos]
+
+    def test_mayor_con_histeresis(self):
+        engine = AlertEngine([{"nombre": "calor", "tipo": "umbral", "sensor": "temperature",
+                               "mayor": 35, "histeresis": 1}])
+        temperaturas = [34, 35, 35.5, 35.2, 34.1, 35.8, 33.9, 34.5, 35.1]
+        self.assertEqual(self.transiciones(engine, "a", temperaturas),
+                         [("activa", 4.0), ("resuelta", 12.0), ("activa", 16.0)])
+        self.assertEqual(engine.activas(), [("a", "calor")])
+
+    def test_menor_con_histeresis(self):
+        engine = AlertEngine([{"nombre": "helada", "tipo": "umbral", "sensor": "temperature",
+                               "menor": 2, "histeresis": 1}])
+        temperaturas = [3, 1.5, 2.5, 2.9, 3.1, 1.9]
+        self.assertEqual(self.transiciones(engine, "a", temperaturas),
+                         [("activa", 2.0), ("resuelta", 8.0), ("activa", 10.0)])
+
+    def test_durante_y_espera(self):
+        engine = AlertEngine([{"nombre": "calor", "tipo": "umbral", "sensor": "temperature",
+                               "mayor": 35, "durante": 5, "espera": 3}])
+        # Un pico de 4 s no basta; 6 s seguidos sí. Para apagarse, 3 s sin
+        # la condición: la lectura baja de t=14 sola no la apaga.
+        temperaturas = [36, 36, 34, 36, 36, 36, 36, 34, 36, 34, 34, 34]
+        self.assertEqual(self.transiciones(engine, "a", temperaturas),
+                         [("activa", 12.0), ("resuelta", 20.0)])
+
+    def test_lote_con_varias_estaciones_y_atrasadas(self):
+        engine = AlertEngine([{"nombre": "calor", "tipo": "umbral", "sensor": "temperature",
+                               "mayor": 35, "histeresis": 1, "estaciones": ["a", "b"]}])
+        lote = [("a", muestra(0, temperature=36)), ("b", muestra(0, temperature=30)),
+                ("a", muestra(2, temperature=33)), ("b", muestra(2, temperature=36)),
+                ("c", muestra(2, temperature=40)), ("a", muestra(4, temperature=36))]
+        eventos = engine.evaluar(lote)
+        self.assertEqual(sorted((e["timestamp"] - T0, e["estacion"], e["estado"]) for e in eventos),
+                         [(0.0, "a", "activa"), (2.0, "a", "resuelta"), (2.0, "b", "activa"),
+                          (4.0, "a", "activa")])
+        # Una muestra atrasada (backfill) no apaga ni enciende nada.
+        self.assertEqual(engine.evaluar([("a", muestra(1, temperature=20))]), [])
+        self.assertEqual(sorted(engine.activas()), [("a", "calor"), ("b", "calor")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+
+import numpy as np
+
+from decimation import LodPyramid
+
+
+class LodPyramidRecortarTest(unittest.TestCase):
+    """recortar() en vivo: cuánto conserva y que los niveles sigan alineados."""
+
+    FACTOR = 4
+
+    def assertIgualAReconstruida(self, piramide):
+        nueva = LodPyramid(self.FACTOR)
+        nueva.extender(piramide.x.datos.copy(), piramide.y.datos.copy())
+        self.assertEqual(len(piramide.niveles), len(nueva.niveles))
+        for nivel, esperado in zip(piramide.niveles, nueva.niveles):
+            for nombre in ("x_min", "y_min", "x_max", "y_max"):
+                np.testing.assert_array_equal(getattr(nivel, nombre).datos, getattr(esperado, nombre).datos)
+
+    def test_conserva_el_tramo_y_a_lo_sumo_un_bloque_de_mas(self):
+        azar = np.random.default_rng(5)
+        piramide = LodPyramid(self.FACTOR)
+        segundos = 500.0
+        t = 0.0
+        for paso in range(300):
+            n = int(azar.integers(1, 40))
+            x = t + np.arange(1, n + 1, dtype=float)
+            y = azar.normal(size=n)
+            y[azar.random(n) < 0.05] = np.nan
+            t = x[-1]
+            piramide.extender(x, y)
+            bloque = self.FACTOR ** len(piramide.niveles)
+            x_minimo = t - segundos
+            piramide.recortar(x_minimo)
+
+            datos = piramide.x.datos
+            # Nada del tramo pedido se pierde...
+            self.assertEqual(datos[-1], t)
+            self.assertLessEqual(datos[0], max(x_minimo, 1.0))
+            # ...y lo anterior a él no llega a un bloque del nivel más grueso.
+            self.assertLess(int(np.searchsorted(datos, x_minimo)), bloque)
+            if paso % 50 == 49:
+                self.assertIgualAReconstruida(piramide)
+
+    def test_ventana_tras_recortar_cubre_el_rango(self):
+        piramide = LodPyramid(self.FACTOR)
+        x = np.arange(10_000, dtype=float)
+        piramide.extender(x, np.sin(x / 50))
+        piramide.recortar(6_000.0)
+        xs, ys = piramide.ventana(6_000.0, 9_999.0, 100)
+        self.assertLessEqual(len(xs), 2 * 100 * self.FACTOR)
+        self.assertLessEqual(xs.min(), 6_000.0 + self.FACTOR ** len(piramide.niveles))
+        self.assertEqual(xs.max(), 9_999.0)
+        self.assertAlmostEqual(np.nanmax(ys), 1.0, places=3)
+        self.assertAlmostEqual(np.nanmin(ys), -1.0, places=3)
+
+
+if __name__ == "__main__":
+    unittest.main()
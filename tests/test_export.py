@@ -0,0 +1,57 @@
+import os
+import csv
+import gzip
+import tempfile
+import unittest
+
+import numpy as np
+
+from export_utils import ENCABEZADOS, escribir_csv, escribir_npz, escribir_xlsx, escritor_para
+from ring_buffer import SENSORES
+
+
+class EscribirCsvTest(unittest.TestCase):
+    """CSV exportado: campos vacíos para NaN y texto entrecomillado cuando hace falta."""
+
+    def setUp(self):
+        self.carpeta = tempfile.TemporaryDirectory()
+        n = 50
+        self.columnas = {'timestamp': 1_700_000_000.0 + 2.0 * np.arange(n), 'quality': np.zeros(n)}
+        for i, sensor in enumerate(SENSORES):
+            self.columnas[sensor] = np.round(np.linspace(10 * i, 10 * i + 5, n), 2)
+        self.columnas['temperature'][::7] = np.nan
+        self.columnas['rainfall'][-1] = np.nan
+
+    def tearDown(self):
+        self.carpeta.cleanup()
+
+    def leer(self, nombre, abrir=open):
+        ruta = os.path.join(self.carpeta.name, nombre)
+        filas = []
+        escritor_para(ruta)(ruta, [('Patio "norte", 2', self.columnas)], filas.append)
+        self.assertEqual(sum(filas), len(self.columnas['timestamp']))
+        with abrir(ruta, "rt", encoding="utf-8", newline="") as f:
+            return list(csv.reader(f))
+
+    def test_nan_vacio_y_texto_entrecomillado(self):
+        for nombre, abrir in (("datos.csv", open), ("datos.CSV.gz", gzip.open)):
+            encabezado, *filas = self.leer(nombre, abrir)
+            self.assertEqual(encabezado, ENCABEZADOS)
+            self.assertEqual({fila[0] for fila in filas}, {'Patio "norte", 2'})
+            self.assertTrue(all(len(fila) == len(ENCABEZADOS) for fila in filas))
+            for j, sensor in enumerate(SENSORES, start=3):
+                leidos = np.array([float(fila[j]) if fila[j] else np.nan for fila in filas])
+                np.testing.assert_array_equal(leidos, self.columnas[sensor])
+            np.testing.assert_allclose([float(fila[2]) for fila in filas], self.columnas['timestamp'])
+
+    def test_extension_desconocida(self):
+        self.assertIs(escritor_para("a.xlsx"), escribir_xlsx)
+        self.assertIs(escritor_para("a.npz"), escribir_npz)
+        self.assertIs(escritor_para("a.csv.gz"), escribir_csv)
+        for ruta in ("datos", "datos.txt", "datos.gz", "datos.xls"):
+            with self.assertRaises(ValueError):
+                escritor_para(ruta)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+import time
+import random
+import threading
+import unittest
+
+import numpy as np
+import requests
+
+from polling import PollingEngine, Station, sondear
+from scheduler import AdaptiveSchedule
+from simulator import SimulatedStation
+
+PERIODO = 0.1
+MUESTRAS = 5
+
+
+def agenda_rapida(**opciones):
+    """AdaptiveSchedule escalada al periodo corto del simulador."""
+    return AdaptiveSchedule(periodo_inicial=PERIODO, margen=0.02, periodo_min=0.02,
+                            muestras_por_sondeo=MUESTRAS, **opciones)
+
+
+class AdaptiveScheduleTest(unittest.TestCase):
+    """La agenda sola, con tiempos inventados."""
+
+    def test_alinea_la_fase_con_age_ms(self):
+        agenda = AdaptiveSchedule(periodo_inicial=2.0, margen=0.1)
+        agenda.registrar({'seq': 1, 'age_ms': 500}, 100.0)
+        self.assertAlmostEqual(agenda.ultimo_cambio, 99.5)
+        self.assertAlmostEqual(agenda.siguiente(), 99.5 + 2.0 + 0.1)
+        # Una lectura con seq + 3 medida a 3 periodos de 2.5 s ajusta el periodo.
+        agenda.registrar({'seq': 4, 'age_ms': 0}, 107.0)
+        self.assertGreater(agenda.periodo, 2.0)
+        self.assertAlmostEqual(agenda.siguiente(), 107.0 + agenda.periodo + 0.1)
+
+    def test_filtra_por_seq(self):
+        agenda = AdaptiveSchedule()
+        lote = [{'seq': s, 'age_ms': 0} for s in (3, 4)]
+        self.assertEqual(agenda.registrar_lote(lote, 10.0), lote)
+        lote = [{'seq': s, 'age_ms': 0} for s in (3, 4, 5, 6)]
+        self.assertEqual([d['seq'] for d in agenda.registrar_lote(lote, 12.0)], [5, 6])
+        self.assertEqual(agenda.registrar_lote(lote, 12.5), [])
+        self.assertEqual(agenda.ultima_seq, 6)
+        # Tras un reinicio del Modulo todo el lote es nuevo.
+        lote = [{'seq': s, 'age_ms': 0} for s in (1, 2)]
+        self.assertEqual(agenda.registrar_lote(lote, 14.0), lote)
+
+    def test_solo_los_lotes_esperan_varias_lecturas(self):
+        por_lote, por_json = AdaptiveSchedule(periodo_inicial=2.0), AdaptiveSchedule(periodo_inicial=2.0)
+        por_lote.registrar_lote([{'seq': 1, 'age_ms': 0}], 10.0, es_lote=True)
+        por_json.registrar_lote([{'seq': 1, 'age_ms': 0}], 10.0, es_lote=False)
+        self.assertAlmostEqual(por_lote.siguiente() - por_json.siguiente(),
+                               (por_lote.muestras_por_sondeo - 1) * 2.0)
+
+    def test_backoff_exponencial_con_jitter(self):
+        random.seed(3)
+        agenda = AdaptiveSchedule(backoff_base=1.0, backoff_max=8.0)
+        esperas = []
+        for _ in range(200):
+            agenda.registrar_fallo(0.0)
+            esperas.append(agenda.siguiente())
+        for fallos, espera in enumerate(esperas[:4], start=1):
+            base = 2 ** (fallos - 1)
+            self.assertTrue(0.5 * base <= espera <= 1.5 * base, (fallos, espera))
+        tope = np.array(esperas[10:])
+        self.assertTrue(((tope >= 4.0) & (tope <= 12.0)).all())
+        # El jitter reparte los reintentos, no los deja en el mismo instante.
+        self.assertGreater(tope.std(), 1.0)
+        agenda.registrar({'seq': 1}, 0.0)
+        self.assertEqual(agenda.fallos, 0)
+
+
+class SondeoContraSimuladorTest(unittest.TestCase):
+    """sondear() y PollingEngine contra un Modulo simulado."""
+
+    def arrancar(self, **opciones):
+        self.sim = SimulatedStation(periodo=PERIODO, semilla=4, **opciones).iniciar()
+        self.addCleanup(self.sim.detener)
+        self.sesion = requests.Session()
+        self.addCleanup(self.sesion.close)
+
+    def sondear_durante(self, agenda, segundos, al_medio=None):
+        seqs = []
+        limite = time.monotonic() + segundos
+        while time.monotonic() < limite:
+            seqs += [d['seq'] for d in sondear(self.sesion, f"http://{self.sim.ip}/data", agenda, 2.0)]
+            if al_medio and time.monotonic() > limite - segundos / 2:
+                al_medio()
+                al_medio = None
+            time.sleep(max(0.0, agenda.siguiente() - time.monotonic()))
+        return seqs
+
+    def assertContiguos(self, seqs):
+        self.assertTrue(seqs)
+        np.testing.assert_array_equal(np.diff(seqs), 1)
+
+    def test_por_lotes_sin_huecos_ni_repetidas(self):
+        self.arrancar()
+        seqs = self.sondear_durante(agenda_rapida(), 4.0)
+        self.assertContiguos(seqs)
+        # Lo ideal es un sondeo cada MUESTRAS lecturas; se tolera el doble.
+        self.assertLess(self.sim.solicitudes / len(seqs), 2.0 / MUESTRAS)
+
+    def test_reinicio_del_modulo(self):
+        self.arrancar()
+        seqs = self.sondear_durante(agenda_rapida(), 4.0, al_medio=self.sim.reiniciar)
+        corte = int(np.flatnonzero(np.diff(seqs) <= 0)[0]) + 1
+        antes, despues = seqs[:corte], seqs[corte:]
+        self.assertContiguos(antes)
+        # Tras el reinicio se reciben todas desde seq 1, sin repetir ninguna.
+        self.assertEqual(despues[0], 1)
+        self.assertContiguos(despues)
+
+    def test_firmware_viejo_responde_json(self):
+        self.arrancar(lotes=False)
+        agenda = agenda_rapida()
+        seqs = self.sondear_durante(agenda, 3.0)
+        self.assertEqual(len(set(seqs)), len(seqs))
+        self.assertTrue((np.diff(seqs) > 0).all())
+        # Una lectura por sondeo: sin lotes se vuelve a cada actualización.
+        self.assertGreater(len(seqs), 0.8 * (seqs[-1] - seqs[0] + 1))
+        self.assertGreaterEqual(self.sim.solicitudes, len(seqs))
+
+    def test_polling_engine(self):
+        self.arrancar()
+        estacion = Station(self.sim.ip, nombre="sim", agenda=agenda_rapida())
+        recibidas = []
+        engine = PollingEngine([estacion], on_lote=lambda muestras, errores: recibidas.extend(muestras),
+                               intervalo_lote=0.05)
+        hilo = threading.Thread(target=engine.run, daemon=True)
+        hilo.start()
+        time.sleep(3.0)
+        engine.stop()
+        hilo.join(timeout=5)
+        self.assertEqual({d['station'] for d in recibidas}, {"sim"})
+        self.assertContiguos([d['seq'] for d in recibidas])
+        self.assertEqual(estacion.errores, 0)
+        self.assertLess(estacion.solicitudes / len(recibidas), 2.0 / MUESTRAS)
+
+
+if __name__ == "__main__":
+    unittest.main()
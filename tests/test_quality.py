@@ -0,0 +1,27 @@
+import unittest
+
+import numpy as np
+
+from quality import filtrar_columnas, motivos
+
+
+class RangosDht11Test(unittest.TestCase):
+    """Los límites de plausibilidad siguen al DHT11 que lee el firmware."""
+
+    def test_fuera_del_rango_del_dht11(self):
+        temperatura = [22.0, 51.0, 49.5, 22.0, -1.0, 22.0]
+        humedad = [85.0, 60.0, 19.0, 91.0, 60.0, 20.0]
+        n = len(temperatura)
+        columnas = filtrar_columnas({'timestamp': np.arange(n, dtype=float), 'temperature': temperatura,
+                                     'humidity': humedad, 'pressure': np.full(n, 1013.0),
+                                     'aqi': np.full(n, 40.0), 'rainfall': np.zeros(n)})
+        fuera = [[("fuera de rango" in motivos(c, s)) for s in ("temperature", "humidity")]
+                 for c in columnas['quality']]
+        self.assertEqual(fuera, [[False, False], [True, False], [False, True],
+                                 [False, True], [True, False], [False, False]])
+        self.assertTrue(np.isnan(columnas['temperature'][[1, 4]]).all())
+        self.assertEqual(columnas['humidity'][0], 85.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
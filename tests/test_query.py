@@ -0,0 +1,104 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from query import HistoryQuery, reagrupar
+from ring_buffer import SENSORES, BufferStore
+from stats import agregados_por_cubeta
+from storage import HistoryStore
+
+PERIODO = 2.0
+
+
+class HistoryQueryEmpalmeTest(unittest.TestCase):
+    """_crudo() empalma disco, historial comprimido y buffer sin repetir ni perder muestras."""
+
+    N = 20_000
+
+    def setUp(self):
+        self.carpeta = tempfile.TemporaryDirectory()
+        self.store = HistoryStore(os.path.join(self.carpeta.name, "historial.db"))
+        azar = np.random.default_rng(7)
+        # Timestamps con microsegundos: el historial comprimido los redondea al ms.
+        t = 1_700_000_000.0 + np.arange(self.N) * PERIODO + azar.uniform(0, 0.01, self.N)
+        self.columnas = {'timestamp': t, 'quality': np.zeros(self.N)}
+        for i, sensor in enumerate(SENSORES):
+            self.columnas[sensor] = np.round(20 + 10 * i + azar.normal(0, 3, self.N), 2)
+        self.store.importar_arreglos("sim", self.columnas)
+
+    def tearDown(self):
+        self.store.cerrar()
+        self.carpeta.cleanup()
+
+    def consulta(self, retencion):
+        buffers = BufferStore(capacidad=300, retencion=retencion)
+        for i in range(self.N):
+            buffers.agregar("sim", {c: v[i] for c, v in self.columnas.items()})
+        return HistoryQuery(buffers, self.store), buffers
+
+    def assertSinHuecosNiRepetidas(self, query, inicio, fin):
+        obtenido = query.consultar("sim", inicio=inicio, fin=fin)
+        t = self.columnas['timestamp']
+        sel = (t >= inicio) & (t <= fin)
+        self.assertEqual(len(obtenido['timestamp']), int(sel.sum()), (inicio, fin))
+        np.testing.assert_allclose(obtenido['timestamp'], t[sel], rtol=0, atol=1e-3)
+        for sensor in SENSORES:
+            np.testing.assert_allclose(obtenido[sensor], self.columnas[sensor][sel], rtol=1e-6)
+
+    def rangos(self, fronteras):
+        t = self.columnas['timestamp']
+        rangos = [(-np.inf, np.inf), (t[0], t[-1])]
+        # Extremos a más de 1 ms de cualquier muestra: dentro de ese margen
+        # decide el redondeo del historial comprimido, no el empalme.
+        for frontera in fronteras:
+            for delta in (-0.3 * PERIODO, -0.002, 0.002, 0.3 * PERIODO):
+                rangos.append((frontera + delta, np.inf))
+                rangos.append((frontera - 100 * PERIODO, frontera + delta))
+                rangos.append((-np.inf, frontera + delta))
+        return rangos
+
+    def test_disco_historial_y_buffer(self):
+        query, buffers = self.consulta(retencion=15_000)
+        primero_historial = buffers.historiales["sim"].primer_timestamp()
+        primero_buffer = buffers.buffers["sim"].ultimos()[0, 0]
+        # El historial comprimido ya soltó bloques viejos: hay tres fuentes.
+        self.assertGreater(primero_historial, self.columnas['timestamp'][0])
+        for inicio, fin in self.rangos([primero_historial, primero_buffer]):
+            self.assertSinHuecosNiRepetidas(query, inicio, fin)
+
+    def test_disco_y_buffer(self):
+        query, buffers = self.consulta(retencion=None)
+        for inicio, fin in self.rangos([buffers.buffers["sim"].ultimos()[0, 0]]):
+            self.assertSinHuecosNiRepetidas(query, inicio, fin)
+
+
+class ReagruparTest(unittest.TestCase):
+    """reagrupar() de cubetas finas contra agregar las muestras directo a la resolución gruesa."""
+
+    def test_igual_que_agregar_directo(self):
+        azar = np.random.default_rng(8)
+        t = np.sort(1_700_000_000.0 + azar.uniform(0, 3 * 86400, 50_000))
+        columnas = {'timestamp': t}
+        for i, sensor in enumerate(SENSORES):
+            columnas[sensor] = 20 + 10 * i + azar.normal(0, 3, len(t))
+        columnas['temperature'][azar.random(len(t)) < 0.1] = np.nan
+
+        def cubetas(resolucion, sensor):
+            filas = [f for f in agregados_por_cubeta(columnas, resolucion) if f[1] == sensor]
+            valores = np.array([(f[0],) + tuple(f[2:]) for f in filas], dtype=float)
+            return dict(zip(("inicio", "n", "media", "m2", "minimo", "maximo"), valores.T))
+
+        for fina, gruesa in ((60, 900), (60, 3600), (3600, 6 * 3600), (3600, 86400)):
+            for sensor in ("temperature", "pressure"):
+                obtenido = reagrupar(cubetas(fina, sensor), gruesa)
+                esperado = cubetas(gruesa, sensor)
+                for campo in ("inicio", "n", "minimo", "maximo"):
+                    np.testing.assert_array_equal(obtenido[campo], esperado[campo])
+                np.testing.assert_allclose(obtenido["media"], esperado["media"], rtol=1e-12)
+                np.testing.assert_allclose(obtenido["m2"], esperado["m2"], rtol=1e-9)
+
+
+if __name__ == "__main__":
+    unittest.main()
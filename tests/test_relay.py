@@ -0,0 +1,61 @@
+import json
+import time
+import unittest
+
+import numpy as np
+import requests
+
+from relay import Relay
+from simulator import SimulatedStation
+
+
+class RelayContraSimuladorTest(unittest.TestCase):
+    """Un Relay sondeando un Modulo simulado y un cliente SSE leyendo /stream."""
+
+    PERIODO = 0.05
+
+    def setUp(self):
+        self.sim = SimulatedStation(periodo=self.PERIODO, semilla=2).iniciar()
+        self.relay = Relay([self.sim.ip], host="127.0.0.1", puerto=0)
+        self.relay.iniciar()
+        host, puerto = self.relay.servidor.server_address[:2]
+        self.url = f"http://{host}:{puerto}"
+
+    def tearDown(self):
+        self.relay.detener()
+        self.sim.detener()
+
+    def leer_stream(self, segundos):
+        seqs = []
+        limite = time.monotonic() + segundos
+        with requests.get(f"{self.url}/stream", stream=True, timeout=5) as respuesta:
+            for linea in respuesta.iter_lines():
+                if linea.startswith(b"data: "):
+                    seqs.append(json.loads(linea[6:])["seq"])
+                if time.monotonic() > limite:
+                    break
+        return seqs
+
+    def test_cliente_sse_recibe_seqs_contiguos(self):
+        # Con un periodo corto cada sondeo trae lotes de varias lecturas.
+        seqs = self.leer_stream(3.0)
+        self.assertGreater(len(seqs), 20)
+        np.testing.assert_array_equal(np.diff(seqs), 1)
+
+    def test_poda_lo_que_todos_los_clientes_ya_recibieron(self):
+        self.leer_stream(1.0)
+        # El servidor nota el cierre al escribir el siguiente lote; el lote
+        # posterior ya poda sin ningún cliente suscrito.
+        limite = time.monotonic() + 15
+        while time.monotonic() < limite:
+            with self.relay._cond:
+                if not self.relay._cursores and not self.relay._historial:
+                    break
+            time.sleep(0.1)
+        with self.relay._cond:
+            self.assertFalse(self.relay._cursores)
+            self.assertFalse(self.relay._historial)
+
+
+if __name__ == "__main__":
+    unittest.main()
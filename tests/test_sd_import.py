@@ -0,0 +1,61 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from sd_import import importar_datalog, parsear_bloque
+from storage import HistoryStore
+
+
+def fila(seq=None, t=20.5):
+    linea = f"{t:.2f},55.10,1013.25,42,0"
+    return linea + (f",{seq}" if seq is not None else "") + "\r\n"
+
+
+class ImportarDatalogTest(unittest.TestCase):
+    """Fechado de datalog.csv por su "seq": huecos de la SD y reinicios del Modulo."""
+
+    PERIODO = 2.0
+    ANCLA = 1_700_000_000.0
+
+    def setUp(self):
+        self.carpeta = tempfile.TemporaryDirectory()
+        self.store = HistoryStore(os.path.join(self.carpeta.name, "historial.db"))
+        self.ruta = os.path.join(self.carpeta.name, "datalog.csv")
+
+    def tearDown(self):
+        self.store.cerrar()
+        self.carpeta.cleanup()
+
+    def importar(self, texto, fila_ancla=0):
+        with open(self.ruta, "w", newline="") as f:
+            f.write(texto)
+        resumen = importar_datalog(self.ruta, "sim", self.store, ancla=self.ANCLA,
+                                   fila_ancla=fila_ancla, periodo=self.PERIODO)
+        return resumen, self.store.consultar("sim", columnas=('timestamp',))['timestamp']
+
+    def test_el_encabezado_no_cuenta_como_descartada(self):
+        texto = "Temperatura,Humedad,Presion,QAI,Lluvia,Seq\r\n" + "".join(fila(s) for s in range(1, 6))
+        self.assertEqual(parsear_bloque(texto.encode())[1], 0)
+        resumen, _ = self.importar(texto)
+        self.assertEqual(resumen["descartadas"], 0)
+        self.assertEqual(resumen["filas"], 5)
+
+    def test_fecha_por_seq_con_huecos_y_reinicios(self):
+        # Filas sin seq del firmware viejo, un tramo con las lecturas 4 y 5
+        # sin escribir en la SD y un reinicio que vuelve a seq 1.
+        seqs = [None, None, 1, 2, 3, 6, 7, 1, 2]
+        resumen, tiempos = self.importar("".join(fila(s, t=20 + i) for i, s in enumerate(seqs)))
+        self.assertEqual(resumen["nuevas"], len(seqs))
+        lecturas = np.array([0, 1, 2, 3, 4, 7, 8, 9, 10])
+        np.testing.assert_allclose(tiempos, self.ANCLA + lecturas * self.PERIODO)
+
+    def test_fila_ancla_cuenta_lecturas_del_tramo(self):
+        # La última fila es el ancla: las anteriores retroceden por su seq.
+        _, tiempos = self.importar("".join(fila(s, t=20 + s) for s in (10, 11, 15)), fila_ancla=-1)
+        np.testing.assert_allclose(tiempos, self.ANCLA - np.array([5, 4, 0]) * self.PERIODO)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+
+import numpy as np
+
+from stats import StatsEngine
+
+
+class StatsEngineTest(unittest.TestCase):
+    """Resúmenes por cubeta frente a muestras repetidas o atrasadas."""
+
+    def setUp(self):
+        self.filas = []
+        self.engine = StatsEngine(on_rollups=lambda estacion, res, filas: self.filas.extend(
+            (res, *fila) for fila in filas), desfase=0)
+
+    def rollup(self, res, sensor="temperature"):
+        filas = [f for f in self.filas if f[0] == res and f[2] == sensor]
+        return sum(f[3] for f in filas), max(f[7] for f in filas)
+
+    def test_reentregas_atrasadas_no_se_cuentan_dos_veces(self):
+        for t in range(600):
+            self.engine.agregar("sim", {'timestamp': 1_700_000_000.0 + t, 'temperature': 20.0 + t % 3})
+        # El relay al reconectar vuelve a mandar parte del anillo, ya atrasado.
+        for t in range(500, 600):
+            self.engine.agregar("sim", {'timestamp': 1_700_000_000.0 + t, 'temperature': 99.0})
+        self.engine.vaciar()
+        for res in (60, 3600, 86400):
+            n, maximo = self.rollup(res)
+            self.assertEqual(n, 600)
+            self.assertEqual(maximo, 22.0)
+
+    def test_atrasada_nueva_si_cuenta(self):
+        for t in np.arange(0, 120, 2.0):
+            self.engine.agregar("sim", {'timestamp': 1_700_000_000.0 + t, 'temperature': 20.0})
+        self.engine.agregar("sim", {'timestamp': 1_700_000_001.0, 'temperature': 30.0})
+        self.engine.vaciar()
+        self.assertEqual(self.rollup(60), (61, 30.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
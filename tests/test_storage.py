@@ -0,0 +1,73 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from ring_buffer import SENSORES
+from stats import RESOLUCIONES, agregados_por_cubeta, inicio_cubeta
+from storage import HistoryStore
+
+
+def muestras(t, semilla):
+    azar = np.random.default_rng(semilla)
+    columnas = {'timestamp': np.asarray(t, dtype=float)}
+    for i, sensor in enumerate(SENSORES):
+        columnas[sensor] = np.round(20 + 10 * i + azar.normal(0, 3, len(t)), 2)
+    columnas['temperature'][::17] = np.nan
+    return columnas
+
+
+class RollupsTest(unittest.TestCase):
+    """Los rollups que llegan por partes se combinan igual que si se calcularan de una vez."""
+
+    def setUp(self):
+        self.carpeta = tempfile.TemporaryDirectory()
+        self.store = HistoryStore(os.path.join(self.carpeta.name, "historial.db"))
+
+    def tearDown(self):
+        self.store.cerrar()
+        self.carpeta.cleanup()
+
+    def assertRollupsDirectos(self, columnas, resolucion):
+        t = columnas['timestamp']
+        inicios = np.array([inicio_cubeta(x, resolucion) for x in t])
+        for sensor in SENSORES:
+            guardado = self.store.consultar_rollups("sim", resolucion, sensor)
+            x = columnas[sensor]
+            esperados = [b for b in np.unique(inicios) if (~np.isnan(x[inicios == b])).any()]
+            np.testing.assert_array_equal(guardado['inicio'], esperados)
+            for i, inicio in enumerate(esperados):
+                valores = x[(inicios == inicio) & ~np.isnan(x)]
+                self.assertEqual(guardado['n'][i], len(valores))
+                self.assertAlmostEqual(guardado['media'][i], valores.mean(), places=9)
+                self.assertAlmostEqual(guardado['desviacion'][i], valores.std(), places=9)
+                self.assertEqual(guardado['minimo'][i], valores.min())
+                self.assertEqual(guardado['maximo'][i], valores.max())
+
+    def test_importar_por_partes(self):
+        t = 1_700_000_000.0 + np.arange(0, 3 * 3600, 7.0)
+        columnas = muestras(t, semilla=1)
+        # Partes que cortan las cubetas a la mitad, en desorden.
+        for parte in np.array_split(np.random.default_rng(2).permutation(len(t)), 5):
+            parte = np.sort(parte)
+            self.store.importar_arreglos("sim", {c: v[parte] for c, v in columnas.items()})
+        for resolucion in RESOLUCIONES.values():
+            self.assertRollupsDirectos(columnas, resolucion)
+
+    def test_guardar_rollups_desde_el_escritor(self):
+        self.store.iniciar()
+        t = 1_700_000_000.0 + np.arange(0, 2 * 3600, 3.0)
+        columnas = muestras(t, semilla=3)
+        for parte in np.array_split(np.arange(len(t)), 7):
+            parte_columnas = {c: v[parte] for c, v in columnas.items()}
+            for resolucion in RESOLUCIONES.values():
+                self.store.guardar_rollups("sim", resolucion,
+                                           agregados_por_cubeta(parte_columnas, resolucion))
+        self.store.cerrar()
+        self.assertRollupsDirectos(columnas, RESOLUCIONES["1min"])
+        self.assertRollupsDirectos(columnas, RESOLUCIONES["1h"])
+
+
+if __name__ == "__main__":
+    unittest.main()